@@ -1,51 +1,168 @@
 # api_rest.py
-import requests
+import asyncio
+import aiohttp
 import hmac
 import hashlib
 import json
-import time
 import logging
-from datetime import datetime
-from decimal import Decimal, ROUND_DOWN
-from typing import Dict, Tuple, Optional
+from decimal import Decimal
+from typing import Dict, List, Tuple, Optional
+from yarl import URL
+from server_clock import ServerClock, TIMESTAMP_ERROR_CODES
+from fixed_point import InstrumentUnits, to_quote
+from instrument_cache import InstrumentCache
+from metrics import metrics
+from rate_limiter import RateGovernor, RATE_LIMIT_CODES, PRIORITY_SELL, PRIORITY_ORDER
 
 # Constants
 EXCHANGE_CONFIG = {
     'Bybit Demo': {'base_url': 'https://api-demo.bybit.com'},
-    'Bybit Main': {'base_url': 'https://api.bybit.com'}
+    'Bybit Main': {'base_url': 'https://api.bybit.com'},
+    'Bybit Sim': {'base_url': 'http://127.0.0.1:8321'}   # simulator.py (paper trading local)
 }
 RECV_WINDOW = "5000"
+DEFAULT_SYMBOL = "BTCUSDT"
+BATCH_MAX_ORDERS = 10  # limite de ordens por requisição batch da V5 (spot)
+ORDER_NOT_FOUND_CODES = {110001}  # cancelamento de ordem que já não existe conta como sucesso
+
+# Pool de conexões HTTP keep-alive partilhado por todas as chamadas do cliente
+HTTP_POOL_LIMIT = 20
+HTTP_KEEPALIVE_TIMEOUT = 60
+HTTP_TIMEOUT = 10
+RETRY_DELAY = 5  # segundos entre tentativas da estratégia quando a falha não foi por limite de requisições
+HISTORY_MAX_PAGES = 20  # páginas por consulta de histórico (execuções/ordens) ao recuperar uma desconexão
 
 class BybitRestClient:
     def __init__(self, config: Dict, logger: logging.Logger, error_logger: logging.Logger):
         self.base_url = EXCHANGE_CONFIG[config['exchange']]['base_url']
         self.api_key = config['api_key']
         self.api_secret = config['api_secret']
-        self.session = requests.Session()
-        self.session.headers.update({"Content-Type": "application/json"})
-        self.server_time_offset = 0
+        self.session: Optional[aiohttp.ClientSession] = None
         self.logger = logger
         self.error_logger = error_logger
+        self.clock = ServerClock(self._fetch_server_time_ms, logger, error_logger)
+        self.instruments = InstrumentCache(self._fetch_instruments, config['exchange'], logger, error_logger)
+        self.limits = RateGovernor(URL(self.base_url).host, logger, error_logger)
 
-    def sync_server_time(self):
-        try:
-            response = self.session.get(f"{self.base_url}/v5/market/time")
-            data = response.json()
-            server_time_ms = int(data["result"]["timeNano"]) // 1_000_000
-            local_time_ms = int(time.time() * 1000)
-            self.server_time_offset = (server_time_ms - local_time_ms) / 1000
-            self.logger.info(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] ⏰ Offset de tempo ajustado: {self.server_time_offset:.3f} segundos\n")
-        except Exception as e:
-            self.error_logger.error(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] Falha ao sincronizar horário: {e}")
+    def units(self, symbol: str = DEFAULT_SYMBOL) -> InstrumentUnits:
+        """Escalas de preço/quantidade do símbolo usadas para converter os inteiros da estratégia nas ordens."""
+        return self.instruments.units(symbol)
+
+    async def load_instruments(self, force: bool = False) -> bool:
+        """Tick, lote e mínimos de todos os pares (cache em disco com TTL); chamado uma vez ao iniciar."""
+        return await self.instruments.load(force)
+
+    @property
+    def server_time_offset(self) -> float:
+        return self.clock.offset_ms / 1000
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        """Cria a sessão HTTP sob demanda (precisa de um loop de eventos ativo)."""
+        if self.session is None or self.session.closed:
+            connector = aiohttp.TCPConnector(limit=HTTP_POOL_LIMIT, keepalive_timeout=HTTP_KEEPALIVE_TIMEOUT, ttl_dns_cache=300)
+            self.session = aiohttp.ClientSession(
+                connector=connector,
+                headers={"Content-Type": "application/json"},
+                timeout=aiohttp.ClientTimeout(total=HTTP_TIMEOUT)
+            )
+        return self.session
+
+    async def close(self):
+        """Fecha a sessão HTTP e libera as conexões do pool."""
+        await self.clock.stop()
+        if self.session and not self.session.closed:
+            await self.session.close()
+        self.session = None
+
+    @staticmethod
+    def _build_query(params: Dict) -> str:
+        return '&'.join([f"{k}={str(v).replace(',', '%2C')}" for k, v in sorted(params.items())])
+
+    def _observe_limits(self, endpoint: str, response: aiohttp.ClientResponse):
+        if response.status == 403:
+            self.limits.on_ip_ban()
+        self.limits.observe(endpoint, response.headers, self.clock.offset_ms)
+
+    async def _retry_after_error(self, endpoint: str, data: Dict, headers, signed: bool) -> bool:
+        """Trata os erros que valem uma segunda tentativa imediata: relógio fora da janela ou limite de requisições."""
+        code = data.get('retCode')
+        if code in RATE_LIMIT_CODES:
+            # A próxima acquire() espera exatamente até o reset informado pela exchange
+            self.limits.on_rate_limited(endpoint, headers, self.clock.offset_ms)
+            return True
+        if signed and code in TIMESTAMP_ERROR_CODES:
+            await self.clock.on_timestamp_error()
+            return True
+        return False
+
+    async def _get(self, endpoint: str, params: Dict, signed: bool = True, priority: Optional[int] = None) -> Dict:
+        # A query string é montada à mão para ser exatamente a mesma usada na assinatura
+        query = self._build_query(params)
+        url = URL(f"{self.base_url}{endpoint}{'?' + query if query else ''}", encoded=True)
+        for attempt in range(2):
+            await self.limits.acquire(endpoint, priority)
+            headers = self._get_auth_headers(params, "GET") if signed else None
+            start = metrics.clock()
+            async with self._get_session().get(url, headers=headers) as response:
+                self._observe_limits(endpoint, response)
+                data = await response.json(content_type=None)
+            metrics.observe('rest_roundtrip', start, endpoint)
+            if attempt == 1 or not await self._retry_after_error(endpoint, data, response.headers, signed):
+                return data
+        return data
+
+    async def _post(self, endpoint: str, params: Dict, priority: Optional[int] = None) -> Dict:
+        body = json.dumps(params)
+        for attempt in range(2):
+            await self.limits.acquire(endpoint, priority)
+            headers = self._get_auth_headers(params, "POST")
+            start = metrics.clock()
+            async with self._get_session().post(self.base_url + endpoint, data=body, headers=headers) as response:
+                self._observe_limits(endpoint, response)
+                response.raise_for_status()
+                data = await response.json(content_type=None)
+            metrics.observe('rest_roundtrip', start, endpoint)
+            if attempt == 1 or not await self._retry_after_error(endpoint, data, response.headers, True):
+                return data
+        return data
+
+    async def backoff(self, fallback: float = RETRY_DELAY):
+        """Pausa antes de uma nova tentativa: até o reset do limite se a falha foi por excesso de requisições, senão `fallback`."""
+        delay = self.limits.retry_after()
+        await asyncio.sleep(fallback if delay is None else delay)
+
+    async def _fetch_server_time_ms(self) -> int:
+        data = await self._get("/v5/market/time", {}, signed=False)
+        return int(data["result"]["timeNano"]) // 1_000_000
+
+    async def _fetch_instruments(self) -> List[Dict]:
+        instruments, cursor = [], None
+        while True:
+            params = {"category": "spot"}
+            if cursor:
+                params["cursor"] = cursor
+            data = await self._get("/v5/market/instruments-info", params, signed=False)
+            if data.get('retCode') != 0:
+                raise RuntimeError(data.get('retMsg', 'Erro desconhecido'))
+            instruments.extend(data['result'].get('list', []))
+            cursor = data['result'].get('nextPageCursor')
+            if not cursor:
+                return instruments
+
+    async def sync_server_time(self):
+        """Sincronização completa do relógio; depois disso o ServerClock se mantém sozinho."""
+        await self.clock.resync()
 
     def _generate_signature(self, params: Dict, method: str, timestamp: str) -> str:
-        param_str = '&'.join([f"{k}={str(v).replace(',', '%2C')}" for k, v in sorted(params.items())]) if method == "GET" else json.dumps(params)
+        param_str = self._build_query(params) if method == "GET" else json.dumps(params)
         sign_str = timestamp + self.api_key + RECV_WINDOW + param_str
         return hmac.new(self.api_secret.encode('utf-8'), sign_str.encode('utf-8'), hashlib.sha256).hexdigest()
 
     def _get_auth_headers(self, params: Dict, method: str) -> Dict:
-        timestamp = str(int(time.time() * 1000 + self.server_time_offset * 1000))
+        timestamp = str(self.clock.now_ms())
+        start = metrics.clock()
         signature = self._generate_signature(params, method, timestamp)
+        metrics.observe('rest_sign', start)
         return {
             "X-BAPI-API-KEY": self.api_key,
             "X-BAPI-TIMESTAMP": timestamp,
@@ -53,13 +170,12 @@ class BybitRestClient:
             "X-BAPI-SIGN": signature
         }
 
-    def validate_api_keys(self) -> Tuple[bool, str]:
+    async def validate_api_keys(self) -> Tuple[bool, str]:
         endpoint = "/v5/account/info"
         params = {}
         try:
-            self.sync_server_time()
-            response = self.session.get(self.base_url + endpoint, headers=self._get_auth_headers(params, "GET"), params=params)
-            data = response.json()
+            await self.sync_server_time()
+            data = await self._get(endpoint, params)
             if data.get('retCode') == 0:
                 return True, "✅ Conexão com chaves API bem sucedida!"
             else:
@@ -67,48 +183,39 @@ class BybitRestClient:
         except Exception as e:
             return False, f"⚠️ Erro ao validar chaves API: {str(e)}"
 
-    def get_balances(self) -> Tuple[Decimal, Decimal, bool]:
+    async def get_wallet_balances(self, coins) -> Optional[Dict[str, Decimal]]:
+        """Busca o saldo de várias moedas numa única requisição. Moedas sem saldo voltam como zero."""
         endpoint = "/v5/account/wallet-balance"
         try:
-            self.sync_server_time()
-            params_usdt = {"accountType": "UNIFIED", "coin": "USDT"}
-            response_usdt = self.session.get(self.base_url + endpoint, headers=self._get_auth_headers(params_usdt, "GET"),
-                                             params=params_usdt)
-            data_usdt = response_usdt.json()
-            if data_usdt.get('retCode') != 0:
-                self.error_logger.error(f"Erro USDT: {data_usdt.get('retMsg')}")
-                return Decimal('0'), Decimal('0'), False
-            usdt_balance = Decimal(data_usdt['result']['list'][0]['coin'][0]['walletBalance'])
-
-            params_btc = {"accountType": "UNIFIED", "coin": "BTC"}
-            response_btc = self.session.get(self.base_url + endpoint, headers=self._get_auth_headers(params_btc, "GET"),
-                                            params=params_btc)
-            data_btc = response_btc.json()
-            if data_btc.get('retCode') != 0:
-                self.error_logger.error(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] Erro BTC: {data_btc.get('retMsg')}")
-                return Decimal('0'), Decimal('0'), False
-            btc_balance = Decimal(data_btc['result']['list'][0]['coin'][0]['walletBalance'])
-
-            self.logger.info(f"\n💰 Saldos Atuais:\nBTC: {btc_balance:.8f}\nUSDT: {usdt_balance:.2f}\n")
-            return btc_balance, usdt_balance, True
+            params = {"accountType": "UNIFIED", "coin": ",".join(coins)}
+            data = await self._get(endpoint, params)
+            if data.get('retCode') != 0:
+                self.error_logger.error("Erro ao obter saldos %s: %s", params['coin'], data.get('retMsg'))
+                return None
+            balances = {coin: Decimal('0') for coin in coins}
+            for account in data['result']['list']:
+                for entry in account.get('coin', []):
+                    if entry.get('coin') in balances:
+                        balances[entry['coin']] = Decimal(entry.get('walletBalance') or '0')
+            return balances
         except Exception as e:
-            self.error_logger.error(f"\n[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] ⚠️ Erro ao obter saldos: {str(e)}")
-            return Decimal('0'), Decimal('0'), False
+            self.error_logger.error("\n⚠️ Erro ao obter saldos: %s", e)
+            return None
 
-    def place_order(self, side: str, qty: str, order_type: str, price: str, fee: float) -> Optional[str]:
+    async def place_order(self, side: str, qty: int, order_type: str, price: Optional[int], fee: float, symbol: str = DEFAULT_SYMBOL) -> Optional[str]:
         endpoint = "/v5/order/create"
-        params = self._create_order_params(side, qty, order_type, price, fee)
+        params = self._create_order_params(side, qty, order_type, price, fee, symbol)
         if params is None:
             return None
-        data = self._send_order_request(params, endpoint)
+        data = await self._send_order_request(params, endpoint, PRIORITY_SELL if side.lower() == "sell" else PRIORITY_ORDER)
         return self._process_order_response(data, side, params)
 
-    def _create_order_params(self, side: str, qty: str, order_type: str, price: str, fee: float) -> Optional[Dict]:
-        is_rebuy = side.lower() == "buy"  # Simplified for this module
-        actual_qty_usdt = Decimal(str(qty))
+    def _create_order_params(self, side: str, qty: int, order_type: str, price: Optional[int], fee: float, symbol: str = DEFAULT_SYMBOL) -> Optional[Dict]:
+        """Converte os inteiros da estratégia nos parâmetros da V5: compra em unidades de cotação, venda em lotes, preço em ticks."""
+        units = self.units(symbol)
         params = {
             "category": "spot",
-            "symbol": "BTCUSDT",
+            "symbol": symbol,
             "side": side.capitalize(),
             "orderType": order_type,
             "timeInForce": "GTC" if order_type == "Limit" else "IOC",
@@ -116,118 +223,259 @@ class BybitRestClient:
         }
         if side.lower() == "buy":
             if order_type == "Market":
-                params["qty"] = f"{actual_qty_usdt:.2f}"
-                self.logger.info(f"🛒 Enviando ordem de compra a mercado. Quantidade: {actual_qty_usdt:.2f} USDT\n")
+                if qty < max(1, units.min_notional):
+                    self.error_logger.error("⚠️ Compra a mercado de %.2f USDT abaixo do mínimo de %s (%g)!", to_quote(qty), symbol, to_quote(units.min_notional))
+                    return None
+                params["qty"] = units.quote_str(qty)
+                self.logger.info("🛒 Enviando ordem de compra a mercado. Quantidade: %s USDT\n", params['qty'])
             elif order_type == "Limit" and price:
-                try:
-                    price_decimal = Decimal(str(price)).quantize(Decimal('1'), rounding=ROUND_DOWN)
-                    if price_decimal > 0:
-                        actual_qty_btc = actual_qty_usdt / price_decimal
-                        params["qty"] = f"{actual_qty_btc:.6f}"
-                        params["price"] = str(int(price_decimal))
-                        self.logger.info(f"🔍 Convertendo {actual_qty_usdt:.2f} USDT para {actual_qty_btc:.6f} BTC a {price_decimal:.0f} USDT/BTC")
-                    else:
-                        self.error_logger.error(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] ⚠️ Preço da ordem limite inválido!")
-                        return None
-                except Exception as e:
-                    self.error_logger.error(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] ⚠️ Erro ao calcular qty BTC para ordem limite: {e}")
+                if price <= 0:
+                    self.error_logger.error("⚠️ Preço da ordem limite inválido!")
                     return None
+                lots = units.lots_for(qty, price)
+                if units.below_minimum(price, lots):
+                    self.error_logger.error("⚠️ Compra de %.8g a %.8g abaixo do mínimo de %s!", units.qty(lots), units.price(price), symbol)
+                    return None
+                params["qty"] = units.qty_str(lots)
+                params["price"] = units.price_str(price)
+                self.logger.info("🔍 Convertendo %.2f USDT para %s BTC a %s USDT/BTC", to_quote(qty), params['qty'], params['price'])
         elif side.lower() == "sell" and price:
-            price_decimal = Decimal(str(price)).quantize(Decimal('1'), rounding=ROUND_DOWN)
-            params["qty"] = qty
-            params["price"] = str(int(price_decimal))
-            usdt_value = Decimal(qty) * price_decimal
-            self.logger.info(f"📈 Calculando ordem de venda limite: Quantidade: {qty} BTC, Preço: {price_decimal:.0f} USDT/BTC, Valor: {usdt_value:.2f} USDT")
+            if units.below_minimum(price, qty):
+                self.error_logger.error("⚠️ Venda de %.8g a %.8g abaixo do mínimo de %s!", units.qty(qty), units.price(price), symbol)
+                return None
+            params["qty"] = units.qty_str(qty)
+            params["price"] = units.price_str(price)
+            self.logger.info("📈 Calculando ordem de venda limite: Quantidade: %s BTC, Preço: %s USDT/BTC, Valor: %.2f USDT", params['qty'], params['price'], to_quote(units.notional(price, qty)))
         if "qty" not in params:
-            self.error_logger.error(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] ⚠️ Erro ao criar parâmetros da ordem: quantidade ausente!")
+            self.error_logger.error("⚠️ Erro ao criar parâmetros da ordem: quantidade ausente!")
             return None
         return params
 
-    def _send_order_request(self, params: Dict, endpoint: str) -> Optional[Dict]:
+    async def _send_order_request(self, params: Dict, endpoint: str, priority: Optional[int] = None) -> Optional[Dict]:
+        start = metrics.clock()
         try:
-            response = self.session.post(self.base_url + endpoint, json=params, headers=self._get_auth_headers(params, "POST"))
-            response.raise_for_status()
-            return response.json()
+            data = await self._post(endpoint, params, priority)
         except Exception as e:
-            self.error_logger.error(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] ⚠️ Erro na requisição para {endpoint}: {str(e)}")
+            metrics.inc('order_request_errors', endpoint)
+            self.error_logger.error("⚠️ Erro na requisição para %s: %s", endpoint, e)
             return None
+        # Da fila do controle de taxa até a resposta, incluindo a assinatura e uma eventual segunda tentativa
+        metrics.observe('order_request', start, endpoint)
+        if data.get('retCode') != 0:
+            metrics.inc('order_rejected', f"{endpoint} {data.get('retCode')}")
+        return data
 
     def _process_order_response(self, data: Optional[Dict], side: str, params: Dict) -> Optional[str]:
         if data is None:
-            self.error_logger.error(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] Falha na ordem {side}: Resposta nula da API.")
+            self.error_logger.error("Falha na ordem %s: Resposta nula da API.", side)
             return None
         if data.get('retCode') == 0:
             order_id = data['result']['orderId']
             executed_qty = data['result'].get('cumExecQty', params.get('qty', 'N/A'))
-            self.logger.info(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] ✅ Ordem {side} enviada! ID: {order_id} | Qty: {executed_qty} | Price: {params.get('price', 'Mercado')}")
+            self.logger.info("✅ Ordem %s enviada! ID: %s | Qty: %s | Price: %s", side, order_id, executed_qty, params.get('price', 'Mercado'))
             return order_id
         else:
-            self.error_logger.error(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] Falha na ordem {side}: {data.get('retMsg')}\n")
+            self.error_logger.error("Falha na ordem %s: %s\n", side, data.get('retMsg'))
             return None
 
-    async def cancel_order(self, order_id: str) -> bool:
+    async def cancel_order(self, order_id: str, symbol: str = DEFAULT_SYMBOL) -> bool:
         endpoint = "/v5/order/cancel"
-        params = {"category": "spot", "symbol": "BTCUSDT", "orderId": order_id}
+        params = {"category": "spot", "symbol": symbol, "orderId": order_id}
         try:
-            response = self.session.post(self.base_url + endpoint, json=params,
-                                         headers=self._get_auth_headers(params, "POST"))
-            data = response.json()
-            if data.get('retCode') == 0 or data.get('retCode') == 110001:
-                self.logger.info(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] ✅ Ordem {order_id} cancelada com sucesso!\n")
+            data = await self._post(endpoint, params)
+            if data.get('retCode') == 0 or data.get('retCode') in ORDER_NOT_FOUND_CODES:
+                self.logger.info("✅ Ordem %s cancelada com sucesso!\n", order_id)
                 return True
             else:
-                self.logger.info(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] ❌ Falha ao cancelar ordem {order_id}: {data.get('retMsg')}")
+                self.logger.info("❌ Falha ao cancelar ordem %s: %s", order_id, data.get('retMsg'))
                 return False
         except Exception as e:
-            self.logger.info(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] ⚠️ Erro ao cancelar ordem {order_id}: {str(e)}")
+            self.logger.info("⚠️ Erro ao cancelar ordem %s: %s", order_id, e)
             return False
 
-    def get_order_details(self, order_id: str, max_retries: int = 3) -> Dict:
+    async def amend_order(self, order_id: str, qty: Optional[int] = None, price: Optional[int] = None, symbol: str = DEFAULT_SYMBOL) -> bool:
+        """Altera quantidade (lotes) e/ou preço (ticks) de uma ordem limite em aberto, mantendo o mesmo orderId."""
+        endpoint = "/v5/order/amend"
+        units = self.units(symbol)
+        params = {"category": "spot", "symbol": symbol, "orderId": order_id}
+        if qty is not None:
+            params["qty"] = units.qty_str(qty)
+        if price is not None:
+            params["price"] = units.price_str(price)
+        data = await self._send_order_request(params, endpoint)
+        if data and data.get('retCode') == 0:
+            self.logger.info("✏️ Ordem %s alterada! Qty: %s | Price: %s", order_id, params.get('qty', '-'), params.get('price', '-'))
+            return True
+        self.error_logger.error("Falha ao alterar ordem %s: %s", order_id, data.get('retMsg') if data else 'Resposta nula da API.')
+        return False
+
+    async def _send_batch_request(self, endpoint: str, items: List[Dict], priority: Optional[int] = None) -> List[Tuple[Optional[Dict], int, str]]:
+        """Envia os itens em lotes de até BATCH_MAX_ORDERS e devolve (resultado, código, mensagem) por item, na mesma ordem."""
+        results = []
+        for start in range(0, len(items), BATCH_MAX_ORDERS):
+            chunk = items[start:start + BATCH_MAX_ORDERS]
+            data = await self._send_order_request({"category": "spot", "request": chunk}, endpoint, priority)
+            if data is None or data.get('retCode') != 0:
+                msg = data.get('retMsg') if data else 'Resposta nula da API.'
+                results.extend((None, -1, msg) for _ in chunk)
+                continue
+            item_results = data.get('result', {}).get('list', [])
+            item_infos = data.get('retExtInfo', {}).get('list', [])
+            for idx in range(len(chunk)):
+                info = item_infos[idx] if idx < len(item_infos) else {}
+                result = item_results[idx] if idx < len(item_results) else None
+                results.append((result, int(info.get('code', 0 if result else -1)), info.get('msg', '')))
+        return results
+
+    async def batch_place_orders(self, orders: List[Tuple[str, int, str, Optional[int]]], fee: float, symbol: str = DEFAULT_SYMBOL) -> List[Optional[str]]:
+        """Cria várias ordens numa única requisição. Cada ordem é (side, qty, order_type, price); devolve o orderId de cada uma ou None."""
+        endpoint = "/v5/order/create-batch"
+        items = []
+        for side, qty, order_type, price in orders:
+            params = self._create_order_params(side, qty, order_type, price, fee, symbol)
+            if params is not None:
+                params.pop("category")
+            items.append(params)
+        valid = [p for p in items if p is not None]
+        priority = PRIORITY_SELL if any(side.lower() == "sell" for side, *_ in orders) else PRIORITY_ORDER
+        responses = iter(await self._send_batch_request(endpoint, valid, priority) if valid else [])
+        order_ids = []
+        for (side, *_), params in zip(orders, items):
+            if params is None:
+                order_ids.append(None)
+                continue
+            result, code, msg = next(responses)
+            if code == 0 and result and result.get('orderId'):
+                self.logger.info("✅ Ordem %s enviada (batch)! ID: %s | Qty: %s | Price: %s", side, result['orderId'], params['qty'], params.get('price', 'Mercado'))
+                order_ids.append(result['orderId'])
+            else:
+                self.error_logger.error("Falha na ordem %s (batch): %s\n", side, msg)
+                order_ids.append(None)
+        return order_ids
+
+    async def batch_amend_orders(self, amendments: List[Dict], symbol: str = DEFAULT_SYMBOL) -> List[bool]:
+        """Altera várias ordens numa única requisição. Cada item: {"orderId", "qty"? (lotes), "price"? (ticks)}."""
+        endpoint = "/v5/order/amend-batch"
+        units = self.units(symbol)
+        items = []
+        for amendment in amendments:
+            item = {"symbol": symbol, "orderId": amendment["orderId"]}
+            if amendment.get("qty") is not None:
+                item["qty"] = units.qty_str(amendment["qty"])
+            if amendment.get("price") is not None:
+                item["price"] = units.price_str(amendment["price"])
+            items.append(item)
+        results = []
+        for item, (_, code, msg) in zip(items, await self._send_batch_request(endpoint, items)):
+            if code != 0:
+                self.error_logger.error("Falha ao alterar ordem %s (batch): %s", item['orderId'], msg)
+            results.append(code == 0)
+        return results
+
+    async def batch_cancel_orders(self, order_ids: List[str], symbol: str = DEFAULT_SYMBOL) -> List[bool]:
+        """Cancela várias ordens numa única requisição; devolve o sucesso de cada uma."""
+        endpoint = "/v5/order/cancel-batch"
+        items = [{"symbol": symbol, "orderId": order_id} for order_id in order_ids]
+        results = []
+        for order_id, (_, code, msg) in zip(order_ids, await self._send_batch_request(endpoint, items)):
+            ok = code == 0 or code in ORDER_NOT_FOUND_CODES
+            if ok:
+                self.logger.info("✅ Ordem %s cancelada com sucesso!\n", order_id)
+            else:
+                self.logger.info("❌ Falha ao cancelar ordem %s: %s", order_id, msg)
+            results.append(ok)
+        return results
+
+    async def get_open_orders(self, symbol: str = DEFAULT_SYMBOL) -> Optional[Dict[str, Dict]]:
+        """Ordens em aberto do símbolo indexadas por orderId (uma página de até 50), ou None em caso de erro."""
+        endpoint = "/v5/order/realtime"
+        params = {"category": "spot", "symbol": symbol, "openOnly": 0, "limit": 50}
+        try:
+            data = await self._get(endpoint, params)
+            if data.get('retCode') != 0:
+                self.error_logger.error("Erro ao listar ordens abertas de %s: %s", symbol, data.get('retMsg'))
+                return None
+            return {order['orderId']: order for order in data['result']['list']}
+        except Exception as e:
+            self.error_logger.error("⚠️ Erro ao listar ordens abertas de %s: %s", symbol, e)
+            return None
+
+    async def _get_pages(self, endpoint: str, params: Dict, what: str, max_pages: int = HISTORY_MAX_PAGES) -> Optional[List[Dict]]:
+        """Todas as páginas (cursor da V5) de uma consulta de histórico, ou None em caso de erro."""
+        items, params = [], dict(params)
+        try:
+            for _ in range(max_pages):
+                data = await self._get(endpoint, params)
+                if data.get('retCode') != 0:
+                    self.error_logger.error("Erro ao listar %s: %s", what, data.get('retMsg'))
+                    return None
+                items.extend(data['result']['list'])
+                cursor = data['result'].get('nextPageCursor')
+                if not cursor:
+                    return items
+                params["cursor"] = cursor
+            self.error_logger.warning("⚠️ %s: limite de %s páginas atingido; itens mais antigos ignorados", what.capitalize(), max_pages)
+            return items
+        except Exception as e:
+            self.error_logger.error("⚠️ Erro ao listar %s: %s", what, e)
+            return None
+
+    async def get_executions(self, start_ms: int, symbol: Optional[str] = None) -> Optional[List[Dict]]:
+        """Execuções spot desde `start_ms` (horário do servidor), no formato do tópico `execution`."""
+        params = {"category": "spot", "startTime": start_ms, "limit": 100}
+        if symbol:
+            params["symbol"] = symbol
+        return await self._get_pages("/v5/execution/list", params, "execuções")
+
+    async def get_order_history(self, start_ms: int, symbol: Optional[str] = None) -> Optional[List[Dict]]:
+        """Ordens spot atualizadas desde `start_ms` (encerradas), no formato do tópico `order`."""
+        params = {"category": "spot", "startTime": start_ms, "limit": 50}
+        if symbol:
+            params["symbol"] = symbol
+        return await self._get_pages("/v5/order/history", params, "histórico de ordens")
+
+    async def get_order_details(self, order_id: str, max_retries: int = 3) -> Dict:
         # Primeiro tenta buscar em ordens ativas
         realtime_endpoint = "/v5/order/realtime"
         history_endpoint = "/v5/order/history"
         params = {"category": "spot", "orderId": order_id}
-        
+
         for attempt in range(max_retries):
             try:
                 # Primeiro tenta ordens ativas
-                response = self.session.get(self.base_url + realtime_endpoint, 
-                                        headers=self._get_auth_headers(params, "GET"), params=params)
-                data = response.json()
-                
+                data = await self._get(realtime_endpoint, params)
+
                 # Se não encontrar em ordens ativas, tenta no histórico
                 if not (data.get('retCode') == 0 and data.get('result', {}).get('list')):
-                    response = self.session.get(self.base_url + history_endpoint, 
-                                            headers=self._get_auth_headers(params, "GET"), params=params)
-                    data = response.json()
-                
-                self.logger.info(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] 🔍 Resposta da API para ordem {order_id} (tentativa {attempt + 1}):")
-                
+                    data = await self._get(history_endpoint, params)
+
+                self.logger.info("🔍 Resposta da API para ordem %s (tentativa %s):", order_id, attempt + 1)
+
                 if data.get('retCode') == 0 and data.get('result', {}).get('list'):
                     order = data['result']['list'][0]
                     price = Decimal(order.get('avgPrice', '0') or '0')
                     qty = Decimal(order.get('cumExecQty', '0') or '0')
-                    
+
                     if price == 0 or qty == 0:
                         if attempt < max_retries - 1:
-                            self.logger.info(f"\n[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] ⚠️ Dados inválidos recebidos, tentando novamente em 1 segundo...")
-                            time.sleep(1)
+                            self.logger.info("\n⚠️ Dados inválidos recebidos, tentando novamente em 1 segundo...")
+                            await asyncio.sleep(1)
                             continue
-                            
+
                     return {"price": price, "qty": qty, "status": order.get('orderStatus', 'Unknown')}
-                    
+
                 if attempt < max_retries - 1:
-                    self.logger.info(f"\n[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] ⚠️ Resposta inválida, tentando novamente em 1 segundo...")
-                    time.sleep(1)
+                    self.logger.info("\n⚠️ Resposta inválida, tentando novamente em 1 segundo...")
+                    await asyncio.sleep(1)
                     continue
-                    
-                self.logger.info(f"\n[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] ⚠️ Ordem não encontrada ou resposta inválida após {max_retries} tentativas")
+
+                self.logger.info("\n⚠️ Ordem não encontrada ou resposta inválida após %s tentativas", max_retries)
                 return {"price": 0, "qty": 0, "status": "Unknown"}
-                
+
             except Exception as e:
-                self.error_logger.error(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] Erro ao obter detalhes da ordem (tentativa {attempt + 1}): {e}")
+                self.error_logger.error("Erro ao obter detalhes da ordem (tentativa %s): %s", attempt + 1, e)
                 if attempt < max_retries - 1:
-                    time.sleep(1)
+                    await asyncio.sleep(1)
                     continue
-                    
+
         return {"price": 0, "qty": 0, "status": "Unknown"}
\ No newline at end of file
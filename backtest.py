@@ -0,0 +1,319 @@
+# backtest.py
+import argparse
+import csv
+import logging
+import mmap
+import os
+import struct
+import time
+from array import array
+from decimal import Decimal
+from typing import Dict, Optional
+from fixed_point import QUOTE_SCALE, fee_on, quote_units, to_quote
+from instrument_cache import cached_units
+from main import BybitTrader, symbol_from_pair
+from menu import carregar_estrategia_de_arquivo
+
+BACKTEST_CAPITAL = Decimal('10000')   # saldo inicial padrão em moeda de cotação
+INF = float('inf')
+CANDLES_MAGIC = b'CORYOHLC'           # cabeçalho do arquivo binário de candles: magic + quantidade (int64)
+CANDLES_HEADER = struct.Struct('<8sq')
+
+# Logger silencioso: as regras do BybitTrader continuam logando, mas nada é gravado durante a simulação
+silent_logger = logging.getLogger('backtest')
+silent_logger.propagate = False
+silent_logger.disabled = True
+
+
+class Candles:
+    """Colunas OHLC em arrays de double (8 bytes por valor, sem objetos por candle).
+
+    As colunas podem ser `array('d')` ou memoryviews sobre um arquivo mapeado em memória
+    (`map_candles`), o que permite a vários processos ler os mesmos dados sem cópia.
+    """
+
+    __slots__ = ("open", "high", "low", "close", "_mmap")
+
+    def __init__(self):
+        self.open = array('d')
+        self.high = array('d')
+        self.low = array('d')
+        self.close = array('d')
+        self._mmap = None
+
+    def __len__(self) -> int:
+        return len(self.close)
+
+
+def save_candles_binary(candles: Candles, path: str):
+    """Grava as colunas contíguas (open, high, low, close) para leitura via mmap."""
+    with open(path, 'wb') as f:
+        f.write(CANDLES_HEADER.pack(CANDLES_MAGIC, len(candles)))
+        for column in (candles.open, candles.high, candles.low, candles.close):
+            f.write(array('d', column).tobytes())
+
+def map_candles(path: str) -> Candles:
+    """Mapeia um arquivo de save_candles_binary sem copiar os dados para a memória do processo."""
+    candles = Candles()
+    with open(path, 'rb') as f:
+        candles._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    magic, n = CANDLES_HEADER.unpack_from(candles._mmap, 0)
+    if magic != CANDLES_MAGIC:
+        raise ValueError(f"{path} não é um arquivo de candles do backtest")
+    view = memoryview(candles._mmap)
+    offset, size = CANDLES_HEADER.size, n * 8
+    candles.open, candles.high, candles.low, candles.close = (
+        view[offset + k * size: offset + (k + 1) * size].cast('d') for k in range(4))
+    return candles
+
+def cached_candles_binary(csv_path: str) -> str:
+    """Converte o CSV para o formato binário uma única vez (refeito se o CSV for mais novo)."""
+    bin_path = os.path.splitext(csv_path)[0] + '.ohlc'
+    if not os.path.exists(bin_path) or os.path.getmtime(bin_path) < os.path.getmtime(csv_path):
+        save_candles_binary(load_candles(csv_path), bin_path)
+    return bin_path
+
+
+def load_candles(path: str) -> Candles:
+    """Lê um CSV de candles (open/high/low/close) ou de trades (price); sem cabeçalho assume timestamp,open,high,low,close."""
+    candles = Candles()
+    with open(path, 'r', encoding='utf-8', newline='') as f:
+        reader = csv.reader(f)
+        first = next(reader, None)
+        if first is None:
+            return candles
+        try:
+            float(first[1])
+            header = None
+        except (ValueError, IndexError):
+            header = [column.strip().lower() for column in first]
+
+        if header is None or 'open' in header:
+            cols = [1, 2, 3, 4] if header is None else [header.index(name) for name in ('open', 'high', 'low', 'close')]
+            o, h, l, c = cols
+            append_o, append_h, append_l, append_c = candles.open.append, candles.high.append, candles.low.append, candles.close.append
+            rows = reader if header is not None else _chain_first(first, reader)
+            for row in rows:
+                append_o(float(row[o]))
+                append_h(float(row[h]))
+                append_l(float(row[l]))
+                append_c(float(row[c]))
+        else:
+            # Trades: cada negócio vira um candle com OHLC iguais ao preço
+            p = header.index('price')
+            prices = array('d', (float(row[p]) for row in reader))
+            candles.open, candles.high, candles.low, candles.close = prices, prices, prices, prices
+    return candles
+
+def _chain_first(first, reader):
+    yield first
+    yield from reader
+
+
+class BacktestTrader(BybitTrader):
+    """BybitTrader sem rede: as mesmas regras de quantidade, preço, recompra e lucro, sem clientes REST/WS."""
+
+    def __init__(self, config: Dict, logger: logging.Logger = silent_logger):
+        self.logger = logger
+        self.error_logger = logger
+        self.par = config.get('par', 'BTC/USDT')
+        self.symbol, self.base_coin, self.quote_coin = symbol_from_pair(self.par)
+        # Tick/lote do último cache de instrumentos da exchange (o mesmo usado nas ordens reais), sem rede
+        self.units = cached_units(config.get('exchange', 'Bybit Demo'), self.symbol)
+        self.journal = None
+        self.ledger = None
+        self.market_data = None
+        self._init_strategy(config)
+
+
+class Backtester:
+    """Exchange simulada com casamento de ordens limite sobre candles, dirigindo as regras reais do BybitTrader.
+
+    Entre eventos o laço só compara a mínima com a recompra e a máxima com a venda; toda a aritmética
+    inteira da estratégia roda apenas quando uma ordem é executada. As ordens colocadas num candle só
+    podem ser executadas a partir do candle seguinte. Se venda e recompra são tocadas no mesmo candle,
+    candle de baixa executa a venda primeiro (O→H→L→C) e candle de alta a recompra (O→L→H→C).
+
+    Saldos em inteiros como no trader: moeda de cotação em unidades de fixed_point, moeda base em lotes
+    (a taxa da compra, descontada da moeda base, é arredondada para cima como na CyclePosition). Os
+    preenchimentos chegam ao trader como Decimal, no mesmo formato dos detalhes de ordem da exchange.
+    """
+
+    def __init__(self, config: Dict, capital: Decimal = BACKTEST_CAPITAL, logger: logging.Logger = silent_logger):
+        self.trader = BacktestTrader(config, logger)
+        self.units = self.trader.units
+        self.lot_value = self.units.lot * QUOTE_SCALE   # unidades de cotação por lote a preço 1
+        self.capital = quote_units(capital)
+        self.quote = self.capital
+        self.base = 0
+        self.order_seq = 0
+        self.sell_price: Optional[int] = None
+        self.sell_qty: Optional[int] = None
+        self.rebuy_price: Optional[int] = None
+        self.rebuy_qty: Optional[int] = None
+        self.cycles = 0
+        self.rebuys = 0
+        self.max_rebuys_in_cycle = 0
+        self.max_invested = 0
+        self.peak_equity = to_quote(self.capital)
+        self.max_drawdown = 0.0
+
+    def _equity(self, price: float) -> float:
+        return to_quote(self.quote) + self.base * self.units.lot * price
+
+    def _mark_equity(self, price: float):
+        equity = self._equity(price)
+        if equity > self.peak_equity:
+            self.peak_equity = equity
+
+    def _mark_trough(self, low: float):
+        drawdown = self.peak_equity - self._equity(low)
+        if drawdown > self.max_drawdown:
+            self.max_drawdown = drawdown
+
+    def _order_id(self) -> str:
+        self.order_seq += 1
+        return f"bt-{self.order_seq}"
+
+    def _place_rebuy(self, ticks: int):
+        t = self.trader
+        qty_usdt = t._calculate_qty("Buy", t.qty_initial, is_rebuy=True)
+        if ticks <= 0 or self.quote < qty_usdt:
+            # Mesma pausa do bot real; sem depósitos na simulação, só a venda encerra a pausa
+            t.paused_for_insufficient_balance = True
+            self.rebuy_price = None
+            return
+        self.rebuy_price = ticks
+        self.rebuy_qty = self.units.lots_for(qty_usdt, ticks)
+
+    def _start_cycle(self, market_price: float) -> bool:
+        t = self.trader
+        if self.quote < t.qty_initial:
+            return False
+        t.cycle_id += 1
+        t.current_rebuy_drop = t.rebuy_percent
+        t.current_profit_target = t.profit_target
+        qty_usdt = t._calculate_qty("Buy", t.qty_initial)
+        lots = int(qty_usdt / (market_price * self.lot_value))
+        self.quote -= int(lots * market_price * self.lot_value)
+        self.base += lots - fee_on(lots, t.fee_ppm)
+        t._record_buy({"price": Decimal(repr(market_price)), "qty": self.units.qty_decimal(lots)}, self._order_id())
+        self.sell_price = t._initial_sell_price(market_price)
+        self.sell_qty = lots
+        self._place_rebuy(t._initial_rebuy_price(market_price))
+        return True
+
+    def _fill_sell(self, price: float):
+        t = self.trader
+        proceeds = int(self.sell_qty * price * self.lot_value)
+        self.quote += proceeds - fee_on(proceeds, t.fee_ppm)
+        self.base -= self.sell_qty
+        t._close_cycle({"price": Decimal(repr(price)), "qty": self.units.qty_decimal(self.sell_qty)})
+        self.cycles += 1
+        self.sell_price = self.rebuy_price = None
+
+    def _fill_rebuy(self, price: float):
+        t = self.trader
+        self.quote -= int(self.rebuy_qty * price * self.lot_value)
+        self.base += self.rebuy_qty - fee_on(self.rebuy_qty, t.fee_ppm)
+        t._record_buy({"price": Decimal(repr(price)), "qty": self.units.qty_decimal(self.rebuy_qty)}, self._order_id())
+        t._update_rebuy_parameters()
+        self.rebuys += 1
+        rebuy_count = len(t.cycle_buys) - 1
+        self.max_rebuys_in_cycle = max(self.max_rebuys_in_cycle, rebuy_count)
+        self.max_invested = max(self.max_invested, t.total_investido)
+        params = t._sell_after_rebuy_params()
+        if params is not None:
+            # Equivale ao amend da venda em aberto
+            self.sell_price, self.sell_qty = params
+        if t.rebuys_max > 0 and rebuy_count >= t.rebuys_max:
+            self.rebuy_price = None
+        else:
+            self._place_rebuy(t._next_rebuy_price())
+
+    def run(self, candles: Candles) -> Dict:
+        started = time.perf_counter()
+        o, h, l, c = candles.open, candles.high, candles.low, candles.close
+        n = len(candles)
+        i = 0
+        next_market_price = o[0] if n else 0.0
+        in_cycle = False
+        while i < n:
+            if not in_cycle:
+                if not self._start_cycle(next_market_price):
+                    break
+                in_cycle = True
+                i += 1
+                continue
+            sell_px = self.units.price(self.sell_price) if self.sell_price is not None else INF
+            buy_px = self.units.price(self.rebuy_price) if self.rebuy_price is not None else -INF
+            segment_start = i
+            # Laço quente: nada além de duas comparações por candle até alguma ordem ser tocada
+            while i < n and l[i] > buy_px and h[i] < sell_px:
+                i += 1
+            # Pior momento da posição entre dois eventos (mínima do trecho, incluindo o candle do evento)
+            self._mark_trough(min(l[segment_start:min(i + 1, n)]))
+            if i >= n:
+                break
+            sell_hit = h[i] >= sell_px
+            buy_hit = l[i] <= buy_px
+            if sell_hit and (not buy_hit or c[i] < o[i]):
+                fill = o[i] if o[i] >= sell_px else sell_px
+                self._fill_sell(fill)
+                self._mark_equity(fill)
+                next_market_price = fill
+                in_cycle = False
+            else:
+                fill = o[i] if o[i] <= buy_px else buy_px
+                self._fill_rebuy(fill)
+                self._mark_equity(fill)
+            i += 1
+
+        t = self.trader
+        equity = self._equity(c[n - 1] if n else 0.0)
+        capital = to_quote(self.capital)
+        elapsed = time.perf_counter() - started
+        return {
+            "candles": n,
+            "elapsed_s": elapsed,
+            "candles_per_s": n / elapsed if elapsed > 0 else 0.0,
+            "cycles": self.cycles,
+            "rebuys": self.rebuys,
+            "max_rebuys_in_cycle": self.max_rebuys_in_cycle,
+            "max_invested": to_quote(self.max_invested),
+            "max_drawdown": self.max_drawdown,
+            "max_drawdown_pct": self.max_drawdown / self.peak_equity * 100 if self.peak_equity else 0.0,
+            "total_profit": to_quote(t.total_profit),
+            "open_buys": len(t.cycle_buys),
+            "quote": to_quote(self.quote),
+            "base": self.units.qty(self.base),
+            "equity": equity,
+            "return_pct": (equity / capital - 1) * 100 if capital else 0.0,
+        }
+
+
+def format_report(result: Dict, quote_coin: str = "USDT", base_coin: str = "BTC") -> str:
+    return (
+        f"\n📊 Backtest: {result['candles']} candles em {result['elapsed_s']:.2f}s ({result['candles_per_s'] / 1e6:.2f} M candles/s)\n"
+        f"🔁 Ciclos fechados: {result['cycles']} | Recompras: {result['rebuys']} (máx. {result['max_rebuys_in_cycle']} num ciclo)\n"
+        f"💰 Maior valor investido num ciclo: {result['max_invested']:.2f} {quote_coin}\n"
+        f"📉 Drawdown máximo: {result['max_drawdown']:.2f} {quote_coin} ({result['max_drawdown_pct']:.2f}%)\n"
+        f"💵 Lucro realizado: {result['total_profit']:.2f} {quote_coin}\n"
+        f"📦 Posição aberta: {result['open_buys']} compras, {result['base']:.6f} {base_coin}\n"
+        f"🏦 Patrimônio final: {result['equity']:.2f} {quote_coin} ({result['return_pct']:.2f}%)\n"
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Backtest offline da estratégia de recompra.")
+    parser.add_argument("data", help="CSV de candles (open,high,low,close) ou de trades (price), ou arquivo .ohlc")
+    parser.add_argument("strategy", help="arquivo de estratégia salvo pelo menu (user/strategy/*.json)")
+    parser.add_argument("--capital", default=str(BACKTEST_CAPITAL), help="saldo inicial em moeda de cotação")
+    args = parser.parse_args()
+
+    config = carregar_estrategia_de_arquivo(args.strategy)
+    if config is None:
+        raise SystemExit(f"Estratégia inválida: {args.strategy}")
+    backtester = Backtester(config, Decimal(args.capital))
+    result = backtester.run(map_candles(args.data) if args.data.endswith('.ohlc') else load_candles(args.data))
+    print(format_report(result, backtester.trader.quote_coin, backtester.trader.base_coin))
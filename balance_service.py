@@ -0,0 +1,135 @@
+# balance_service.py
+import asyncio
+import logging
+import time
+from decimal import Decimal
+from typing import Dict, Iterable, Optional
+
+BALANCE_CACHE_TTL = 5.0             # segundos que um snapshot REST é válido enquanto o stream não está ativo
+BALANCE_RECONCILE_INTERVAL = 120.0  # segundos entre conferências do livro de saldos com o REST
+
+class BalanceService:
+    """Livro de saldos em memória alimentado pelo tópico `wallet` do WebSocket.
+
+    O livro começa com um snapshot REST (uma única requisição para todas as moedas de interesse) e,
+    enquanto o stream privado estiver ativo, passa a ser atualizado apenas pelas mensagens de wallet:
+    a leitura de saldo não faz nenhuma chamada de rede. O REST fica restrito a uma conferência
+    periódica em segundo plano e ao fallback com TTL quando o stream cai.
+    """
+
+    def __init__(self, rest_client, coins: Iterable[str], logger: logging.Logger, error_logger: logging.Logger,
+                 ttl: float = BALANCE_CACHE_TTL, reconcile_interval: float = BALANCE_RECONCILE_INTERVAL):
+        self.rest_client = rest_client
+        self.coins = tuple(coins)
+        self.logger = logger
+        self.error_logger = error_logger
+        self.ttl = ttl
+        self.reconcile_interval = reconcile_interval
+        self._balances: Dict[str, Decimal] = {}
+        self._updated_at = 0.0
+        self._pushed_at: Dict[str, float] = {}   # último push de wallet por moeda (relógio monotônico)
+        self._lock = asyncio.Lock()
+        self._reconcile_task: Optional[asyncio.Task] = None
+        self.stream_live = False
+
+    def get(self, coin: str) -> Decimal:
+        """Saldo atual de uma moeda direto do livro (sem rede)."""
+        return self._balances.get(coin, Decimal('0'))
+
+    def set_stream_live(self, live: bool):
+        """Chamado pelo monitor do WebSocket ao (des)conectar o stream de wallet."""
+        self.stream_live = live
+
+    def is_fresh(self, max_age: Optional[float] = None) -> bool:
+        if not self._balances:
+            return False
+        if self.stream_live and max_age is None:
+            return True
+        max_age = self.ttl if max_age is None else max_age
+        return time.monotonic() - self._updated_at <= max_age
+
+    def _merge(self, balances: Dict[str, Decimal], requested_at: float):
+        """Aplica um snapshot REST, exceto nas moedas que receberam push do WebSocket depois da requisição sair."""
+        for coin, balance in balances.items():
+            if self._pushed_at.get(coin, 0.0) <= requested_at:
+                self._balances[coin] = balance
+        self._updated_at = time.monotonic()
+
+    async def refresh(self) -> bool:
+        """Força a leitura dos saldos via REST."""
+        requested_at = time.monotonic()
+        balances = await self.rest_client.get_wallet_balances(self.coins)
+        if balances is None:
+            return False
+        self._merge(balances, requested_at)
+        self.logger.info("\n💰 Saldos Atuais:\n" + "\n".join(f"{coin}: {balance.normalize():f}" for coin, balance in balances.items()) + "\n")
+        return True
+
+    async def snapshot(self, max_age: Optional[float] = None) -> Optional[Dict[str, Decimal]]:
+        """Saldos atuais; só vai ao REST se o livro ainda não foi carregado ou se o stream está inativo e o TTL expirou."""
+        if self.is_fresh(max_age):
+            return dict(self._balances)
+        async with self._lock:
+            # Outra corrotina pode ter atualizado o livro enquanto esperávamos o lock
+            if not self.is_fresh(max_age) and not await self.refresh():
+                return None
+            return dict(self._balances)
+
+    def apply_wallet_message(self, data: Dict) -> bool:
+        """Aplica uma mensagem do tópico `wallet` ao livro. Retorna True se alguma moeda de interesse mudou."""
+        changed = False
+        now = time.monotonic()
+        try:
+            for account in data.get('data', []):
+                for entry in account.get('coin', []):
+                    coin = entry.get('coin')
+                    if coin in self.coins and entry.get('walletBalance') not in (None, ''):
+                        self._balances[coin] = Decimal(entry['walletBalance'])
+                        self._pushed_at[coin] = now
+                        changed = True
+        except Exception as e:
+            self.error_logger.error(f"⚠️ Erro ao processar mensagem de wallet: {e}")
+            return False
+        # Só conta como snapshot completo quando já houve uma leitura REST com todas as moedas
+        if changed and all(coin in self._balances for coin in self.coins):
+            self._updated_at = time.monotonic()
+        return changed
+
+    async def reconcile(self) -> bool:
+        """Confere o livro com o REST e corrige divergências.
+
+        Uma moeda atualizada pelo stream depois de a requisição sair fica com o valor do push: o REST
+        pode ter lido o saldo antes do preenchimento que o push já refletiu.
+        """
+        requested_at = time.monotonic()
+        balances = await self.rest_client.get_wallet_balances(self.coins)
+        if balances is None:
+            return False
+        async with self._lock:
+            for coin, balance in balances.items():
+                current = self._balances.get(coin)
+                if current is not None and current != balance and self._pushed_at.get(coin, 0.0) <= requested_at:
+                    self.error_logger.warning(f"⚠️ Saldo {coin} divergente: livro {current} / REST {balance}. Corrigindo.")
+            self._merge(balances, requested_at)
+        return True
+
+    async def _reconcile_loop(self):
+        while True:
+            await asyncio.sleep(self.reconcile_interval)
+            try:
+                await self.reconcile()
+            except Exception as e:
+                self.error_logger.error(f"⚠️ Erro na conferência de saldos: {e}")
+
+    def start(self):
+        if self._reconcile_task is None or self._reconcile_task.done():
+            self._reconcile_task = asyncio.create_task(self._reconcile_loop())
+
+    async def stop(self):
+        if self._reconcile_task:
+            self._reconcile_task.cancel()
+            try:
+                await self._reconcile_task
+            except asyncio.CancelledError:
+                pass
+            self._reconcile_task = None
@@ -0,0 +1,143 @@
+# bench_event_loop_stall.py
+"""Mede o tempo de travamento do loop de eventos durante chamadas REST.
+
+Sobe um servidor HTTP local (stub da API V5 da Bybit) com latência artificial e compara:
+  - antes: chamada HTTP bloqueante (keep-alive, como o antigo requests.Session) dentro de uma corrotina;
+  - depois: o BybitRestClient assíncrono (aiohttp com pool keep-alive).
+
+Enquanto as chamadas rodam, uma corrotina "heartbeat" dorme em intervalos curtos e registra o atraso
+com que é acordada, que é exatamente o atraso que uma mensagem do WebSocket sofreria.
+
+Uso: python bench_event_loop_stall.py [--calls 50] [--latency-ms 50] [--concurrency 1]
+"""
+import argparse
+import asyncio
+import http.client
+import json
+import logging
+import statistics
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import api_rest
+from api_rest import BybitRestClient
+
+HEARTBEAT_INTERVAL = 0.005
+
+
+class _StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    latency = 0.05
+
+    def _reply(self, payload: dict):
+        time.sleep(self.latency)
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path.startswith("/v5/market/time"):
+            self._reply({"retCode": 0, "result": {"timeNano": str(time.time_ns())}})
+        elif self.path.startswith("/v5/account/wallet-balance"):
+            self._reply({"retCode": 0, "result": {"list": [{"coin": [{"coin": "USDT", "walletBalance": "1000"}]}]}})
+        else:
+            self._reply({"retCode": 0, "result": {"list": [{"avgPrice": "60000", "cumExecQty": "0.001", "orderStatus": "Filled"}]}})
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        self.rfile.read(length)
+        self._reply({"retCode": 0, "result": {"orderId": "stub-1"}})
+
+    def log_message(self, *args):
+        pass
+
+
+def _start_stub_server(latency: float) -> ThreadingHTTPServer:
+    _StubHandler.latency = latency
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _StubHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+async def _heartbeat(samples: list, stop: asyncio.Event):
+    loop = asyncio.get_running_loop()
+    while not stop.is_set():
+        start = loop.time()
+        await asyncio.sleep(HEARTBEAT_INTERVAL)
+        samples.append(max(0.0, loop.time() - start - HEARTBEAT_INTERVAL))
+
+
+async def _run_blocking(port: int, calls: int, concurrency: int):
+    conn = http.client.HTTPConnection("127.0.0.1", port)
+
+    async def worker(n: int):
+        for _ in range(n):
+            conn.request("GET", "/v5/account/wallet-balance?accountType=UNIFIED&coin=USDT")
+            conn.getresponse().read()
+            await asyncio.sleep(0)
+
+    await asyncio.gather(*(worker(calls // concurrency) for _ in range(concurrency)))
+    conn.close()
+
+
+async def _run_async(port: int, calls: int, concurrency: int):
+    api_rest.EXCHANGE_CONFIG['Stub Local'] = {'base_url': f'http://127.0.0.1:{port}'}
+    logger = logging.getLogger('bench')
+    client = BybitRestClient({'exchange': 'Stub Local', 'api_key': 'k', 'api_secret': 's'}, logger, logger)
+
+    async def worker(n: int):
+        for _ in range(n):
+            await client._get("/v5/account/wallet-balance", {"accountType": "UNIFIED", "coin": "USDT"})
+
+    try:
+        await asyncio.gather(*(worker(calls // concurrency) for _ in range(concurrency)))
+    finally:
+        await client.close()
+
+
+async def _measure(label: str, runner, port: int, calls: int, concurrency: int) -> dict:
+    samples: list = []
+    stop = asyncio.Event()
+    hb = asyncio.create_task(_heartbeat(samples, stop))
+    await asyncio.sleep(HEARTBEAT_INTERVAL * 2)
+    started = time.perf_counter()
+    await runner(port, calls, concurrency)
+    elapsed = time.perf_counter() - started
+    stop.set()
+    await hb
+    return {
+        "label": label,
+        "elapsed_s": elapsed,
+        "max_stall_ms": max(samples) * 1000 if samples else 0.0,
+        "p99_stall_ms": (statistics.quantiles(samples, n=100)[98] * 1000) if len(samples) >= 100 else max(samples, default=0.0) * 1000,
+        "total_stall_ms": sum(samples) * 1000,
+    }
+
+
+async def main(calls: int, latency_ms: float, concurrency: int):
+    server = _start_stub_server(latency_ms / 1000)
+    port = server.server_address[1]
+    try:
+        results = [
+            await _measure("antes (bloqueante)", _run_blocking, port, calls, concurrency),
+            await _measure("depois (aiohttp)", _run_async, port, calls, concurrency),
+        ]
+    finally:
+        server.shutdown()
+    print(f"{calls} chamadas, latência do stub {latency_ms:.0f} ms, concorrência {concurrency}")
+    for r in results:
+        print(f"{r['label']:<22} tempo total {r['elapsed_s']:.3f}s | travamento máx {r['max_stall_ms']:.1f} ms | "
+              f"p99 {r['p99_stall_ms']:.1f} ms | soma {r['total_stall_ms']:.1f} ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--calls", type=int, default=50)
+    parser.add_argument("--latency-ms", type=float, default=50)
+    parser.add_argument("--concurrency", type=int, default=1)
+    args = parser.parse_args()
+    asyncio.run(main(args.calls, args.latency_ms, args.concurrency))
@@ -0,0 +1,138 @@
+# capital_ladder.py
+import math
+from array import array
+from typing import Dict, Iterable, List
+
+LADDER_UNLIMITED_DEPTH = 45   # recompras consideradas quando rebuys_max = 0 (ilimitado)
+
+def _clamp(value: float, low: float, high: float) -> float:
+    return max(low, min(value, high))
+
+def _profit_top_ups(config: Dict, profit: float) -> List[float]:
+    """Lucro reaplicado pelo trader nas primeiras ordens do ciclo (mesma regra de _distribute_profit)."""
+    if config.get('profit_reaplicar') != 's' or profit <= 0:
+        return []
+    num_orders = min(int(config['profit_distribution_orders']), int(config['rebuys_max']) + 1)
+    return [profit / num_orders] * num_orders if num_orders > 0 else []
+
+def _depth(config: Dict) -> int:
+    rebuys_max = int(config['rebuys_max'])
+    return rebuys_max if rebuys_max > 0 else LADDER_UNLIMITED_DEPTH
+
+
+class Ladder:
+    """Escada completa de recompras de uma configuração, em colunas `array('d')` indexadas pela profundidade.
+
+    Índice 0 é a compra inicial, índice k a k-ésima recompra. Os preços são relativos ao preço de entrada
+    (`entry_price`, 1.0 por padrão), então a mesma escada vale para qualquer cotação. Segue as regras do
+    trader: queda e lucro alvo multiplicados e limitados a cada recompra, ordem em USDT = ordem anterior
+    × qty_multiplier limitada a [qty_min, qty_max], lucro reaplicado nas primeiras ordens e venda sobre o
+    preço médio com taxas. Não aplica o truncamento de centavos/tick das ordens reais.
+    """
+
+    __slots__ = ('price', 'drop', 'order_quote', 'order_base', 'cum_quote', 'cum_base', 'avg_price',
+                 'profit_target', 'sell_price', 'bounce', 'capital', 'fee')
+
+    def __init__(self, config: Dict, profit: float = 0.0, entry_price: float = 1.0):
+        fee = self.fee = float(config['fee'])
+        qty_min, qty_max = float(config['qty_min']), float(config['qty_max'])
+        qty_multiplier = float(config['qty_multiplier'])
+        drop_min, drop_max = float(config['rebuy_drop_min']), float(config['rebuy_drop_max'])
+        rebuy_multiplier = float(config['rebuy_multiplier'])
+        target_min, target_max = float(config['profit_target_min']), float(config['profit_target_max'])
+        target_multiplier = float(config['profit_target_multiplier'])
+        top_ups = _profit_top_ups(config, profit)
+
+        for name in self.__slots__[:-1]:
+            setattr(self, name, array('d'))
+        price, drop, target = entry_price, 0.0, float(config['profit_target'])
+        order = float(config['qty_initial'])
+        cum_quote = cum_cost = cum_base = 0.0
+        for k in range(_depth(config) + 1):
+            if k == 1:
+                drop = float(config['rebuy_percent'])
+            elif k > 1:
+                drop = _clamp(drop * rebuy_multiplier, drop_min, drop_max)
+            if k > 0:
+                price *= 1 - drop
+                order *= qty_multiplier
+                target = _clamp(target * target_multiplier, target_min, target_max)
+            order = _clamp(order + (top_ups[k] if k < len(top_ups) else 0.0), qty_min, qty_max)
+            base = order / price
+            cum_quote += order
+            cum_cost += order * (1 + fee)
+            cum_base += base * (1 - fee)
+            avg_price = cum_cost / cum_base
+            # A venda inicial usa o preço de compra; depois de cada recompra, o preço médio com taxas
+            sell_price = (price if k == 0 else avg_price) * (1 + target) / (1 - fee)
+            self.price.append(price)
+            self.drop.append(drop)
+            self.order_quote.append(order)
+            self.order_base.append(base)
+            self.cum_quote.append(cum_quote)
+            self.cum_base.append(cum_base)
+            self.avg_price.append(avg_price)
+            self.profit_target.append(target)
+            self.sell_price.append(sell_price)
+            self.bounce.append(sell_price / price - 1)
+            # Mesma margem de taxa do cálculo anterior do menu
+            self.capital.append(cum_quote * (1 + fee))
+
+    def __len__(self) -> int:
+        return len(self.price)
+
+    @property
+    def required_balance(self) -> float:
+        return self.capital[-1]
+
+    @property
+    def max_drop(self) -> float:
+        """Queda total do preço, a partir da entrada, coberta pela última recompra."""
+        return 1 - self.price[-1] / self.price[0]
+
+
+def _clamped_geometric_sum(first: float, multiplier: float, count: int, low: float, high: float) -> float:
+    """Soma de forma fechada de x_0 = first, x_k = clamp(x_{k-1} * multiplier), com first já dentro dos limites."""
+    if count <= 0:
+        return 0.0
+    if multiplier == 1.0 or (multiplier > 1.0 and first >= high) or (multiplier < 1.0 and first <= low):
+        return first * count
+    bound = high if multiplier > 1.0 else low
+    # Termos antes de atingir o limite formam uma série geométrica; depois a ordem fica presa no limite.
+    # Sem piso (qty_min = 0) a série decrescente nunca chega a ele
+    free = count if bound <= 0 else min(count, max(0, math.ceil(math.log(bound / first) / math.log(multiplier))))
+    return first * (multiplier ** free - 1) / (multiplier - 1) + bound * (count - free)
+
+def required_balance(config: Dict, profit: float = 0.0) -> float:
+    """Capital para a escada inteira (compra inicial + todas as recompras) sem montar as colunas."""
+    qty_min, qty_max = float(config['qty_min']), float(config['qty_max'])
+    qty_multiplier = float(config['qty_multiplier'])
+    count = _depth(config) + 1
+    top_ups = _profit_top_ups(config, profit)[:count]
+    # As ordens com lucro reaplicado vêm primeiro; a partir delas a série volta a ser geométrica
+    order, total = float(config['qty_initial']), 0.0
+    for k, top_up in enumerate(top_ups):
+        order = _clamp((order * qty_multiplier if k else order) + top_up, qty_min, qty_max)
+        total += order
+    first = _clamp(order * qty_multiplier if top_ups else order, qty_min, qty_max)
+    total += _clamped_geometric_sum(first, qty_multiplier, count - len(top_ups), qty_min, qty_max)
+    return total * (1 + float(config['fee']))
+
+def required_balances(configs: Iterable[Dict], profit: float = 0.0) -> array:
+    """Capital necessário de várias configurações de uma vez (para filtrar milhares de candidatos)."""
+    return array('d', (required_balance(config, profit) for config in configs))
+
+def ladder_profiles(configs: Iterable[Dict], profit: float = 0.0) -> List[Ladder]:
+    return [Ladder(config, profit) for config in configs]
+
+
+def format_ladder(ladder: Ladder, quote: str = 'USDT') -> str:
+    lines = [f"{'Nível':>5} | {'Queda':>7} | {'Ordem':>10} | {'Capital':>11} | {'Preço médio':>11} | {'Alvo':>6} | {'Venda':>8} | {'Alta p/ vender':>14}"]
+    entry = ladder.price[0]
+    for k in range(len(ladder)):
+        lines.append(
+            f"{k:>5} | {(1 - ladder.price[k] / entry) * 100:>6.2f}% | {ladder.order_quote[k]:>10.2f} | {ladder.capital[k]:>11.2f} | "
+            f"{(ladder.avg_price[k] / entry - 1) * 100:>+10.2f}% | {ladder.profit_target[k] * 100:>5.2f}% | "
+            f"{(ladder.sell_price[k] / entry - 1) * 100:>+7.2f}% | {ladder.bounce[k] * 100:>13.2f}%")
+    lines.append(f"Capital total ({quote}): {ladder.required_balance:.2f} | queda máxima coberta: {ladder.max_drop * 100:.2f}%")
+    return "\n".join(lines)
@@ -0,0 +1,79 @@
+# cycle_position.py
+from decimal import Decimal, ROUND_DOWN
+from typing import Dict, Iterable, List, Optional
+from fixed_point import InstrumentUnits, fee_on, fee_ppm, quote_units
+
+class CyclePosition:
+    """Compras do ciclo aberto com os totais do preço médio mantidos a cada compra, em O(1).
+
+    `buys` continua sendo a lista de dicts (preço e quantidade como reportados pela exchange) gravada
+    no journal. Cada compra é convertida uma única vez para inteiros: valor em unidades de cotação e
+    quantidade em lotes; a taxa (em partes por milhão) entra só ao ler os totais, sempre arredondada
+    contra a posição: custo para cima, moeda recebida e preço médio no sentido que não subestima o alvo.
+    """
+
+    __slots__ = ('fee', 'fee_ppm', 'units', 'buys', 'notional', 'lots', 'last_price', 'last_notional')
+
+    def __init__(self, fee: float, units: InstrumentUnits, buys: Iterable[Dict] = ()):
+        self.fee = fee
+        self.fee_ppm = fee_ppm(fee)
+        self.units = units
+        self.clear()
+        for buy in buys:
+            self.add(buy)
+
+    def clear(self):
+        self.buys: List[Dict] = []
+        self.notional = 0          # soma de preço × qty, em unidades de cotação
+        self.lots = 0              # moeda base comprada (bruta), em lotes
+        self.last_price = 0.0
+        self.last_notional = 0
+
+    def add(self, buy: Dict):
+        self.buys.append(buy)
+        notional = quote_units(buy["price"] * buy["qty"])
+        self.notional += notional
+        self.lots += self.units.qty_lots(buy["qty"])
+        self.last_price = float(buy["price"])
+        self.last_notional = notional
+
+    def scale(self, remaining: Decimal):
+        """Reduz todas as compras na mesma proporção (venda parcial da posição): o preço médio não muda."""
+        buys = [dict(buy, qty=buy["qty"] * remaining) for buy in self.buys]
+        self.clear()
+        for buy in buys:
+            self.add(buy)
+
+    def __len__(self) -> int:
+        return len(self.buys)
+
+    @property
+    def last(self) -> Optional[Dict]:
+        return self.buys[-1] if self.buys else None
+
+    @property
+    def notional_with_fees(self) -> int:
+        """Custo em unidades de cotação incluindo a taxa."""
+        return self.notional + fee_on(self.notional, self.fee_ppm)
+
+    @property
+    def net_lots(self) -> int:
+        """Moeda base recebida, líquida da taxa, em lotes."""
+        return self.lots - fee_on(self.lots, self.fee_ppm)
+
+    @property
+    def avg_ticks(self) -> int:
+        """Preço médio com taxas por unidade líquida recebida (base do preço de venda), em ticks arredondados para cima."""
+        return self.units.ticks_for(self.notional_with_fees, self.net_lots)
+
+    def summary(self, cycle_id: int, base_coin: str = 'BTC', quote_coin: str = 'USDT') -> str:
+        """Resumo compra a compra; só é montado quando o log de debug está ativo."""
+        fee = Decimal(repr(self.fee))
+        lines = [f"📊 Resumo das compras no ciclo #{cycle_id}:"]
+        for idx, buy in enumerate(self.buys, 1):
+            trade_value = buy['price'] * buy['qty']
+            lines.append(
+                f"   Compra {idx}: {buy['qty']:.6f} {base_coin} (Taxa: {buy['qty'] * fee:.6f} {base_coin}) a {buy['price']:.2f} {quote_coin} "
+                f"(Taxa: {(trade_value * fee).quantize(Decimal('0.01'), rounding=ROUND_DOWN):.2f} {quote_coin}, "
+                f"Valor: {trade_value.quantize(Decimal('0.01'), rounding=ROUND_DOWN):.2f} {quote_coin})")
+        return "\n".join(lines)
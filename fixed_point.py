@@ -0,0 +1,127 @@
+# fixed_point.py
+import math
+from decimal import Decimal, ROUND_DOWN, ROUND_HALF_UP, ROUND_UP
+from fractions import Fraction
+
+# Valores em moeda de cotação (saldos, lucros, tamanho das ordens) são inteiros em unidades de 10^-8
+QUOTE_DECIMALS = 8
+QUOTE_SCALE = 10 ** QUOTE_DECIMALS
+# Convenção usada até aqui para todos os pares: preço inteiro, quantidade com 6 casas, valor com 2 casas
+DEFAULT_TICK_SIZE = '1'
+DEFAULT_LOT_SIZE = '0.000001'
+DEFAULT_QUOTE_STEP = '0.01'
+DEFAULT_MIN_QTY = '0'          # sem mínimos conhecidos até o cache de instrumentos ser carregado
+DEFAULT_MIN_NOTIONAL = '0'
+# Taxas em partes por milhão (0,1% = 1000): valor da taxa calculado só com inteiros
+FEE_SCALE = 1_000_000
+# Folga relativa ao truncar floats para ticks/lotes (30090.12 / 0.01 = 3009011.9999999995)
+FLOOR_EPSILON = 1e-12
+
+def quote_units(amount) -> int:
+    """Valor em moeda de cotação (Decimal/str da exchange ou da configuração) -> unidades inteiras, truncado."""
+    return int((Decimal(str(amount)) * QUOTE_SCALE).to_integral_value(rounding=ROUND_DOWN))
+
+def to_quote(units) -> float:
+    """Unidades inteiras -> moeda de cotação, apenas para exibição."""
+    return units / QUOTE_SCALE
+
+def fee_ppm(fee) -> int:
+    """Taxa como razão (0.001) -> partes por milhão (1000)."""
+    return int((Decimal(str(fee)) * FEE_SCALE).to_integral_value(rounding=ROUND_HALF_UP))
+
+def fee_on(amount: int, ppm: int) -> int:
+    """Taxa sobre um valor inteiro (unidades de cotação ou lotes), arredondada para cima."""
+    return -(-amount * ppm // FEE_SCALE)
+
+
+class InstrumentUnits:
+    """Escalas inteiras de um par: preços em ticks, quantidades da moeda base em lotes.
+
+    Toda a aritmética da estratégia usa inteiros (e floats para as razões: taxa, lucro alvo, quedas);
+    Decimal aparece só na entrada (preenchimentos e saldos da exchange) e na saída, ao montar os
+    parâmetros das ordens.
+    """
+
+    __slots__ = ('symbol', 'tick_size', 'lot_size', 'quote_step', 'tick', 'lot', 'quote_lot', 'min_lots', 'min_notional',
+                 'notional_per_tick_lot', '_notional_num', '_notional_den')
+
+    def __init__(self, symbol: str, tick_size=DEFAULT_TICK_SIZE, lot_size=DEFAULT_LOT_SIZE, quote_step=DEFAULT_QUOTE_STEP,
+                 min_qty=DEFAULT_MIN_QTY, min_notional=DEFAULT_MIN_NOTIONAL):
+        self.symbol = symbol
+        self.tick_size = Decimal(str(tick_size))
+        self.lot_size = Decimal(str(lot_size))
+        self.quote_step = Decimal(str(quote_step))
+        self.tick = float(self.tick_size)
+        self.lot = float(self.lot_size)
+        self.quote_lot = max(1, quote_units(self.quote_step))
+        # Mínimos da exchange: quantidade (arredondada para cima ao lote) e valor em unidades de cotação
+        self.min_lots = int((Decimal(str(min_qty)) / self.lot_size).to_integral_value(rounding=ROUND_UP))
+        self.min_notional = quote_units(min_notional)
+        # Unidades de cotação por tick × lote, como fração exata: notional(ticks, lotes) é inteiro e truncado
+        ratio = Fraction(self.tick_size * self.lot_size * QUOTE_SCALE)
+        self._notional_num, self._notional_den = ratio.numerator, ratio.denominator
+        self.notional_per_tick_lot = float(ratio)
+
+    # ---------------------------------------------------------------- entrada (valores da exchange)
+
+    def price_ticks(self, price) -> int:
+        return int((Decimal(str(price)) / self.tick_size).to_integral_value(rounding=ROUND_DOWN))
+
+    def qty_lots(self, qty) -> int:
+        return int((Decimal(str(qty)) / self.lot_size).to_integral_value(rounding=ROUND_DOWN))
+
+    # ---------------------------------------------------------------- aritmética inteira
+
+    def floor_ticks(self, ticks: float) -> int:
+        return math.floor(ticks * (1 + FLOOR_EPSILON))
+
+    def floor_lots(self, lots: float) -> int:
+        return math.floor(lots * (1 + FLOOR_EPSILON))
+
+    def price_to_ticks(self, price: float) -> int:
+        return self.floor_ticks(price / self.tick)
+
+    def notional(self, ticks: int, lots: int) -> int:
+        """Valor em unidades de cotação de `lots` ao preço `ticks`."""
+        return ticks * lots * self._notional_num // self._notional_den
+
+    def lots_for(self, quote: int, ticks: int) -> int:
+        """Lotes comprados com `quote` unidades de cotação ao preço `ticks` (truncado)."""
+        return quote * self._notional_den // (ticks * self._notional_num) if ticks > 0 else 0
+
+    def ticks_for(self, quote: int, lots: int) -> int:
+        """Preço em ticks (arredondado para cima) em que `lots` lotes valem `quote` unidades de cotação."""
+        return -(-quote * self._notional_den // (lots * self._notional_num)) if lots > 0 else 0
+
+    def floor_quote(self, quote: int) -> int:
+        """Trunca um valor de ordem ao passo aceito pela exchange."""
+        return quote - quote % self.quote_lot
+
+    def below_minimum(self, ticks: int, lots: int) -> bool:
+        """Ordem limite que a exchange rejeitaria por quantidade ou valor abaixo do mínimo."""
+        return lots < max(1, self.min_lots) or self.notional(ticks, lots) < self.min_notional
+
+    def price(self, ticks) -> float:
+        """Ticks -> preço, apenas para exibição e para o backtest."""
+        return ticks * self.tick
+
+    def qty(self, lots) -> float:
+        return lots * self.lot
+
+    # ---------------------------------------------------------------- saída (parâmetros das ordens)
+
+    def price_str(self, ticks: int) -> str:
+        return f"{self.tick_size * ticks:f}"
+
+    def qty_str(self, lots: int) -> str:
+        return f"{self.lot_size * lots:f}"
+
+    def quote_str(self, quote: int) -> str:
+        return f"{(Decimal(quote) / QUOTE_SCALE).quantize(self.quote_step, rounding=ROUND_DOWN):f}"
+
+    def qty_decimal(self, lots: int) -> Decimal:
+        return self.lot_size * lots
+
+
+def default_units(symbol: str) -> InstrumentUnits:
+    return InstrumentUnits(symbol)
@@ -0,0 +1,140 @@
+# instrument_cache.py
+import asyncio
+import functools
+import json
+import logging
+import os
+import time
+from typing import Awaitable, Callable, Dict, List, Optional
+from fixed_point import InstrumentUnits, default_units
+
+INSTRUMENT_CACHE_DIR = 'user/cache'
+INSTRUMENT_CACHE_TTL = 24 * 3600   # segundos até buscar de novo os metadados na exchange
+# Campos da V5 (/v5/market/instruments-info, spot) guardados no cache
+INSTRUMENT_FIELDS = {
+    'priceFilter': ('tickSize',),
+    'lotSizeFilter': ('basePrecision', 'quotePrecision', 'minOrderQty', 'minOrderAmt'),
+}
+
+def _compact(info: Dict) -> Dict:
+    """Só os filtros usados nas ordens, achatados: {'tickSize': '0.01', 'basePrecision': '0.000001', ...}."""
+    entry = {}
+    for group, fields in INSTRUMENT_FIELDS.items():
+        for field in fields:
+            value = info.get(group, {}).get(field)
+            if value not in (None, ''):
+                entry[field] = value
+    return entry
+
+def units_from_entry(symbol: str, entry: Dict) -> InstrumentUnits:
+    return InstrumentUnits(symbol, tick_size=entry['tickSize'], lot_size=entry['basePrecision'],
+                           quote_step=entry.get('quotePrecision', '0.01'), min_qty=entry.get('minOrderQty', '0'),
+                           min_notional=entry.get('minOrderAmt', '0'))
+
+def cache_path(name: str, directory: str = INSTRUMENT_CACHE_DIR) -> str:
+    return os.path.join(directory, f"instruments_{name.replace(' ', '_')}.json")
+
+@functools.lru_cache(maxsize=None)
+def _cached_entries(path: str) -> Dict[str, Dict]:
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f).get("instruments", {})
+    except (OSError, ValueError):
+        return {}
+
+def cached_units(name: str, symbol: str, directory: str = INSTRUMENT_CACHE_DIR) -> InstrumentUnits:
+    """Escalas do último cache gravado, mesmo vencido, sem rede (backtest e otimizador); padrão se não houver."""
+    entry = _cached_entries(cache_path(name, directory)).get(symbol)
+    return units_from_entry(symbol, entry) if entry else default_units(symbol)
+
+def _atomic_write_json(path: str, content: Dict):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(content, f)
+    os.replace(tmp_path, path)
+
+
+class InstrumentCache:
+    """Tick, lote, mínimos e precisão de todos os pares spot, buscados uma vez e guardados em disco.
+
+    `load()` lê o arquivo se ele ainda está dentro do TTL; senão consulta a exchange (uma única chamada
+    para todos os símbolos) e regrava o arquivo. Se a consulta falhar, um arquivo vencido ainda é usado.
+    As ordens consultam só o dicionário em memória (`units()`), nunca a rede.
+    """
+
+    def __init__(self, fetch: Callable[[], Awaitable[List[Dict]]], name: str, logger: logging.Logger, error_logger: logging.Logger,
+                 directory: str = INSTRUMENT_CACHE_DIR, ttl: float = INSTRUMENT_CACHE_TTL):
+        self._fetch = fetch
+        self.path = cache_path(name, directory)
+        self.logger = logger
+        self.error_logger = error_logger
+        self.ttl = ttl
+        self.fetched_at = 0.0
+        self._entries: Dict[str, Dict] = {}
+        self._units: Dict[str, InstrumentUnits] = {}
+        self._lock = asyncio.Lock()
+
+    def __contains__(self, symbol: str) -> bool:
+        return symbol in self._entries
+
+    @property
+    def fresh(self) -> bool:
+        return bool(self._entries) and time.time() - self.fetched_at < self.ttl
+
+    def units(self, symbol: str) -> InstrumentUnits:
+        """Escalas do símbolo; sem metadados (cache não carregado ou par desconhecido) usa a convenção padrão."""
+        units = self._units.get(symbol)
+        if units is None:
+            entry = self._entries.get(symbol)
+            if entry is None:
+                if self._entries:
+                    self.error_logger.warning(f"⚠️ {symbol} ausente do cache de instrumentos; usando tick/lote padrão")
+                units = default_units(symbol)
+            else:
+                units = units_from_entry(symbol, entry)
+            self._units[symbol] = units
+        return units
+
+    def _read(self) -> Optional[Dict]:
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            self.error_logger.warning(f"⚠️ Cache de instrumentos ilegível ({self.path}): {e}")
+            return None
+
+    def _apply(self, content: Dict):
+        self._entries = content.get("instruments", {})
+        self.fetched_at = float(content.get("fetched_at", 0))
+        self._units.clear()
+
+    async def load(self, force: bool = False) -> bool:
+        """Carrega do disco ou da exchange. Retorna False se não há metadados (ordens usam o padrão)."""
+        async with self._lock:
+            if not force and self.fresh:
+                return True
+            content = None if force else self._read()
+            if content is not None:
+                self._apply(content)
+                if self.fresh:
+                    self.logger.info(f"📐 {len(self._entries)} instrumentos carregados do cache ({self.path})")
+                    return True
+            try:
+                instruments = await self._fetch()
+            except Exception as e:
+                self.error_logger.error(f"⚠️ Erro ao buscar instrumentos: {e}"
+                                        f"{' (usando cache vencido)' if self._entries else ''}")
+                return bool(self._entries)
+            content = {"fetched_at": time.time(),
+                       "instruments": {info['symbol']: entry for info in instruments
+                                       if 'tickSize' in (entry := _compact(info)) and 'basePrecision' in entry}}
+            self._apply(content)
+            try:
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+                await asyncio.to_thread(_atomic_write_json, self.path, content)
+            except OSError as e:
+                self.error_logger.warning(f"⚠️ Não foi possível gravar o cache de instrumentos: {e}")
+            self.logger.info(f"📐 {len(self._entries)} instrumentos atualizados da exchange")
+            return True
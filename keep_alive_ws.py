@@ -1,51 +1,94 @@
 # keep_alive_ws.py
 import asyncio
+import itertools
 import json
-import time
 import logging
-from datetime import datetime
+import statistics
+import time
+from collections import deque
+from typing import Callable, Dict, Iterable, Optional
+from metrics import metrics
+
+HEARTBEAT_INTERVAL = 5       # segundos entre pings (a Bybit recomenda no máximo 20)
+HEARTBEAT_MAX_MISSED = 2     # pongs seguidos sem resposta para declarar a conexão morta
+HEARTBEAT_RTT_WINDOW = 60    # amostras de RTT guardadas (janela móvel)
+
+_req_ids = itertools.count(1)
 
 class KeepAliveWS:
-    def __init__(self, websocket, api_client=None, logger=None, interval=600, inactivity_mode=False, inactivity_timeout=600, verbose=False):
+    """Heartbeat da conexão: ping com `req_id` a cada `interval` e pong lido pelo loop de recepção do dono.
+
+    Este objeto nunca chama `recv()` (o socket tem um único leitor): o loop de recepção entrega cada
+    mensagem a `handle()`, que reconhece os pongs, casa o `req_id` com o ping pendente e grava o RTT
+    numa janela móvel. Se `max_missed` pings seguidos ficam sem resposta, `on_dead()` é chamado para o
+    dono derrubar a conexão e reconectar: uma conexão meio aberta é detectada em até
+    `interval × (max_missed + 1)` segundos.
+    """
+
+    def __init__(self, websocket, logger: Optional[logging.Logger] = None, interval: float = HEARTBEAT_INTERVAL,
+                 max_missed: int = HEARTBEAT_MAX_MISSED, on_dead: Optional[Callable[[], None]] = None,
+                 topics: Iterable[str] = ('wallet',), name: str = 'private', verbose: bool = False):
         self.websocket = websocket
-        self.api_client = api_client  # Instância do BybitRestClient
         self.logger = logger or logging.getLogger(__name__)
         self.interval = interval
-        self.inactivity_mode = inactivity_mode
-        self.inactivity_timeout = inactivity_timeout
+        self.max_missed = max_missed
+        self.on_dead = on_dead
+        self.topics = list(topics)   # tópicos assinados para manter tráfego na conexão (wallet no stream privado)
+        self.name = name
         self.verbose = verbose
-        self._last_activity = time.time()
+        self.missed = 0
+        self.rtts = deque(maxlen=HEARTBEAT_RTT_WINDOW)   # ms
+        self._pending: Dict[str, float] = {}   # req_id -> perf_counter do envio
         self._running = False
         self._task = None
-        self.wallet_subscribed = False
+        self.subscribed = False
 
-    def reset_timer(self):
-        """Reset the activity timer"""
-        self._last_activity = time.time()
+    # ---------------------------------------------------------------- leitura (chamado pelo loop de recepção)
+
+    def handle(self, data: Dict) -> bool:
+        """True se a mensagem é a resposta de um ping (o loop de recepção não precisa despachá-la)."""
+        op = data.get('op')
+        # Stream privado: {"op": "pong", "req_id": ...}; público: {"op": "ping", "ret_msg": "pong", "req_id": ...}
+        if op != 'pong' and not (op == 'ping' and data.get('ret_msg') == 'pong'):
+            return False
+        sent = self._pending.pop(data.get('req_id'), None)
+        if sent is not None:
+            rtt = time.perf_counter() - sent
+            self.rtts.append(rtt * 1000)
+            metrics.record('ws_ping_rtt', rtt * 1e6, self.name)
+            # Resposta atrasada de um ping antigo também prova que a conexão vive
+            self._pending.clear()
+            self.missed = 0
+            if self.verbose:
+                self.logger.info(f"🏓 Pong ({self.name}) em {rtt * 1000:.1f} ms")
+        return True
+
+    @property
+    def rtt_ms(self) -> Optional[float]:
+        return self.rtts[-1] if self.rtts else None
+
+    def rtt_stats(self) -> Optional[Dict[str, float]]:
+        """Mínimo, mediana e máximo do RTT na janela, em ms."""
+        if not self.rtts:
+            return None
+        return {"min": min(self.rtts), "median": statistics.median(self.rtts), "max": max(self.rtts), "samples": len(self.rtts)}
+
+    # ---------------------------------------------------------------- ciclo de vida
 
     async def start(self):
-        """Start the keep alive mechanism"""
         if self._running:
             return
-        
         self._running = True
-        self.logger.info("🫀 Iniciando KeepAlive WebSocket...")
-        
-        # Subscrever ao wallet stream para manter conexão ativa
-        await self._subscribe_wallet_stream()
-        
+        self.logger.info(f"🫀 Heartbeat do WebSocket ({self.name}) a cada {self.interval:g}s, até {self.max_missed} pongs perdidos")
+        if self.topics:
+            await self._subscribe_topics()
         self._task = asyncio.create_task(self._keep_alive_loop())
 
     async def stop(self):
-        """Stop the keep alive mechanism"""
         if not self._running:
             return
-            
         self._running = False
-        
-        # Desinscrever do wallet stream
-        await self._unsubscribe_wallet_stream()
-        
+        await self._unsubscribe_topics()
         if self._task:
             self._task.cancel()
             try:
@@ -53,64 +96,47 @@ class KeepAliveWS:
             except asyncio.CancelledError:
                 pass
             self._task = None
-        
-        self.logger.info("🛑 KeepAlive WebSocket encerrado.")
+        self._pending.clear()
+        self.logger.info(f"🛑 Heartbeat do WebSocket ({self.name}) encerrado.")
 
-    async def _subscribe_wallet_stream(self):
-        """Subscribe to wallet stream to keep connection active"""
+    async def _subscribe_topics(self):
+        """Assina os tópicos que mantêm a conexão ativa (o wallet também alimenta o livro de saldos)."""
         try:
             if self.websocket and not self.websocket.closed:
-                wallet_msg = {
-                    "op": "subscribe",
-                    "args": ["wallet"]
-                }
-                await self.websocket.send(json.dumps(wallet_msg))
-                self.wallet_subscribed = True
-                self.logger.info("💰 Subscrito ao wallet stream para manter conexão ativa")
+                await self.websocket.send(json.dumps({"op": "subscribe", "args": self.topics}))
+                self.subscribed = True
+                self.logger.info(f"💰 Subscrito a {', '.join(self.topics)} para manter conexão ativa")
         except Exception as e:
-            self.logger.error(f"Erro ao subscrever wallet stream: {e}")
+            self.logger.error(f"Erro ao subscrever {', '.join(self.topics)}: {e}")
 
-    async def _unsubscribe_wallet_stream(self):
-        """Unsubscribe from wallet stream"""
+    async def _unsubscribe_topics(self):
         try:
-            if self.websocket and not self.websocket.closed and self.wallet_subscribed:
-                wallet_msg = {
-                    "op": "unsubscribe",
-                    "args": ["wallet"]
-                }
-                await self.websocket.send(json.dumps(wallet_msg))
-                self.wallet_subscribed = False
-                self.logger.info("💰 Desinscrito do wallet stream")
+            if self.websocket and not self.websocket.closed and self.subscribed:
+                await self.websocket.send(json.dumps({"op": "unsubscribe", "args": self.topics}))
+                self.subscribed = False
+                self.logger.info(f"💰 Desinscrito de {', '.join(self.topics)}")
         except Exception as e:
-            self.logger.error(f"Erro ao desinscrever wallet stream: {e}")
+            self.logger.error(f"Erro ao desinscrever {', '.join(self.topics)}: {e}")
 
     async def _keep_alive_loop(self):
-        """Main keep alive loop"""
         try:
             while self._running:
                 await asyncio.sleep(self.interval)
-                
                 if not self._running:
                     break
-                    
-                # Verificar se WebSocket ainda está conectado
                 if not self.websocket or self.websocket.closed:
-                    self.logger.warning("WebSocket fechado, encerrando KeepAlive")
+                    self.logger.warning(f"WebSocket ({self.name}) fechado, encerrando heartbeat")
                     break
-                
-                # Se estiver em modo de inatividade, verificar tempo desde última atividade
-                if self.inactivity_mode:
-                    time_since_activity = time.time() - self._last_activity
-                    
-                    if time_since_activity >= self.inactivity_timeout:
-                        # Em vez de fazer consulta REST, o wallet stream já mantém a conexão ativa
-                        # Apenas enviar ping como fallback
-                        await self._send_ping()
-                        self.reset_timer()
-                else:
-                    # Modo normal: enviar ping periodicamente
-                    await self._send_ping()
-                    
+                if self._pending:
+                    self.missed += 1
+                    metrics.inc('ws_pong_missed', self.name)
+                    self.logger.warning(f"⚠️ Pong ({self.name}) não recebido em {self.interval:g}s ({self.missed}/{self.max_missed})")
+                    if self.missed >= self.max_missed:
+                        self.logger.error(f"💀 WebSocket ({self.name}) sem resposta a {self.missed} pings; forçando reconexão")
+                        if self.on_dead:
+                            self.on_dead()
+                        break
+                await self._send_ping()
         except asyncio.CancelledError:
             pass
         except Exception as e:
@@ -119,27 +145,12 @@ class KeepAliveWS:
             self._running = False
 
     async def _send_ping(self):
-        """Send ping to keep connection alive (fallback method)"""
+        req_id = f"hb{next(_req_ids)}"
+        self._pending[req_id] = time.perf_counter()
         try:
-            if self.websocket and not self.websocket.closed:
-                ping_msg = {"op": "ping"}
-                await self.websocket.send(json.dumps(ping_msg))
-                
-                # Aguardar pong com timeout
-                try:
-                    ping_msg = {"op": "ping"}
-                    await self.websocket.send(json.dumps(ping_msg))
-                    if self.verbose:
-                        self.logger.info("🏓 Ping enviado")
-
-#                    response = await asyncio.wait_for(self.websocket.recv(), timeout=10)
-#                    pong_data = json.loads(response)
-#                    if pong_data.get('op') == 'pong':
-                        if self.verbose:
-                            self.logger.info("🏓 Ping-pong bem-sucedido")
-                except asyncio.TimeoutError:
-                    self.logger.warning("⚠️ Timeout aguardando pong")
-                except Exception as e:
-                    self.logger.error(f"Erro processando pong: {e}")
+            await self.websocket.send(json.dumps({"op": "ping", "req_id": req_id}))
+            if self.verbose:
+                self.logger.info(f"🏓 Ping enviado ({self.name}, {req_id})")
         except Exception as e:
-            self.logger.error(f"Erro enviando ping: {e}")
\ No newline at end of file
+            # Envio falhou: conta como pong perdido no próximo intervalo
+            self.logger.error(f"Erro enviando ping ({self.name}): {e}")
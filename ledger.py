@@ -0,0 +1,284 @@
+# ledger.py
+import argparse
+import asyncio
+import logging
+import os
+import sqlite3
+import time
+from typing import Dict, List, Optional, Sequence, Tuple
+from fixed_point import to_quote
+
+LEDGER_PATH = 'user/ledger.sqlite3'
+LEDGER_FLUSH_INTERVAL = 1.0   # segundos entre transações (um único commit por lote de registros)
+LEDGER_BUSY_TIMEOUT = 5000    # ms de espera quando outro processo (supervisor, relatório) está gravando
+
+# Append-only: nenhuma linha é alterada depois de gravada, exceto o agregado diário mantido pelo gatilho.
+# Valores em moeda de cotação são inteiros em unidades de 10^-8 (como na estratégia); preço e qty como reportados.
+LEDGER_SCHEMA = """
+CREATE TABLE IF NOT EXISTS orders (
+    id INTEGER PRIMARY KEY,
+    ts INTEGER NOT NULL,            -- ms desde a época (UTC)
+    exchange TEXT NOT NULL,
+    symbol TEXT NOT NULL,
+    cycle_id INTEGER NOT NULL,
+    order_id TEXT NOT NULL,
+    event TEXT NOT NULL,            -- placed / amended / cancelled
+    side TEXT,
+    order_type TEXT,
+    price REAL,                     -- NULL em ordens a mercado
+    qty REAL,                       -- moeda base (vendas e alterações)
+    value INTEGER                   -- moeda de cotação (compras, que são enviadas por valor)
+);
+CREATE TABLE IF NOT EXISTS fills (
+    id INTEGER PRIMARY KEY,
+    ts INTEGER NOT NULL,
+    exchange TEXT NOT NULL,
+    symbol TEXT NOT NULL,
+    cycle_id INTEGER NOT NULL,
+    order_id TEXT,
+    side TEXT NOT NULL,
+    price REAL NOT NULL,
+    qty REAL NOT NULL,
+    value INTEGER NOT NULL,
+    fee INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS cycles (
+    id INTEGER PRIMARY KEY,
+    ts INTEGER NOT NULL,
+    exchange TEXT NOT NULL,
+    symbol TEXT NOT NULL,
+    cycle_id INTEGER NOT NULL,
+    event TEXT NOT NULL,            -- open / close
+    depth INTEGER NOT NULL,         -- compras no ciclo (1 = só a compra inicial)
+    invested INTEGER NOT NULL DEFAULT 0,
+    received INTEGER NOT NULL DEFAULT 0,
+    fees INTEGER NOT NULL DEFAULT 0,
+    profit INTEGER NOT NULL DEFAULT 0
+);
+-- Agregado por dia (UTC), par e profundidade: os relatórios leem poucas linhas mesmo com anos de histórico
+CREATE TABLE IF NOT EXISTS pnl_daily (
+    day TEXT NOT NULL,
+    exchange TEXT NOT NULL,
+    symbol TEXT NOT NULL,
+    depth INTEGER NOT NULL,
+    cycles INTEGER NOT NULL,
+    invested INTEGER NOT NULL,
+    fees INTEGER NOT NULL,
+    profit INTEGER NOT NULL,
+    PRIMARY KEY (day, exchange, symbol, depth)
+) WITHOUT ROWID;
+CREATE TRIGGER IF NOT EXISTS cycles_close_rollup AFTER INSERT ON cycles WHEN NEW.event = 'close'
+BEGIN
+    INSERT INTO pnl_daily (day, exchange, symbol, depth, cycles, invested, fees, profit)
+    VALUES (date(NEW.ts / 1000, 'unixepoch'), NEW.exchange, NEW.symbol, NEW.depth, 1, NEW.invested, NEW.fees, NEW.profit)
+    ON CONFLICT (day, exchange, symbol, depth) DO UPDATE SET
+        cycles = cycles + 1, invested = invested + excluded.invested, fees = fees + excluded.fees, profit = profit + excluded.profit;
+END;
+CREATE INDEX IF NOT EXISTS orders_symbol_ts ON orders (symbol, ts);
+CREATE INDEX IF NOT EXISTS orders_symbol_cycle ON orders (symbol, cycle_id);
+CREATE INDEX IF NOT EXISTS orders_order_id ON orders (order_id);
+CREATE INDEX IF NOT EXISTS fills_symbol_ts ON fills (symbol, ts);
+CREATE INDEX IF NOT EXISTS fills_symbol_cycle ON fills (symbol, cycle_id);
+CREATE INDEX IF NOT EXISTS fills_ts ON fills (ts);
+CREATE INDEX IF NOT EXISTS cycles_symbol_ts ON cycles (symbol, ts);
+CREATE INDEX IF NOT EXISTS cycles_symbol_cycle ON cycles (symbol, cycle_id);
+CREATE INDEX IF NOT EXISTS cycles_ts ON cycles (ts);
+CREATE INDEX IF NOT EXISTS pnl_daily_symbol ON pnl_daily (symbol, day);
+"""
+
+_INSERTS = {
+    'orders': "INSERT INTO orders (ts, exchange, symbol, cycle_id, order_id, event, side, order_type, price, qty, value) "
+              "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+    'fills': "INSERT INTO fills (ts, exchange, symbol, cycle_id, order_id, side, price, qty, value, fee) "
+             "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+    'cycles': "INSERT INTO cycles (ts, exchange, symbol, cycle_id, event, depth, invested, received, fees, profit) "
+              "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+}
+
+def connect(path: str = LEDGER_PATH) -> sqlite3.Connection:
+    """Abre (e cria, se preciso) o ledger em modo WAL: leitores não bloqueiam a gravação e vice-versa."""
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    conn = sqlite3.connect(path, timeout=LEDGER_BUSY_TIMEOUT / 1000, check_same_thread=False)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")   # em WAL, durável a cada checkpoint; uma queda perde no máximo o último lote
+    conn.execute(f"PRAGMA busy_timeout={LEDGER_BUSY_TIMEOUT}")
+    conn.executescript(LEDGER_SCHEMA)
+    return conn
+
+def _now_ms() -> int:
+    return time.time_ns() // 1_000_000
+
+
+class TradeLedger:
+    """Histórico permanente de ordens, preenchimentos, taxas e ciclos de um par, em SQLite.
+
+    Os métodos `order()`, `fill()`, `cycle_open()` e `cycle_close()` só acumulam tuplas em memória;
+    a cada `flush_interval` o lote inteiro vai para o banco com `executemany` numa única transação,
+    fora do loop de eventos. Vários traders (e processos) podem gravar no mesmo arquivo.
+    """
+
+    def __init__(self, exchange: str, symbol: str, logger: logging.Logger, error_logger: logging.Logger,
+                 path: str = LEDGER_PATH, flush_interval: float = LEDGER_FLUSH_INTERVAL):
+        self.exchange = exchange
+        self.symbol = symbol
+        self.path = path
+        self.logger = logger
+        self.error_logger = error_logger
+        self.flush_interval = flush_interval
+        self._conn: Optional[sqlite3.Connection] = None
+        self._buffer: Dict[str, List[Tuple]] = {table: [] for table in _INSERTS}
+        self._lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+
+    # ---------------------------------------------------------------- registro (sem I/O)
+
+    def order(self, event: str, cycle_id: int, order_id: str, side: Optional[str] = None, order_type: Optional[str] = None,
+              price: Optional[float] = None, qty: Optional[float] = None, value: Optional[int] = None):
+        self._buffer['orders'].append((_now_ms(), self.exchange, self.symbol, cycle_id, order_id, event, side, order_type, price, qty, value))
+
+    def fill(self, cycle_id: int, order_id: Optional[str], side: str, price, qty, value: int, fee: int):
+        self._buffer['fills'].append((_now_ms(), self.exchange, self.symbol, cycle_id, order_id, side, float(price), float(qty), int(value), int(fee)))
+
+    def cycle_open(self, cycle_id: int):
+        self._buffer['cycles'].append((_now_ms(), self.exchange, self.symbol, cycle_id, 'open', 1, 0, 0, 0, 0))
+
+    def cycle_close(self, cycle_id: int, depth: int, invested: int, received: int, fees: int, profit: int):
+        self._buffer['cycles'].append((_now_ms(), self.exchange, self.symbol, cycle_id, 'close', depth, int(invested), int(received), int(fees), int(profit)))
+
+    # ---------------------------------------------------------------- gravação
+
+    def _write(self, batches: Dict[str, List[Tuple]]):
+        if self._conn is None:
+            self._conn = connect(self.path)
+        with self._conn:   # uma transação por lote
+            for table, rows in batches.items():
+                if rows:
+                    self._conn.executemany(_INSERTS[table], rows)
+
+    async def flush(self):
+        async with self._lock:
+            if not any(self._buffer.values()):
+                return
+            batches, self._buffer = self._buffer, {table: [] for table in _INSERTS}
+            try:
+                await asyncio.to_thread(self._write, batches)
+            except sqlite3.Error:
+                # Devolve o lote para a próxima tentativa (banco ocupado por outro processo, disco cheio...)
+                for table, rows in batches.items():
+                    self._buffer[table][:0] = rows
+                raise
+
+    async def _flush_loop(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception as e:
+                self.error_logger.error(f"⚠️ Erro ao gravar o ledger de operações: {e}")
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._flush_loop())
+
+    async def close(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        try:
+            await self.flush()
+        except Exception as e:
+            self.error_logger.error(f"⚠️ Erro ao gravar o ledger de operações: {e}")
+        if self._conn is not None:
+            await asyncio.to_thread(self._conn.close)
+            self._conn = None
+
+
+# ---------------------------------------------------------------- consultas
+
+_GROUPS = {
+    'day': 'day',
+    'pair': 'symbol',
+    'depth': 'depth',
+}
+
+def _filters(symbol: Optional[str], exchange: Optional[str], since: Optional[str], until: Optional[str]) -> Tuple[str, List]:
+    clauses, params = [], []
+    for clause, value in (("symbol = ?", symbol), ("exchange = ?", exchange), ("day >= ?", since), ("day <= ?", until)):
+        if value:
+            clauses.append(clause)
+            params.append(value)
+    return (" WHERE " + " AND ".join(clauses)) if clauses else "", params
+
+def pnl(conn: sqlite3.Connection, by: str = 'day', symbol: Optional[str] = None, exchange: Optional[str] = None,
+        since: Optional[str] = None, until: Optional[str] = None) -> List[Dict]:
+    """Lucro realizado agrupado por 'day', 'pair' ou 'depth' (datas 'AAAA-MM-DD', UTC), lido do agregado diário."""
+    column = _GROUPS[by]
+    where, params = _filters(symbol, exchange, since, until)
+    rows = conn.execute(f"SELECT {column}, SUM(cycles), SUM(invested), SUM(fees), SUM(profit) FROM pnl_daily{where} "
+                        f"GROUP BY {column} ORDER BY {column}", params).fetchall()
+    return [{"key": key, "cycles": cycles, "invested": invested, "fees": fees, "profit": profit}
+            for key, cycles, invested, fees, profit in rows]
+
+def cycle_history(conn: sqlite3.Connection, symbol: str, cycle_id: int) -> Dict[str, List[Tuple]]:
+    """Ordens, preenchimentos e eventos de um ciclo (todas as execuções que usaram esse número de ciclo)."""
+    return {table: conn.execute(f"SELECT * FROM {table} WHERE symbol = ? AND cycle_id = ? ORDER BY ts", (symbol, cycle_id)).fetchall()
+            for table in ('orders', 'fills', 'cycles')}
+
+def rebuild_rollup(conn: sqlite3.Connection):
+    """Recalcula o agregado diário a partir dos fechamentos (ex.: depois de importar registros de outro banco)."""
+    with conn:
+        conn.execute("DELETE FROM pnl_daily")
+        conn.execute("INSERT INTO pnl_daily (day, exchange, symbol, depth, cycles, invested, fees, profit) "
+                     "SELECT date(ts / 1000, 'unixepoch'), exchange, symbol, depth, COUNT(*), SUM(invested), SUM(fees), SUM(profit) "
+                     "FROM cycles WHERE event = 'close' GROUP BY 1, 2, 3, 4")
+
+def format_report(rows: Sequence[Dict], by: str) -> str:
+    header = {'day': 'Dia', 'pair': 'Par', 'depth': 'Compras'}[by]
+    lines = [f"{header:<12} {'Ciclos':>8} {'Investido':>14} {'Taxas':>12} {'Lucro':>12} {'Lucro %':>8}"]
+    total = {"cycles": 0, "invested": 0, "fees": 0, "profit": 0}
+    for row in rows:
+        for key in total:
+            total[key] += row[key]
+        lines.append(_report_line(str(row["key"]), row))
+    lines.append(_report_line("Total", total))
+    return "\n".join(lines)
+
+def _report_line(label: str, row: Dict) -> str:
+    percent = row["profit"] / row["invested"] * 100 if row["invested"] else 0.0
+    return (f"{label:<12} {row['cycles']:>8} {to_quote(row['invested']):>14.2f} {to_quote(row['fees']):>12.4f} "
+            f"{to_quote(row['profit']):>12.4f} {percent:>7.3f}%")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Relatório de lucro realizado a partir do ledger de operações.")
+    parser.add_argument("--db", default=LEDGER_PATH, help=f"arquivo do ledger (padrão: {LEDGER_PATH})")
+    parser.add_argument("--by", choices=sorted(_GROUPS), default='day', help="agrupar por dia, par ou profundidade do ciclo")
+    parser.add_argument("--symbol", help="filtrar um par (ex.: BTCUSDT)")
+    parser.add_argument("--exchange", help="filtrar uma exchange (ex.: 'Bybit Demo')")
+    parser.add_argument("--since", help="dia inicial, AAAA-MM-DD (UTC)")
+    parser.add_argument("--until", help="dia final, AAAA-MM-DD (UTC)")
+    parser.add_argument("--cycle", type=int, help="listar ordens, preenchimentos e eventos de um ciclo (requer --symbol)")
+    parser.add_argument("--rebuild", action="store_true", help="recalcular o agregado diário antes do relatório")
+    args = parser.parse_args()
+
+    conn = connect(args.db)
+    if args.rebuild:
+        rebuild_rollup(conn)
+    started = time.perf_counter()
+    if args.cycle is not None:
+        if not args.symbol:
+            parser.error("--cycle requer --symbol")
+        for table, rows in cycle_history(conn, args.symbol, args.cycle).items():
+            print(f"{table}:")
+            for row in rows:
+                print("   ", row)
+    else:
+        print(format_report(pnl(conn, args.by, args.symbol, args.exchange, args.since, args.until), args.by))
+    print(f"({(time.perf_counter() - started) * 1000:.1f} ms)")
+    conn.close()
@@ -0,0 +1,153 @@
+# log_pipeline.py
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import time
+from decimal import Decimal
+from typing import List, Optional
+
+TRADE_LOGGER = 'trade_log'
+ERROR_LOGGER = 'error_log'
+LOG_DIR = 'user/logs'
+LOG_MAX_BYTES = 20 * 1024 * 1024   # rotação por tamanho, além da rotação diária
+LOG_ROTATE_WHEN = 'midnight'
+LOG_BACKUP_COUNT = 14              # arquivos antigos mantidos por log
+LOG_JSON_LINES = False             # também grava <nome>.jsonl (um objeto JSON por registro)
+LOG_TIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+# Argumentos que podem ser formatados mais tarde na thread do listener sem risco de mudarem até lá
+LOG_IMMUTABLE_ARGS = (str, int, float, bool, bytes, Decimal, type(None))
+
+def _pair(record: logging.LogRecord) -> str:
+    """Contexto do par: loggers filhos ('trade_log.BTCUSDT') criados por cada trader."""
+    return record.name.partition('.')[2]
+
+
+class TextFormatter(logging.Formatter):
+    """`[data hora] [par] mensagem`, com o carimbo gerado na thread de escrita a partir de `record.created`.
+
+    Quebras de linha no início da mensagem ficam antes do carimbo, preservando o espaçamento dos logs.
+    """
+
+    def __init__(self, levels: bool = False):
+        super().__init__()
+        self.levels = levels
+
+    def format(self, record: logging.LogRecord) -> str:
+        message = record.getMessage()
+        body = message.lstrip('\n')
+        pair = _pair(record)
+        line = (message[:len(message) - len(body)] + f"[{time.strftime(LOG_TIME_FORMAT, time.localtime(record.created))}] "
+                + (f"{record.levelname} - " if self.levels else '') + (f"[{pair}] " if pair else '') + body)
+        if record.exc_info:
+            line += '\n' + self.formatException(record.exc_info)
+        return line
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": round(record.created, 6),
+            "time": time.strftime(LOG_TIME_FORMAT, time.localtime(record.created)),
+            "level": record.levelname,
+            "log": record.name.partition('.')[0],
+            "pair": _pair(record) or None,
+            "msg": record.getMessage().strip(),
+        }
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False)
+
+
+class SizedTimedRotatingFileHandler(logging.handlers.TimedRotatingFileHandler):
+    """Rotação diária e também ao passar de `max_bytes`; várias rotações no mesmo dia ganham sufixo .001, .002..."""
+
+    def __init__(self, filename: str, max_bytes: int = LOG_MAX_BYTES, when: str = LOG_ROTATE_WHEN, backup_count: int = LOG_BACKUP_COUNT):
+        super().__init__(filename, when=when, backupCount=backup_count, encoding='utf-8', delay=True)
+        self.max_bytes = max_bytes
+
+    def shouldRollover(self, record: logging.LogRecord) -> bool:
+        if super().shouldRollover(record):
+            return True
+        return bool(self.max_bytes) and self.stream is not None and self.stream.tell() >= self.max_bytes
+
+    def rotation_filename(self, default_name: str) -> str:
+        name, count = default_name, 0
+        while os.path.exists(name):
+            count += 1
+            name = f"{default_name}.{count:03d}"
+        return name
+
+
+class LazyQueueHandler(logging.handlers.QueueHandler):
+    """Só enfileira o registro: mensagem, argumentos e carimbo são formatados na thread do QueueListener.
+
+    Argumentos mutáveis (dicts, listas, objetos) seriam lidos pela outra thread depois de o loop já os
+    ter alterado; nesses registros a mensagem é montada aqui, antes de entrar na fila.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        args = record.args
+        if args and (not isinstance(args, tuple) or not all(isinstance(arg, LOG_IMMUTABLE_ARGS) for arg in args)):
+            record.msg = record.getMessage()
+            record.args = None
+        return record
+
+
+_listener: Optional[logging.handlers.QueueListener] = None
+
+def setup_logging(name: str, directory: str = LOG_DIR, json_lines: bool = LOG_JSON_LINES, console: bool = True,
+                  max_bytes: int = LOG_MAX_BYTES, when: str = LOG_ROTATE_WHEN, backup_count: int = LOG_BACKUP_COUNT) -> logging.handlers.QueueListener:
+    """Liga os loggers de operações e de erros a uma fila; uma thread em segundo plano formata e grava.
+
+    No loop de eventos, registrar um log custa só criar o LogRecord e um `put` numa fila sem limite
+    (nunca bloqueia). Arquivos: `<nome>_trade.log`, `<nome>_error.log` e, opcionalmente, `<nome>.jsonl`.
+    """
+    global _listener
+    if _listener is not None:
+        return _listener
+    os.makedirs(directory, exist_ok=True)
+    handlers: List[logging.Handler] = []
+
+    trade_handler = SizedTimedRotatingFileHandler(os.path.join(directory, f"{name}_trade.log"), max_bytes, when, backup_count)
+    trade_handler.setFormatter(TextFormatter())
+    trade_handler.addFilter(logging.Filter(TRADE_LOGGER))
+    handlers.append(trade_handler)
+
+    error_handler = SizedTimedRotatingFileHandler(os.path.join(directory, f"{name}_error.log"), max_bytes, when, backup_count)
+    error_handler.setFormatter(TextFormatter(levels=True))
+    error_handler.addFilter(logging.Filter(ERROR_LOGGER))
+    handlers.append(error_handler)
+
+    if json_lines:
+        json_handler = SizedTimedRotatingFileHandler(os.path.join(directory, f"{name}.jsonl"), max_bytes, when, backup_count)
+        json_handler.setFormatter(JsonFormatter())
+        handlers.append(json_handler)
+
+    if console:
+        # sys.__stderr__: o stdout do processo pode estar redirecionado para o próprio log (TradeLoggerWriter)
+        console_handler = logging.StreamHandler(sys.__stderr__)
+        console_handler.setFormatter(TextFormatter())
+        handlers.append(console_handler)
+
+    log_queue = queue.SimpleQueue()
+    for logger_name in (TRADE_LOGGER, ERROR_LOGGER):
+        logger = logging.getLogger(logger_name)
+        logger.handlers = [LazyQueueHandler(log_queue)]
+        logger.propagate = False
+    _listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _listener.start()
+    atexit.register(stop_logging)
+    return _listener
+
+def stop_logging():
+    """Esvazia a fila e fecha os arquivos (chamado também na saída do processo)."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.close()
+        _listener = None
@@ -5,30 +5,41 @@ import logging
 import json
 import sys
 from datetime import datetime
-from decimal import Decimal, getcontext, ROUND_DOWN
-from typing import Dict
+from decimal import Decimal, getcontext
+from typing import Dict, Tuple
 from api_rest import BybitRestClient
+from balance_service import BalanceService
+from cycle_position import CyclePosition
+from fixed_point import fee_on, fee_ppm, quote_units, to_quote
+from log_pipeline import ERROR_LOGGER, TRADE_LOGGER, setup_logging
+from metrics import metrics
+from order_tracker import ORDER_RESULT_TIMEOUT, TERMINAL_STATUSES, OrderTracker, OrderAck
+from state_journal import StateJournal, journal_key
+from ledger import TradeLedger
+from market_data import MarketDataStream
 from websocket_monitor import BybitWebSocketMonitor
 from menu import get_strategy_config
 
 # Configura a precisão global para Decimal
 getcontext().prec = 28
 
-# Configuração do logging
+# Tempo máximo (s) aguardando o preenchimento pelo WebSocket antes de consultar o REST
+FILL_WAIT_TIMEOUT = 3
+
+# Atributos do BybitTrader gravados no journal de estado para retomar o ciclo após um reinício
+JOURNAL_STATE_FIELDS = (
+    "cycle_id", "cycle_buys", "rebuy_count", "current_sell_id", "current_rebuy_id",
+    "current_rebuy_drop", "current_profit_target", "total_profit",
+    "last_cycle_profit", "profit_to_add_per_order", "profit_orders_remaining",
+    "paused_for_insufficient_balance", "pending_rebuy_price", "pending_rebuy_qty",
+)
+
+# Loggers de operações e de erros; a gravação (fila + thread, rotação, JSON) é ligada por setup_logging na execução
 main_file_name = os.path.splitext(os.path.basename(__file__))[0]
-logging.basicConfig(level=logging.INFO, format='%(message)s', encoding='utf-8')  # Remove %(asctime)s
-trade_logger = logging.getLogger('trade_log')
+trade_logger = logging.getLogger(TRADE_LOGGER)
 trade_logger.setLevel(logging.INFO)
-trade_handler = logging.FileHandler(f'{main_file_name}_trade_log.txt', encoding='utf-8')
-trade_formatter = logging.Formatter('%(message)s')  # No timestamp
-trade_handler.setFormatter(trade_formatter)
-trade_logger.addHandler(trade_handler)
-error_logger = logging.getLogger('error_log')
-error_handler = logging.FileHandler(f'{main_file_name}_error_log.txt', encoding='utf-8')
-error_handler.setLevel(logging.DEBUG)
-error_formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s\n%(exc_info)s')
-error_handler.setFormatter(error_formatter)
-error_logger.addHandler(error_handler)
+error_logger = logging.getLogger(ERROR_LOGGER)
+error_logger.setLevel(logging.INFO)
 
 class TradeLoggerWriter:
     def write(self, message):
@@ -36,55 +47,104 @@ class TradeLoggerWriter:
             trade_logger.info(message.strip())  # Strip to avoid extra newlines
     def flush(self):
         pass
-sys.stdout = TradeLoggerWriter()
+
+def symbol_from_pair(par: str) -> tuple[str, str, str]:
+    """'BTC/USDT' -> ('BTCUSDT', 'BTC', 'USDT')."""
+    base_coin, quote_coin = par.upper().split('/')
+    return f"{base_coin}{quote_coin}", base_coin, quote_coin
 
 class BybitTrader:
-    def __init__(self, **config):
-        self.logger = trade_logger
-        self.error_logger = error_logger
+    def __init__(self, rest_client: BybitRestClient = None, ws_monitor: BybitWebSocketMonitor = None,
+                 balances: BalanceService = None, order_tracker: OrderTracker = None, market_data: MarketDataStream = None, **config):
+        # Par operado
+        self.par = config.get('par', 'BTC/USDT')
+        self.symbol, self.base_coin, self.quote_coin = symbol_from_pair(self.par)
+        # Loggers filhos por par: cada registro leva o símbolo como contexto (texto e JSON)
+        self.logger = trade_logger.getChild(self.symbol)
+        self.error_logger = error_logger.getChild(self.symbol)
         self.logger.info(f"\n{'='*50}\n🚀 Iniciando nova execução em {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n{'='*50}\n")
 
-        # Initialize modules
-        self.rest_client = BybitRestClient(config, trade_logger, error_logger)
-        self.ws_monitor = BybitWebSocketMonitor(self, config, trade_logger, error_logger)
-        
-        # Configuração do saldo limite
-        self.saldo_limite = config['saldo_limite']
-        self.fee = config['fee'] if config['fee'] is not None else 0.001
-        trade_logger.info(f"\n💹 Taxa de transação configurada: {self.fee * 100:.3f}% {'(sem taxa)' if self.fee == 0 else ''}\n📈 Limite de saldo para operações configurado: {self.saldo_limite:.2f} USDT {('(saldo total)' if self.saldo_limite == 0 else '')}")
+        # Initialize modules (o TradingSupervisor injeta módulos partilhados entre vários pares)
+        self._owns_modules = rest_client is None
+        self.rest_client = rest_client or BybitRestClient(config, self.logger, self.error_logger)
+        self.order_tracker = order_tracker or OrderTracker(self.logger, self.error_logger)
+        self.balances = balances or BalanceService(self.rest_client, (self.base_coin, self.quote_coin), self.logger, self.error_logger)
+        self.ws_monitor = ws_monitor or BybitWebSocketMonitor(config, self.logger, self.error_logger, self.balances, self.order_tracker, self.rest_client.clock, self.rest_client)
+        self.ws_monitor.register(self)  # cria self.ws_events (fila limitada de eventos do hub)
+        self.units = self.rest_client.units(self.symbol)
+        # Stream público (ticker e livro de ofertas): preço de mercado lido em memória, sem REST
+        self.market_data = market_data
+        if self.market_data is None and self._owns_modules and config.get('market_data', 's').lower() == 's':
+            self.market_data = MarketDataStream(config['exchange'], [self.symbol], self.logger, self.error_logger)
 
         # State
         self.active_orders = {}
-        self.btc_balance = Decimal('0.0')
-        self.usdt_balance = Decimal('0.0')
         self.order_event = asyncio.Event()
         self.running = True
         self.stop_after_sell = False
+        self._gap_warned = None   # recompra já avisada de mercado abaixo do preço
+
+        self._init_strategy(config)
+
+        # Métricas de latência (desligadas se a estratégia não define metrics_port nem metrics_dump_interval)
+        self.metrics_port = int(config.get('metrics_port', 0) or 0)
+        self.metrics_dump_interval = float(config.get('metrics_dump_interval', 0) or 0)
+
+        # Configuração de salvamento da estratégia
+        self.save_strategy = config['save_strategy'].lower()
+        self.logger.info(f"💾 Configuração de salvamento da estratégia: {'Ativada' if self.save_strategy == 's' else 'Desativada'}")
+
+        # Journal de estado: com ele ativo as ordens ficam abertas ao encerrar e o ciclo é retomado no próximo início
+        self.journal = None
+        if config.get('journal', 's').lower() == 's':
+            # Uma chave por estratégia (arquivo ou hash da configuração): vários traders no mesmo par não partilham journal
+            self.journal = StateJournal(journal_key(config, self.symbol), self.logger, self.error_logger)
+
+        # Ledger de operações (SQLite): ordens, preenchimentos, taxas e lucro por ciclo, para relatórios (python ledger.py)
+        self.ledger = None
+        if config.get('ledger', 's').lower() == 's':
+            self.ledger = TradeLedger(config['exchange'], self.symbol, self.logger, self.error_logger)
+
+        # Salvar estratégia se configurado
+        if self.save_strategy == 's':
+            self._save_strategy_to_json()
+
+    def _init_strategy(self, config: Dict):
+        """Parâmetros e estado da estratégia, sem nenhuma dependência de rede (usado também pelo backtest).
+
+        Valores em moeda de cotação ficam em unidades inteiras (fixed_point), razões em float e preços/quantidades
+        das ordens em ticks/lotes de `self.units`; Decimal só na entrada e na montagem das ordens.
+        """
+        # Configuração do saldo limite
+        self.saldo_limite = quote_units(config['saldo_limite'])
+        self.fee = float(config['fee']) if config['fee'] is not None else 0.001
+        self.fee_ppm = fee_ppm(self.fee)   # valores de taxa calculados só com inteiros
+        self.logger.info(f"\n💹 Taxa de transação configurada: {self.fee * 100:.3f}% {'(sem taxa)' if self.fee == 0 else ''}\n📈 Limite de saldo para operações configurado: {to_quote(self.saldo_limite):.2f} USDT {('(saldo total)' if self.saldo_limite == 0 else '')}")
 
         # Parametros de inicialização
-        self.qty_initial = Decimal(str(config['qty_initial']))
-        self.qty_min = Decimal(str(config['qty_min']))
-        self.qty_max = Decimal(str(config['qty_max']))
-        self.qty_multiplier = Decimal(str(config['qty_multiplier']))
+        self.qty_initial = quote_units(config['qty_initial'])
+        self.qty_min = quote_units(config['qty_min'])
+        self.qty_max = quote_units(config['qty_max'])
+        self.qty_multiplier = float(config['qty_multiplier'])
 
         # Parâmetros de lucro
-        self.profit_target = Decimal(str(config['profit_target']))
-        self.profit_target_min = Decimal(str(config['profit_target_min']))
-        self.profit_target_max = Decimal(str(config['profit_target_max']))
-        self.profit_target_multiplier = Decimal(str(config['profit_target_multiplier']))
-        self.current_profit_target = Decimal(str(config['profit_target']))
+        self.profit_target = float(config['profit_target'])
+        self.profit_target_min = float(config['profit_target_min'])
+        self.profit_target_max = float(config['profit_target_max'])
+        self.profit_target_multiplier = float(config['profit_target_multiplier'])
+        self.current_profit_target = self.profit_target
 
         # Parâmetros de recompra
-        self.rebuy_percent = config['rebuy_percent']
-        self.rebuy_drop_min = config['rebuy_drop_min']
-        self.rebuy_drop_max = config['rebuy_drop_max']
-        self.rebuy_multiplier = config['rebuy_multiplier']
+        self.rebuy_percent = float(config['rebuy_percent'])
+        self.rebuy_drop_min = float(config['rebuy_drop_min'])
+        self.rebuy_drop_max = float(config['rebuy_drop_max'])
+        self.rebuy_multiplier = float(config['rebuy_multiplier'])
         self.current_rebuy_drop = self.rebuy_percent
         self.rebuys_max = config['rebuys_max']
 
         # Parametros do ciclo
         self.cycle_id = 0
-        self.cycle_buys = []
+        self.position = CyclePosition(self.fee, self.units)
         self.rebuy_count = 0
 
         # Parametros da ordem atual
@@ -92,46 +152,123 @@ class BybitTrader:
         self.current_rebuy_id = None
 
         # Parametros de lucro
-        self.profit_per_cycle = Decimal('0.0')
-        self.total_profit = Decimal('0.0')
+        self.profit_per_cycle = 0
+        self.total_profit = 0
         self.profit_reaplicar = config['profit_reaplicar'].lower()
         self.profit_distribution_orders = config['profit_distribution_orders']
-        self.last_cycle_profit = Decimal('0.0')
-        self.profit_to_add_per_order = Decimal('0.0')
+        self.last_cycle_profit = 0
+        self.profit_to_add_per_order = 0
         self.profit_orders_remaining = 0
-        trade_logger.info(f"💸 Configuração de reaplicação de lucro: {'Ativada' if self.profit_reaplicar == 's' else 'Desativada'}, Ordens de distribuição: {self.profit_distribution_orders}")
-
-        # Configuração de salvamento da estratégia
-        self.save_strategy = config['save_strategy'].lower()
-        trade_logger.info(f"💾 Configuração de salvamento da estratégia: {'Ativada' if self.save_strategy == 's' else 'Desativada'}")
-        self.total_investido = Decimal('0.0')
+        self.logger.info(f"💸 Configuração de reaplicação de lucro: {'Ativada' if self.profit_reaplicar == 's' else 'Desativada'}, Ordens de distribuição: {self.profit_distribution_orders}")
 
         # Novas variáveis para controlar pausa por saldo insuficiente
         self.paused_for_insufficient_balance = False
         self.pending_rebuy_price = None
         self.pending_rebuy_qty = None
 
-        # Salvar estratégia se configurado
-        if self.save_strategy == 's':
-            self._save_strategy_to_json()
+    @property
+    def cycle_buys(self) -> list:
+        """Compras do ciclo atual (a lista gravada no journal)."""
+        return self.position.buys
+
+    @cycle_buys.setter
+    def cycle_buys(self, buys: list):
+        # Estado recuperado do journal: reconstrói os totais da posição
+        self.position = CyclePosition(self.fee, self.units, buys)
+
+    @property
+    def total_investido(self) -> int:
+        return self.position.notional
+
+    @property
+    def btc_balance(self) -> Decimal:
+        """Saldo da moeda base do par (BTC no par padrão)."""
+        return self.balances.get(self.base_coin)
+
+    @property
+    def usdt_balance(self) -> Decimal:
+        """Saldo da moeda de cotação do par (USDT no par padrão)."""
+        return self.balances.get(self.quote_coin)
+
+    def _checkpoint(self):
+        """Registra o estado do ciclo no journal (só memória; a gravação em disco é feita em lote)."""
+        if self.journal:
+            state = {field: getattr(self, field) for field in JOURNAL_STATE_FIELDS}
+            if self.pending_rebuy_price is not None:
+                # Ticks dependem do tamanho do tick do par; no disco fica o preço da exchange
+                state["pending_rebuy_price"] = self.units.tick_size * self.pending_rebuy_price
+            self.journal.record(state)
+
+    def _refresh_units(self):
+        """Troca as escalas padrão pelas do cache de instrumentos, antes de recuperar o journal e criar ordens."""
+        self.units = self.rest_client.units(self.symbol)
+        self.position = CyclePosition(self.fee, self.units, self.position.buys)
+        self.logger.info(f"📐 {self.symbol}: tick {self.units.tick_size}, lote {self.units.lot_size}, mínimo {to_quote(self.units.min_notional):g} {self.quote_coin}")
+
+    async def _recover_state(self):
+        """Restaura o estado gravado e o confere com as ordens abertas na exchange."""
+        state = self.journal.load()
+        if not state:
+            return
+        for field in JOURNAL_STATE_FIELDS:
+            if field in state:
+                setattr(self, field, state[field])
+        if self.pending_rebuy_price is not None:
+            # No disco fica o preço da exchange; em memória, ticks do par
+            self.pending_rebuy_price = self.units.price_ticks(self.pending_rebuy_price)
+        if not self.cycle_buys and not self.current_sell_id and not self.current_rebuy_id:
+            return
+        self.logger.info(f"♻️ Retomando ciclo #{self.cycle_id} com {len(self.cycle_buys)} compras (venda: {self.current_sell_id}, recompra: {self.current_rebuy_id})")
+
+        open_orders = await self.rest_client.get_open_orders(self.symbol)
+        # A venda primeiro: se foi preenchida durante a parada, on_sell_filled encerra o ciclo e cancela a recompra
+        for attr, side in (("current_sell_id", "Sell"), ("current_rebuy_id", "Buy")):
+            order_id = getattr(self, attr)
+            if not order_id:
+                continue
+            if open_orders is None or order_id in open_orders:
+                price = self.units.price_ticks(open_orders[order_id]["price"]) if open_orders else None
+                self.active_orders[order_id] = {"symbol": self.symbol, "side": side, "price": price}
+                self.ws_monitor.bind_order(order_id, self)
+                continue
+            # Detalhes do REST passados adiante: o WebSocket não vai reportar um preenchimento antigo
+            details = await self.rest_client.get_order_details(order_id)
+            self.logger.info(f"♻️ Ordem {order_id} encerrada durante a parada: {details['status']}")
+            if details["status"] != 'Filled':
+                setattr(self, attr, None)
+            elif side == "Sell":
+                await self.on_sell_filled(details)
+            else:
+                await self.on_rebuy_filled({"orderId": order_id}, details)
+
+        # Pernas que faltam numa posição aberta são recriadas a partir do estado recuperado
+        if self.cycle_buys and not self.current_sell_id:
+            if len(self.cycle_buys) == 1:
+                await self._place_sell_order(self.cycle_buys[0])
+            else:
+                await self._place_sell_order_after_rebuy(adjust_target=False)
+        rebuys_left = self.rebuys_max <= 0 or len(self.cycle_buys) - 1 < self.rebuys_max
+        if self.cycle_buys and not self.current_rebuy_id and not self.paused_for_insufficient_balance and rebuys_left:
+            await self._place_rebuy_order_after_rebuy()
+        self._checkpoint()
 
     def _save_strategy_to_json(self):
         strategy_config = {
-            "qty_initial": float(self.qty_initial),
-            "qty_min": float(self.qty_min),
-            "qty_max": float(self.qty_max),
-            "qty_multiplier": float(self.qty_multiplier),
-            "profit_target": float(self.profit_target * 100),
-            "profit_target_min": float(self.profit_target_min * 100),
-            "profit_target_max": float(self.profit_target_max * 100),
-            "profit_target_multiplier": float(self.profit_target_multiplier),
-            "rebuy_percent": float(self.rebuy_percent * 100),
-            "rebuy_drop_min": float(self.rebuy_drop_min * 100),
-            "rebuy_drop_max": float(self.rebuy_drop_max * 100),
-            "rebuy_multiplier": float(self.rebuy_multiplier),
+            "qty_initial": to_quote(self.qty_initial),
+            "qty_min": to_quote(self.qty_min),
+            "qty_max": to_quote(self.qty_max),
+            "qty_multiplier": self.qty_multiplier,
+            "profit_target": self.profit_target * 100,
+            "profit_target_min": self.profit_target_min * 100,
+            "profit_target_max": self.profit_target_max * 100,
+            "profit_target_multiplier": self.profit_target_multiplier,
+            "rebuy_percent": self.rebuy_percent * 100,
+            "rebuy_drop_min": self.rebuy_drop_min * 100,
+            "rebuy_drop_max": self.rebuy_drop_max * 100,
+            "rebuy_multiplier": self.rebuy_multiplier,
             "rebuys_max": self.rebuys_max,
-            "fee": float(self.fee * 100),
-            "saldo_limite": float(self.saldo_limite),
+            "fee": self.fee * 100,
+            "saldo_limite": to_quote(self.saldo_limite),
             "profit_reaplicar": self.profit_reaplicar,
             "profit_distribution_orders": self.profit_distribution_orders,
             "save_strategy": self.save_strategy
@@ -143,275 +280,477 @@ class BybitTrader:
         except Exception as e:
             self.error_logger.error(f"⚠️ Falha ao salvar estratégia em JSON: {e}")
 
+    async def _submit_order(self, side: str, qty: int, order_type: str, price: int | None) -> OrderAck | None:
+        """Envia a ordem (compra em unidades de cotação, venda em lotes, preço em ticks) e devolve um OrderAck,
+        aguardável até o estado terminal reportado pelo WebSocket."""
+        order_id = await self.rest_client.place_order(side, qty, order_type, price, self.fee, self.symbol)
+        if not order_id:
+            return None
+        self.active_orders[order_id] = {"symbol": self.symbol, "side": side, "price": price}
+        self.ws_monitor.bind_order(order_id, self)
+        if self.ledger:
+            price = self.units.price(price) if price is not None else None
+            if side == "Buy":
+                self.ledger.order("placed", self.cycle_id, order_id, side, order_type, price, value=qty)
+            else:
+                self.ledger.order("placed", self.cycle_id, order_id, side, order_type, price, self.units.qty(qty))
+        return OrderAck(order_id, self.order_tracker, self.rest_client)
+
+    async def _get_fill_details(self, order_id: str, timeout: float = FILL_WAIT_TIMEOUT) -> Dict:
+        """Detalhes do preenchimento agregados do WebSocket; o REST é usado apenas como fallback."""
+        details = await self.order_tracker.wait_for_fill(order_id, timeout)
+        if details is not None and details["qty"] > 0:
+            return details
+        self.logger.info("⚠️ Preenchimento da ordem %s não recebido pelo WebSocket, consultando REST...", order_id)
+        return await self.rest_client.get_order_details(order_id)
+
     def _calculate_cycle_profit(self, sell_details: Dict):
-        total_usdt_invested = sum(b["price"] * b["qty"] * (1 + self.fee) for b in self.cycle_buys)
-        total_btc_sold = sum(b["qty"] * (1 - self.fee) for b in self.cycle_buys)
-        sell_price = Decimal(str(sell_details["price"]))
-        sell_qty = Decimal(str(sell_details["qty"]))
-        total_usdt_received = sell_price * sell_qty * (1 - self.fee)
+        total_usdt_invested = self.position.notional_with_fees
+        total_btc_sold = self.position.net_lots
+        sell_notional = quote_units(sell_details["price"] * sell_details["qty"])
+        total_usdt_received = sell_notional - fee_on(sell_notional, self.fee_ppm)
         self.profit_per_cycle = total_usdt_received - total_usdt_invested
-        self.logger.info(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] 📊 Calculando lucro: Investido {total_usdt_invested:.2f} USDT, Recebido {total_usdt_received:.2f} USDT, BTC vendido {total_btc_sold:.6f}")
         self.total_profit += self.profit_per_cycle
-        self.logger.info(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] 💵 Lucro do ciclo #{self.cycle_id}: {self.profit_per_cycle:.2f} USDT")
-        self.logger.info(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] 💵 Lucro total acumulado: {self.total_profit:.2f} USDT\n")
+        # Os logs por preenchimento só são formatados se forem gravados (o backtest roda com o log desligado)
+        if self.logger.isEnabledFor(logging.INFO):
+            self.logger.info("📊 Calculando lucro: Investido %.2f USDT, Recebido %.2f USDT, BTC vendido %.6f",
+                             to_quote(total_usdt_invested), to_quote(total_usdt_received), self.units.qty(total_btc_sold))
+            self.logger.info("💵 Lucro do ciclo #%s: %.2f USDT", self.cycle_id, to_quote(self.profit_per_cycle))
+            self.logger.info("💵 Lucro total acumulado: %.2f USDT\n", to_quote(self.total_profit))
 
     def _distribute_profit(self):
         if self.profit_reaplicar != 's' or self.total_profit <= 0:  # Use total_profit
-            self.profit_to_add_per_order = Decimal('0.0')
+            self.profit_to_add_per_order = 0
             self.profit_orders_remaining = 0
             return
         num_orders = min(self.profit_distribution_orders, self.rebuys_max + 1)
-        self.profit_to_add_per_order = self.total_profit / Decimal(str(num_orders))  # Use total_profit
+        self.profit_to_add_per_order = self.total_profit // num_orders  # Use total_profit
         self.profit_orders_remaining = num_orders
-        self.logger.info(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] 📈 Lucro de {self.total_profit:.2f} USDT distribuído em {num_orders} ordens: {self.profit_to_add_per_order:.2f} USDT por ordem")
+        if self.logger.isEnabledFor(logging.INFO):
+            self.logger.info("📈 Lucro de %.2f USDT distribuído em %s ordens: %.2f USDT por ordem",
+                             to_quote(self.total_profit), num_orders, to_quote(self.profit_to_add_per_order))
 
-    def _calculate_qty(self, side: str, qty: str, is_rebuy: bool = False) -> Decimal:
-        initial_qty_usdt = Decimal(str(qty))
+    def _calculate_qty(self, side: str, qty: int, is_rebuy: bool = False) -> int:
+        """Tamanho da ordem em unidades de cotação (compra) ou lotes (venda)."""
         if side.lower() == "buy":
-            if is_rebuy and len(self.cycle_buys) > 0:
-                last_buy_usd_qty = Decimal(str(self.cycle_buys[-1]["price"])) * Decimal(str(self.cycle_buys[-1]["qty"]))
-                calculated_qty_usdt = last_buy_usd_qty * self.qty_multiplier
+            last_buy_usd_qty = self.position.last_notional
+            if is_rebuy and last_buy_usd_qty:
+                calculated_qty_usdt = int(last_buy_usd_qty * self.qty_multiplier)
             else:
-                calculated_qty_usdt = initial_qty_usdt
+                calculated_qty_usdt = qty
             if self.profit_reaplicar == 's' and self.profit_orders_remaining > 0 and self.profit_to_add_per_order > 0:
                 calculated_qty_usdt += self.profit_to_add_per_order
                 self.profit_orders_remaining -= 1
-                self.logger.info(f"💸 Adicionando {self.profit_to_add_per_order:.2f} USDT de lucro reinvestido. Ordens restantes: {self.profit_orders_remaining}")
-            actual_qty_usdt = max(self.qty_min, min(calculated_qty_usdt, self.qty_max))
-            actual_qty_usdt = actual_qty_usdt.quantize(Decimal('0.01'), rounding=ROUND_DOWN)
-            self.logger.info(
-                f"🔄 Calculando qty para {'recompra' if is_rebuy else 'compra inicial'}: base {initial_qty_usdt:.2f} USDT, calculado {calculated_qty_usdt:.2f} USDT, final {actual_qty_usdt:.2f} USDT (min: {self.qty_min}, max: {self.qty_max})")
+                if self.logger.isEnabledFor(logging.INFO):
+                    self.logger.info("💸 Adicionando %.2f USDT de lucro reinvestido. Ordens restantes: %s",
+                                     to_quote(self.profit_to_add_per_order), self.profit_orders_remaining)
+            actual_qty_usdt = self.units.floor_quote(max(self.qty_min, min(calculated_qty_usdt, self.qty_max)))
+            if self.logger.isEnabledFor(logging.INFO):
+                self.logger.info(
+                    "🔄 Calculando qty para %s: base %.2f USDT, calculado %.2f USDT, final %.2f USDT (min: %g, max: %g)",
+                    'recompra' if is_rebuy else 'compra inicial', to_quote(qty), to_quote(calculated_qty_usdt), to_quote(actual_qty_usdt), to_quote(self.qty_min), to_quote(self.qty_max))
             return actual_qty_usdt
         elif side.lower() == "sell":
-            return Decimal(str(qty))
-        return Decimal('0')
+            return qty
+        return 0
 
     def _update_rebuy_parameters(self):
         self.rebuy_count += 1
         self.current_rebuy_drop *= self.rebuy_multiplier
         self.current_rebuy_drop = max(self.rebuy_drop_min, min(self.current_rebuy_drop, self.rebuy_drop_max))
-        self.logger.info(
-            f"📉 Nova queda necessária para recompra: {self.current_rebuy_drop * 100:.2f}% (min: {self.rebuy_drop_min * 100:.2f}%, max: {self.rebuy_drop_max * 100:.2f}%)\n")
+        if self.logger.isEnabledFor(logging.INFO):
+            self.logger.info(
+                f"📉 Nova queda necessária para recompra: {self.current_rebuy_drop * 100:.2f}% (min: {self.rebuy_drop_min * 100:.2f}%, max: {self.rebuy_drop_max * 100:.2f}%)\n")
 
-    async def on_sell_filled(self):
-        self.logger.info(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] 🎉 Venda {self.current_sell_id} preenchida! Finalizando ciclo #{self.cycle_id}...\n")
-        if self.current_rebuy_id:
-            await self.rest_client.cancel_order(self.current_rebuy_id)
-            self.current_rebuy_id = None
-        sell_details = self.rest_client.get_order_details(self.current_sell_id)
+    def _initial_sell_price(self, buy_price) -> int:
+        """Preço da venda inicial em ticks (truncado)."""
+        return self.units.price_to_ticks(float(buy_price) * (1 + self.profit_target) / (1 - self.fee))
+
+    def _initial_rebuy_price(self, buy_price) -> int:
+        return self.units.price_to_ticks(float(buy_price) * (1 - self.rebuy_percent))
+
+    def _next_rebuy_price(self) -> int:
+        """Recompra seguinte: queda atual (já ajustada pelo multiplicador) sobre o preço da última compra, em ticks."""
+        return self.units.price_to_ticks(self.position.last_price * (1 - self.current_rebuy_drop))
+
+    def rebuy_distance(self) -> float | None:
+        """Quanto o melhor preço de venda do mercado está acima da recompra em aberto (0.01 = 1%); None sem dados."""
+        order = self.active_orders.get(self.current_rebuy_id) if self.market_data and self.current_rebuy_id else None
+        ask = self.market_data.best_ask(self.symbol) if order and order["price"] is not None else None
+        if ask is None:
+            return None
+        return ask / self.units.price(order["price"]) - 1
+
+    def check_market_gap(self):
+        """Avisa (uma vez por ordem) quando o mercado negocia abaixo da recompra em aberto e o preenchimento não chegou."""
+        distance = self.rebuy_distance()
+        if distance is None or distance >= 0 or self._gap_warned == self.current_rebuy_id:
+            return
+        self._gap_warned = self.current_rebuy_id
+        metrics.inc('rebuy_gap', self.symbol)
+        self.error_logger.warning("⚠️ Mercado %.3f%% abaixo da recompra %s (melhor venda %.2f %s) sem preenchimento",
+                                  -distance * 100, self.current_rebuy_id, self.market_data.best_ask(self.symbol), self.quote_coin)
+
+    def _leg_succeeded(self, result, leg: str) -> bool:
+        """Interpreta o resultado de uma perna executada com asyncio.gather(return_exceptions=True)."""
+        if isinstance(result, BaseException):
+            self.error_logger.error("⚠️ Erro na ordem de %s: %s", leg, result)
+            return False
+        return bool(result)
+
+    async def _cancel_rebuy_leg(self) -> bool:
+        if not self.current_rebuy_id:
+            return True
+        cancelled = await self.rest_client.cancel_order(self.current_rebuy_id, self.symbol)
+        if cancelled and self.ledger:
+            self.ledger.order("cancelled", self.cycle_id, self.current_rebuy_id)
+        self.current_rebuy_id = None
+        return cancelled
+
+    async def _cancel_sell_leg(self) -> bool:
+        """Cancela a venda e contabiliza o que ela já executou; False se a venda segue valendo (recusada ou preenchida).
+
+        O push de PartiallyFilledCanceled só seria tratado com current_sell_id ainda apontando para ela, por
+        isso a execução parcial é lida aqui: no tracker ou, sem estado final no WebSocket, no REST.
+        """
+        order_id = self.current_sell_id
+        if not order_id:
+            return True
+        if not await self.rest_client.cancel_order(order_id, self.symbol):
+            return False
+        status = await self.order_tracker.wait_for_status(order_id, TERMINAL_STATUSES, ORDER_RESULT_TIMEOUT)
+        if status:
+            details = self.order_tracker.get_details(order_id)
+        else:
+            details = await self.rest_client.get_order_details(order_id)
+            status = details["status"]
+        if status == 'Filled':
+            # "Ordem inexistente" também conta como cancelada: o push de Filled ainda vai encerrar o ciclo
+            return False
+        if self.ledger:
+            self.ledger.order("cancelled", self.cycle_id, order_id)
+        self.current_sell_id = None
+        if details and details["qty"] > 0:
+            self._record_partial_sell(details, order_id)
+        return True
+
+    async def _cancel_open_orders(self):
+        """Cancela a venda e a recompra em aberto numa única requisição batch."""
+        open_ids = [order_id for order_id in (self.current_sell_id, self.current_rebuy_id) if order_id]
+        if not open_ids:
+            return
+        for order_id, cancelled in zip(open_ids, await self.rest_client.batch_cancel_orders(open_ids, self.symbol)):
+            if not cancelled:
+                continue
+            if self.ledger:
+                self.ledger.order("cancelled", self.cycle_id, order_id)
+            if order_id == self.current_sell_id:
+                self.current_sell_id = None
+            elif order_id == self.current_rebuy_id:
+                self.current_rebuy_id = None
+        self._checkpoint()
+
+    def _close_cycle(self, sell_details: Dict, order_id: str | None = None):
+        """Contabiliza o lucro da venda e zera o estado do ciclo (sem I/O)."""
         self._calculate_cycle_profit(sell_details)
         self.last_cycle_profit = self.profit_per_cycle
+        if self.ledger:
+            self._ledger_close(sell_details, order_id)
         self._distribute_profit()
-        
+
         # Resetar para próximo ciclo
-        self.cycle_buys = []
-        self.current_sell_id = None
-        self.total_investido = Decimal('0.0')
+        self.position.clear()
         self.rebuy_count = 0
         self.current_rebuy_drop = self.rebuy_percent
         self.current_profit_target = self.profit_target
-        
+
         # Resetar estado de pausa por saldo insuficiente
         if self.paused_for_insufficient_balance:
-            self.logger.info(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] 🔓 Saindo da pausa - venda preenchida (Gatilho 1)")
+            self.logger.info("🔓 Saindo da pausa - venda preenchida (Gatilho 1)")
             self.paused_for_insufficient_balance = False
             self.pending_rebuy_price = None
             self.pending_rebuy_qty = None
+
+    def _record_buy(self, details: Dict, order_id: str):
+        self.position.add({
+            "price": details["price"],
+            "qty": details["qty"],
+            "order_id": order_id,
+            "cycle_id": self.cycle_id
+        })
+        if self.ledger:
+            if len(self.position) == 1:
+                self.ledger.cycle_open(self.cycle_id)
+            notional = self.position.last_notional
+            self.ledger.fill(self.cycle_id, order_id, "Buy", details["price"], details["qty"], notional, fee_on(notional, self.fee_ppm))
+
+    def _ledger_close(self, sell_details: Dict, order_id: str | None):
+        """Venda e fechamento do ciclo no ledger, com as mesmas contas de _calculate_cycle_profit."""
+        sell_notional = quote_units(sell_details["price"] * sell_details["qty"])
+        sell_fee = fee_on(sell_notional, self.fee_ppm)
+        self.ledger.fill(self.cycle_id, order_id, "Sell", sell_details["price"], sell_details["qty"], sell_notional, sell_fee)
+        self.ledger.cycle_close(self.cycle_id, len(self.position), self.position.notional_with_fees, sell_notional - sell_fee,
+                                self.position.notional_with_fees - self.position.notional + sell_fee, self.profit_per_cycle)
+
+    async def on_sell_filled(self, sell_details: Dict | None = None):
+        start = metrics.clock()
+        self.logger.info("🎉 Venda %s preenchida! Finalizando ciclo #%s...\n", self.current_sell_id, self.cycle_id)
+        if sell_details is None:
+            # Cancelar a recompra e ler o preenchimento da venda são independentes
+            _, sell_details = await asyncio.gather(self._cancel_rebuy_leg(), self._get_fill_details(self.current_sell_id))
+        else:
+            await self._cancel_rebuy_leg()
+        self._close_cycle(sell_details, self.current_sell_id)
+        self.current_sell_id = None
+        self._checkpoint()
+        metrics.observe('fill_to_close', start, self.symbol)
         
         # Verificar se deve parar ou continuar
         if self.stop_after_sell:
-            self.logger.info(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] 🛑 Ordem de parada após venda executada. Encerrando o bot...")
+            self.logger.info("🛑 Ordem de parada após venda executada. Encerrando o bot...")
             self.running = False
         else:
-            self.logger.info(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] 🔄 Preparando para iniciar novo ciclo...")
+            self.logger.info("🔄 Preparando para iniciar novo ciclo...")
             # O order_event.set() fará o loop principal continuar e iniciar novo ciclo
         
         self.order_event.set()
 
-    async def on_rebuy_filled(self, order: Dict):
-        self.logger.info(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] 🔄 Recompra {self.current_rebuy_id} preenchida no ciclo #{self.cycle_id}!")
-        if self.current_sell_id:
-            await self.rest_client.cancel_order(self.current_sell_id)
-            self.current_sell_id = None
-        rebuy_details = self.rest_client.get_order_details(order['orderId'])
+    async def on_rebuy_filled(self, order: Dict, rebuy_details: Dict | None = None):
+        start = metrics.clock()
+        self.logger.info("🔄 Recompra %s preenchida no ciclo #%s!", self.current_rebuy_id, self.cycle_id)
+        # A venda atual não é cancelada: será alterada no lugar (amend) com o novo preço e quantidade
+        if rebuy_details is None:
+            rebuy_details = await self._get_fill_details(order['orderId'])
         if rebuy_details["qty"] == Decimal('0'):
-            self.error_logger.error(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] Quantidade da recompra {order['orderId']} inválida! Abortando ciclo #{self.cycle_id}...\n")
+            self.error_logger.error("Quantidade da recompra %s inválida! Abortando ciclo #%s...\n", order['orderId'], self.cycle_id)
             self.order_event.set()
             return
-        self.cycle_buys.append({
-            "price": rebuy_details["price"],
-            "qty": rebuy_details["qty"],
-            "order_id": order['orderId'],
-            "cycle_id": self.cycle_id
-        })
-        self.total_investido = sum(b["price"] * b["qty"] for b in self.cycle_buys)
+        self._record_buy(rebuy_details, order['orderId'])
         rebuy_count = len(self.cycle_buys) - 1
         self._update_rebuy_parameters()
+        self._checkpoint()
         if self.rebuys_max > 0 and rebuy_count >= self.rebuys_max:
-            self.logger.info(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] ⚠️ Limite de recompras ({self.rebuys_max}) atingido no ciclo #{self.cycle_id}! Aguardando venda...")
+            self.logger.info("⚠️ Limite de recompras (%s) atingido no ciclo #%s! Aguardando venda...", self.rebuys_max, self.cycle_id)
             await self._place_sell_order_after_rebuy()
         else:
-            if not await self._place_sell_order_after_rebuy():
-                self.error_logger.error(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] Falha ao criar ordem de venda! Abortando ciclo #{self.cycle_id}...\n")
+            # Venda e nova recompra não dependem uma da outra: enviadas em paralelo
+            sell_result, rebuy_result = await asyncio.gather(self._place_sell_order_after_rebuy(), self._place_rebuy_order_after_rebuy(), return_exceptions=True)
+            sell_ok = self._leg_succeeded(sell_result, "venda")
+            rebuy_ok = self._leg_succeeded(rebuy_result, "recompra")
+            if not sell_ok and not self.current_sell_id:
+                # A posição está sem proteção de venda: uma nova tentativa antes de abortar
+                self.error_logger.warning("Falha ao criar ordem de venda, tentando novamente...\n")
+                sell_ok = await self._place_sell_order_after_rebuy()
+            if not sell_ok:
+                self.error_logger.error("Falha ao criar ordem de venda! Abortando ciclo #%s...\n", self.cycle_id)
                 self.order_event.set()
                 return
-            if not await self._place_rebuy_order_after_rebuy():
-                self.error_logger.error(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] Falha ao criar ordem de recompra! Abortando ciclo #{self.cycle_id}...\n")
+            if not rebuy_ok:
+                self.error_logger.error("Falha ao criar ordem de recompra! Abortando ciclo #%s...\n", self.cycle_id)
                 self.order_event.set()
                 return
-        btc_balance, usdt_balance, success = self.rest_client.get_balances()
-        if success:
-            self.btc_balance = btc_balance
-            self.usdt_balance = usdt_balance
-            # self.logger.info(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] 💰 Saldos Atuais:\nBTC: {self.btc_balance:.8f}\nUSDT: {self.usdt_balance:.2f}\n")
-        self.logger.info(f"🔄 Continuando monitoramento do ciclo #{self.cycle_id}...\n")  # No timestamp
-        self.logger.info(f"DEBUG: self.rebuys_max = {self.rebuys_max}, rebuy_count = {rebuy_count}\n")
+        self._checkpoint()
+        # Da notificação do preenchimento até a venda alterada e a nova recompra aceitas pela exchange
+        metrics.observe('fill_to_replace', start, self.symbol)
+        # self.logger.info(f"💰 Saldos Atuais:\nBTC: {self.btc_balance:.8f}\nUSDT: {self.usdt_balance:.2f}\n")
+        self.logger.info("🔄 Continuando monitoramento do ciclo #%s...\n", self.cycle_id)  # No timestamp
+        self.logger.debug("DEBUG: self.rebuys_max = %s, rebuy_count = %s\n", self.rebuys_max, rebuy_count)
+
+    async def on_order_cancelled(self, order: Dict):
+        """Venda ou recompra encerrada pela exchange sem preenchimento total (cancelada, rejeitada ou desativada)."""
+        order_id = order['orderId']
+        details = None
+        if order.get('orderStatus') == 'PartiallyFilledCanceled':
+            details = self.order_tracker.get_details(order_id) or await self.rest_client.get_order_details(order_id)
+        partial = details is not None and details["qty"] > 0
+        if order_id == self.current_rebuy_id:
+            if partial:
+                # A parte executada entra no ciclo como uma recompra comum: venda alterada e nova recompra
+                self.logger.info("⚠️ Recompra %s cancelada com %s executados; contabilizada como recompra", order_id, details['qty'])
+                await self.on_rebuy_filled(order, details)
+                return
+            self.current_rebuy_id = None
+        elif order_id == self.current_sell_id:
+            self.current_sell_id = None
+            if partial:
+                self._record_partial_sell(details, order_id)
+        self._checkpoint()
+
+    def _record_partial_sell(self, sell_details: Dict, order_id: str):
+        """Venda cancelada após execução parcial: realiza o lucro da parte vendida e reduz a posição na mesma proporção."""
+        held_lots = self.position.net_lots
+        sold_lots = min(self.units.qty_lots(sell_details["qty"]), held_lots)
+        if held_lots <= 0 or sold_lots <= 0:
+            return
+        cost = self.position.notional_with_fees * sold_lots // held_lots
+        sell_notional = quote_units(sell_details["price"] * sell_details["qty"])
+        sell_fee = fee_on(sell_notional, self.fee_ppm)
+        profit = sell_notional - sell_fee - cost
+        self.total_profit += profit
+        if self.ledger:
+            self.ledger.fill(self.cycle_id, order_id, "Sell", sell_details["price"], sell_details["qty"], sell_notional, sell_fee)
+        self.position.scale(Decimal(held_lots - sold_lots) / Decimal(held_lots))
+        self.logger.warning("⚠️ Venda %s cancelada com %s %s executados: lucro parcial %.2f %s, posição restante %.6f %s",
+                            order_id, sell_details['qty'], self.base_coin, to_quote(profit), self.quote_coin, self.units.qty(self.position.net_lots), self.base_coin)
 
     async def try_execute_pending_rebuy(self) -> bool:
         """Tenta executar uma recompra pendente quando há saldo suficiente"""
         if not self.paused_for_insufficient_balance or not self.pending_rebuy_price or not self.pending_rebuy_qty:
             return False
             
-        # Verificar se agora há saldo suficiente
-        btc_balance, usdt_balance, success = self.rest_client.get_balances()
-        if not success:
+        # Verificar se agora há saldo suficiente (livro de saldos já atualizado pelo stream de wallet)
+        if await self.balances.snapshot() is None:
             return False
             
-        self.usdt_balance = usdt_balance
-        if self.usdt_balance >= self.pending_rebuy_qty:
-            self.logger.info(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] 🔓 Saindo da pausa - saldo suficiente detectado (Gatilho 2)")
-            self.logger.info(f"💰 Saldo atual: {self.usdt_balance:.2f} USDT >= {self.pending_rebuy_qty:.2f} USDT necessários")
+        if quote_units(self.usdt_balance) >= self.pending_rebuy_qty:
+            self.logger.info("🔓 Saindo da pausa - saldo suficiente detectado (Gatilho 2)")
+            self.logger.info("💰 Saldo atual: %.2f USDT >= %.2f USDT necessários", self.usdt_balance, to_quote(self.pending_rebuy_qty))
             
             # Tentar executar a recompra pendente
-            self.current_rebuy_id = self.rest_client.place_order("Buy", str(self.pending_rebuy_qty), "Limit", str(int(self.pending_rebuy_price)), self.fee)
+            ack = await self._submit_order("Buy", self.pending_rebuy_qty, "Limit", self.pending_rebuy_price)
+            self.current_rebuy_id = ack.order_id if ack else None
             
             if self.current_rebuy_id:
-                self.active_orders[self.current_rebuy_id] = {"symbol": "BTCUSDT", "side": "Buy"}
-                self.logger.info(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] ✅ Recompra pendente executada! ID: {self.current_rebuy_id}")
+                self.logger.info("✅ Recompra pendente executada! ID: %s", self.current_rebuy_id)
                 
                 # Resetar estado de pausa
                 self.paused_for_insufficient_balance = False
                 self.pending_rebuy_price = None
                 self.pending_rebuy_qty = None
+                self._checkpoint()
                 return True
             else:
-                self.logger.info(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] ⚠️ Falha ao executar recompra pendente")
+                self.logger.info("⚠️ Falha ao executar recompra pendente")
                 return False
         
         return False
 
-    async def _place_sell_order_after_rebuy(self) -> bool:
-        self.logger.info("📈 Iniciando o processo da ordem de venda após recompra...\n")
-        total_usdt_invested = sum(b["price"] * b["qty"] for b in self.cycle_buys)
-        total_usdt_with_fees = sum(b["price"] * b["qty"] * (1 + self.fee) for b in self.cycle_buys)
-        total_btc_received = sum(b["qty"] * (1 - self.fee) for b in self.cycle_buys)
-        self.logger.info(f"\n📊 Resumo das compras no ciclo #{self.cycle_id}:")
-        for idx, buy in enumerate(self.cycle_buys, 1):
-            fee_usdt = (buy['price'] * buy['qty'] * self.fee).quantize(Decimal('0.01'), rounding=ROUND_DOWN)
-            fee_btc = buy['qty'] * self.fee
-            trade_value_usdt = (buy['price'] * buy['qty']).quantize(Decimal('0.01'), rounding=ROUND_DOWN)
-            self.logger.info(
-                f"   Compra {idx}: {buy['qty']:.6f} BTC (Taxa: {fee_btc:.6f} BTC) a {buy['price']:.2f} USDT (Taxa: {fee_usdt:.2f} USDT, Valor: {trade_value_usdt:.2f} USDT)")
-        self.logger.info(f"   Total: {total_btc_received:.6f} BTC, {total_usdt_with_fees:.2f} USDT (incluindo taxas)")
-        self.logger.info(f"   Taxa total: {total_usdt_with_fees - total_usdt_invested:.2f} USDT")
+    def _sell_after_rebuy_params(self, adjust_target: bool = True) -> Tuple[int, int] | None:
+        """Preço (ticks, truncado) e quantidade (lotes) da venda sobre o preço médio do ciclo; None se não há BTC."""
+        position = self.position
+        units = self.units
+        total_btc_received = position.net_lots
+        verbose = self.logger.isEnabledFor(logging.INFO)
+        if self.logger.isEnabledFor(logging.DEBUG):
+            self.logger.debug(position.summary(self.cycle_id, self.base_coin, self.quote_coin))
+        if verbose:
+            self.logger.info("\n📊 Ciclo #%s: %s compras, total %.6f %s, %.2f %s (incluindo taxas)",
+                             self.cycle_id, len(position), units.qty(total_btc_received), self.base_coin, to_quote(position.notional_with_fees), self.quote_coin)
+            self.logger.info("   Taxa total: %.2f %s", to_quote(position.notional_with_fees - position.notional), self.quote_coin)
         if total_btc_received <= 0:
-            self.error_logger.error(f"Total BTC zerado! Abortando ciclo #{self.cycle_id}...")
+            self.error_logger.error("Total BTC zerado! Abortando ciclo #%s...", self.cycle_id)
+            return None
+        avg_price = position.avg_ticks
+        if adjust_target:
+            self.current_profit_target = max(self.profit_target_min,
+                                             min(self.current_profit_target * self.profit_target_multiplier,
+                                                 self.profit_target_max))
+        sell_price = units.floor_ticks(avg_price * (1 + self.current_profit_target) / (1 - self.fee))
+        if verbose:
+            self.logger.info("📊 Preço médio do ciclo #%s: %.2f USDT/BTC", self.cycle_id, units.price(avg_price))
+            self.logger.info(
+                "🎯 Lucro alvo ajustado para o próximo ciclo: %.2f%% (Min: %.2f%%, Max: %.2f%%)\n",
+                self.current_profit_target * 100, self.profit_target_min * 100, self.profit_target_max * 100)
+            self.logger.info("💰 Taxa de venda estimada: %.2f USDT", to_quote(fee_on(units.notional(sell_price, total_btc_received), self.fee_ppm)))
+            self.logger.info(
+                "💰 Preço de venda calculado: %.2f USDT/BTC (Preço médio: %.2f + Lucro Alvo: %.2f%%)\n",
+                units.price(sell_price), units.price(avg_price), self.current_profit_target * 100)
+        return sell_price, total_btc_received
+
+    async def _place_sell_order_after_rebuy(self, adjust_target: bool = True) -> bool:
+        self.logger.info("📈 Iniciando o processo da ordem de venda após recompra...\n")
+        params = self._sell_after_rebuy_params(adjust_target)
+        if params is None:
+            return False
+        sell_price, sell_qty = params
+        if self.current_sell_id:
+            if await self.rest_client.amend_order(self.current_sell_id, qty=sell_qty, price=sell_price, symbol=self.symbol):
+                if self.ledger:
+                    self.ledger.order("amended", self.cycle_id, self.current_sell_id, "Sell", "Limit", self.units.price(sell_price), self.units.qty(sell_qty))
+                return True
+            # Amend recusado (ex.: venda parcialmente executada): cancela e recria só com o que não foi vendido
+            if not await self._cancel_sell_leg():
+                self.error_logger.warning("⚠️ Venda %s não substituída: já preenchida ou cancelamento recusado pela exchange", self.current_sell_id)
+                return True
+            sell_qty = self.position.net_lots
+        ack = await self._submit_order("Sell", sell_qty, "Limit", sell_price)
+        if not ack:
             return False
-        avg_price = total_usdt_with_fees / total_btc_received
-        self.logger.info(f"📊 Preço médio do ciclo #{self.cycle_id}: {avg_price:.2f} USDT/BTC")
-        self.current_profit_target = max(self.profit_target_min,
-                                         min(self.current_profit_target * self.profit_target_multiplier,
-                                             self.profit_target_max))
-        self.logger.info(
-            f"🎯 Lucro alvo ajustado para o próximo ciclo: {self.current_profit_target * 100:.2f}% (Min: {self.profit_target_min * 100:.2f}%, Max: {self.profit_target_max * 100:.2f}%)\n")
-        sell_price = avg_price * (1 + self.current_profit_target) / (1 - self.fee)
-        self.logger.info(f"💰 Taxa de venda estimada: {sell_price * total_btc_received * self.fee:.2f} USDT")
-        self.logger.info(
-            f"💰 Preço de venda calculado: {sell_price:.2f} USDT/BTC (Preço médio: {avg_price:.2f} + Lucro Alvo: {self.current_profit_target * 100:.2f}%)\n")
-        sell_qty = f"{total_btc_received:.6f}"
-        self.current_sell_id = self.rest_client.place_order("Sell", sell_qty, "Limit", str(int(sell_price)), self.fee)
-        if not self.current_sell_id:
+        self.current_sell_id = ack.order_id
+        if not await ack.accepted():
+            self.error_logger.error("Ordem de venda %s rejeitada pela exchange.\n", ack.order_id)
+            self.current_sell_id = None
             return False
-        self.active_orders[self.current_sell_id] = {"symbol": "BTCUSDT", "side": "Sell"}
-        self.logger.info(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] ⏳ Aguardando 2 segundos para processar a ordem de venda...\n")
-        await asyncio.sleep(2)
         return True
 
     async def _place_rebuy_order_after_rebuy(self) -> bool:
         self.logger.info("🔄 Iniciando o processo da ordem de recompra após recompra...\n")
-        last_buy_price = self.cycle_buys[-1]["price"]
-        rebuy_price = last_buy_price * (1 - self.current_rebuy_drop)
-        qty = self._calculate_qty("Buy", str(self.qty_initial), is_rebuy=True)
+        rebuy_price = self._next_rebuy_price()
+        qty = self._calculate_qty("Buy", self.qty_initial, is_rebuy=True)
         
         # Verificar se há saldo suficiente antes de tentar a ordem
-        btc_balance, usdt_balance, success = self.rest_client.get_balances()
-        if success:
-            self.usdt_balance = usdt_balance
-            if self.usdt_balance < qty:
-                self.logger.info(f"🔄 Saldo insuficiente para recompra ({self.usdt_balance:.2f} < {qty:.2f} USDT). Pausando ciclo e aguardando gatilhos...")
+        if await self.balances.snapshot() is not None:
+            if quote_units(self.usdt_balance) < qty:
+                self.logger.info("🔄 Saldo insuficiente para recompra (%.2f < %.2f USDT). Pausando ciclo e aguardando gatilhos...", self.usdt_balance, to_quote(qty))
                 # Ativar modo de pausa e salvar parâmetros da recompra pendente
                 self.paused_for_insufficient_balance = True
                 self.pending_rebuy_price = rebuy_price
                 self.pending_rebuy_qty = qty
                 return True  # Não abortar, apenas pausar
         
-        self.current_rebuy_id = self.rest_client.place_order("Buy", str(qty), "Limit", str(int(rebuy_price)), self.fee)
-        if not self.current_rebuy_id:
+        ack = await self._submit_order("Buy", qty, "Limit", rebuy_price)
+        if not ack or not await ack.accepted():
             # Em vez de retornar False (que abortaria), aguardar e tentar novamente
+            self.current_rebuy_id = None
             self.logger.info("🔄 Falha na ordem de recompra. Aguardando para tentar novamente...")
             return True
-        
-        self.active_orders[self.current_rebuy_id] = {"symbol": "BTCUSDT", "side": "Buy"}
-        self.logger.info(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] ⏳ Aguardando 2 segundos para processar a ordem de recompra...\n")
-        await asyncio.sleep(2)
+        self.current_rebuy_id = ack.order_id
         return True
 
     async def _execute_initial_buy(self) -> Dict | None:
-        self.logger.info(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] 🛒 Iniciando o processo da ordem de compra inicial...\n")
-        qty = self._calculate_qty("Buy", str(self.qty_initial))
-        buy_id = self.rest_client.place_order("Buy", str(qty), "Market", None, self.fee)
-        if not buy_id:
-            self.error_logger.warning(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] Falha ao criar ordem de compra inicial.\n")
+        self.logger.info("🛒 Iniciando o processo da ordem de compra inicial...\n")
+        qty = self._calculate_qty("Buy", self.qty_initial)
+        ack = await self._submit_order("Buy", qty, "Market", None)
+        if not ack:
+            self.error_logger.warning("Falha ao criar ordem de compra inicial.\n")
             return None
-        self.active_orders[buy_id] = {"symbol": "BTCUSDT", "side": "Buy"}
-        self.logger.info(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] ⏳ Aguardando 8 segundos para processar a compra inicial...\n")
-        await asyncio.sleep(8)  # Aumentado de 5 para 8 segundos
-        buy_details = self.rest_client.get_order_details(buy_id)
+        buy_id = ack.order_id
+        # Resolve assim que o WebSocket reporta o estado terminal da ordem (REST como fallback)
+        buy_details = await ack
         if buy_details["qty"] == Decimal('0'):
-            self.error_logger.warning(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] Detalhes da compra inicial inválidos.\n")
+            self.error_logger.warning("Detalhes da compra inicial inválidos.\n")
             return None
-        self.cycle_buys.append({
-            "price": buy_details["price"],
-            "qty": buy_details["qty"],
-            "order_id": buy_id,
-            "cycle_id": self.cycle_id
-        })
-        self.total_investido = Decimal(str(buy_details["price"])) * Decimal(str(buy_details["qty"]))
-        self.logger.info(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] 📊 Compra inicial do ciclo #{self.cycle_id} a {buy_details['price']:.2f} USDT/BTC, Qty: {buy_details['qty']:.6f} BTC\n")
+        self._record_buy(buy_details, buy_id)
+        self._checkpoint()
+        self.logger.info("📊 Compra inicial do ciclo #%s a %.2f USDT/BTC, Qty: %.6f BTC\n", self.cycle_id, buy_details['price'], buy_details['qty'])
         return buy_details
 
     async def _place_sell_order(self, buy_details: Dict) -> bool:
-        self.logger.info(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] 📈 Iniciando o processo da ordem de venda...\n")
-        sell_price = Decimal(str(buy_details["price"])) * (Decimal('1') + self.profit_target) / (Decimal('1') - self.fee)
-        sell_qty_btc = f"{buy_details['qty']:.6f}"
-        self.current_sell_id = self.rest_client.place_order("Sell", sell_qty_btc, "Limit", str(int(sell_price)), self.fee)
-        if not self.current_sell_id:
+        self.logger.info("📈 Iniciando o processo da ordem de venda...\n")
+        sell_price = self._initial_sell_price(buy_details["price"])
+        sell_qty_btc = self.units.qty_lots(buy_details["qty"])
+        ack = await self._submit_order("Sell", sell_qty_btc, "Limit", sell_price)
+        if not ack:
+            return False
+        self.current_sell_id = ack.order_id
+        if not await ack.accepted():
+            self.error_logger.error("Ordem de venda %s rejeitada pela exchange.\n", ack.order_id)
+            self.current_sell_id = None
             return False
-        self.active_orders[self.current_sell_id] = {"symbol": "BTCUSDT", "side": "Sell"}
-        self.logger.info(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] ⏳ Aguardando 2 segundos para processar a ordem de venda...\n")
-        await asyncio.sleep(2)
         return True
 
     async def _place_rebuy_order(self, buy_details: Dict) -> bool:
-        self.logger.info(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] 🔄 Iniciando o processo da ordem de recompra...\n")
-        rebuy_price = Decimal(str(buy_details["price"])) * (Decimal('1') - self.rebuy_percent)
-        qty = self._calculate_qty("Buy", str(self.qty_initial), is_rebuy=True)
-        self.current_rebuy_id = self.rest_client.place_order("Buy", str(qty), "Limit", str(int(rebuy_price)), self.fee)
-        if not self.current_rebuy_id:
+        self.logger.info("🔄 Iniciando o processo da ordem de recompra...\n")
+        rebuy_price = self._initial_rebuy_price(buy_details["price"])
+        qty = self._calculate_qty("Buy", self.qty_initial, is_rebuy=True)
+        ack = await self._submit_order("Buy", qty, "Limit", rebuy_price)
+        if not ack:
+            return False
+        self.current_rebuy_id = ack.order_id
+        if not await ack.accepted():
+            self.error_logger.error("Ordem de recompra %s rejeitada pela exchange.\n", ack.order_id)
+            self.current_rebuy_id = None
             return False
-        self.active_orders[self.current_rebuy_id] = {"symbol": "BTCUSDT", "side": "Buy"}
-        self.logger.info(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] ⏳ Aguardando 2 segundos para processar a ordem de recompra...\n")
-        await asyncio.sleep(2)
         return True
 
     async def check_stop(self):
@@ -424,10 +763,7 @@ class BybitTrader:
                     self.running = False
                     self.logger.warning("🛑 Parada imediata solicitada!")
                     await asyncio.sleep(2)
-                    if self.current_sell_id:
-                        await self.rest_client.cancel_order(self.current_sell_id)
-                    if self.current_rebuy_id:
-                        await self.rest_client.cancel_order(self.current_rebuy_id)
+                    await self._cancel_open_orders()
                     self.order_event.set()
                     break
                 elif char == 's':
@@ -442,134 +778,138 @@ class BybitTrader:
         if order:
             self.active_orders.pop(order.get('orderId'), None)
             if order.get('orderStatus') == 'Filled':
-                self.logger.info(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] ✅ Ordem {order.get('orderId')} preenchida")
+                self.logger.info("✅ Ordem %s preenchida", order.get('orderId'))
                 
                 # Verificar se é uma recompra preenchida
                 if order.get('orderId') == self.current_rebuy_id:
                     await self.on_rebuy_filled(order)
                 elif order.get('orderId') == self.current_sell_id:
-                    await self.on_sell_filled(self)
+                    await self.on_sell_filled()
         else:
-            self.logger.info(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] 🔄 Atualizando status das ordens")
+            self.logger.info("🔄 Atualizando status das ordens")
 
     async def execute_strategy(self):
-        self.logger.info(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] 🔍 Iniciando estratégia de trading...\n")
+        self.logger.info("🔍 Iniciando estratégia de trading...\n")
         try:
-            self.total_investido = Decimal('0.0')
-            self.total_profit = Decimal('0.0')
-            self.last_cycle_profit = Decimal('0.0')
-            self.profit_to_add_per_order = Decimal('0.0')
+            self.total_profit = 0
+            self.last_cycle_profit = 0
+            self.profit_to_add_per_order = 0
             self.profit_orders_remaining = 0
-            self.rest_client.sync_server_time()
-            await asyncio.sleep(1)
-            if not await self.ws_monitor.connect_websocket():
-                return
-            stop_task = asyncio.create_task(self.check_stop())
+            stop_task = None
+            if self._owns_modules:
+                # Execução isolada; sob o TradingSupervisor a conexão e o teclado são da conta
+                await self.rest_client.sync_server_time()
+                self.rest_client.clock.start()
+                await metrics.start(self.logger, self.metrics_port, self.metrics_dump_interval)
+                await self.rest_client.load_instruments()
+                if not await self.ws_monitor.connect_websocket():
+                    return
+                if self.market_data:
+                    await self.market_data.start()
+                self.balances.start()
+                stop_task = asyncio.create_task(self.check_stop())
+            self._refresh_units()
+            if self.journal:
+                await self._recover_state()
+                self.journal.start()
+            if self.ledger:
+                self.ledger.start()
             
             # Variáveis para controlar o estado do ciclo atual
             current_cycle_buy_details = None
             retry_sell_order = False
             
             while self.running:
-                btc_balance, usdt_balance, success = self.rest_client.get_balances()
-                if not success:
-                    self.error_logger.warning(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] Erro ao obter saldos. Tentando novamente em 5 segundos...\n")
-                    await asyncio.sleep(5)
+                if await self.balances.snapshot() is None:
+                    self.error_logger.warning("Erro ao obter saldos. Tentando novamente...\n")
+                    await self.rest_client.backoff()
                     continue
-                self.btc_balance = btc_balance
-                self.usdt_balance = usdt_balance
-                if self.usdt_balance < self.qty_initial:
-                    self.error_logger.warning(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] Saldo insuficiente pra iniciar ciclo ({self.usdt_balance:.2f} < {self.qty_initial:.2f} USDT)! Aguardando...\n")
+                if quote_units(self.usdt_balance) < self.qty_initial:
+                    self.error_logger.warning("Saldo insuficiente pra iniciar ciclo (%.2f < %.2f USDT)! Aguardando...\n", self.usdt_balance, to_quote(self.qty_initial))
                     await asyncio.sleep(5)  # Reduzido para 5 segundos
                     continue
                 if self.saldo_limite > 0 and self.total_investido >= self.saldo_limite:
-                    self.logger.info(f"⚠️ Limite de saldo atingido ({self.saldo_limite:.2f} USDT). Aguardando venda para continuar...\n")
-                    await self.ws_monitor.monitor_cycle()
+                    self.logger.info("⚠️ Limite de saldo atingido (%.2f USDT). Aguardando venda para continuar...\n", to_quote(self.saldo_limite))
+                    await self.ws_monitor.monitor_cycle(self)
                     continue
                 
                 # Verificar se precisamos tentar novamente a ordem de venda do ciclo atual
                 if retry_sell_order and current_cycle_buy_details:
-                    self.logger.info(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] 🔄 Tentando novamente a ordem de venda para o ciclo #{self.cycle_id}\n")
+                    self.logger.info("🔄 Tentando novamente a ordem de venda para o ciclo #%s\n", self.cycle_id)
                     if await self._place_sell_order(current_cycle_buy_details):
                         retry_sell_order = False
-                        current_cycle_buy_details = None
-                        if not await self._place_rebuy_order(current_cycle_buy_details):
-                            self.error_logger.warning(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] Falha ao criar ordem de recompra inicial. Tentando novamente em 5 segundos...\n")
-                            await asyncio.sleep(5)
+                        # A recompra pode já ter sido criada em paralelo com a venda que falhou
+                        if not self.current_rebuy_id and not await self._place_rebuy_order(current_cycle_buy_details):
+                            self.error_logger.warning("Falha ao criar ordem de recompra inicial. Tentando novamente...\n")
+                            current_cycle_buy_details = None
+                            await self.rest_client.backoff()
                         else:
-                            await self.ws_monitor.monitor_cycle()
+                            current_cycle_buy_details = None
+                            self._checkpoint()
+                            await self.ws_monitor.monitor_cycle(self)
                     else:
-                        self.error_logger.warning(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] Falha ao criar ordem de venda novamente. Tentando em 5 segundos...\n")
-                        await asyncio.sleep(5)
+                        self.error_logger.warning("Falha ao criar ordem de venda novamente. Tentando novamente...\n")
+                        await self.rest_client.backoff()
                     continue
                         
                 if not self.current_sell_id and not self.current_rebuy_id and not self.stop_after_sell:
                     self.cycle_id += 1
                     self.current_rebuy_drop = self.rebuy_percent
                     self.current_profit_target = self.profit_target
-                    self.logger.info(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] 🔄 Iniciando novo ciclo principal #{self.cycle_id}\n")
+                    self.logger.info("🔄 Iniciando novo ciclo principal #%s\n", self.cycle_id)
                     buy_details = await self._execute_initial_buy()
                     if not buy_details or buy_details["qty"] == Decimal('0'):
-                        self.error_logger.warning(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] Compra inicial falhou! Tentando novamente...\n")
-                        await asyncio.sleep(5)
+                        self.error_logger.warning("Compra inicial falhou! Tentando novamente...\n")
+                        await self.rest_client.backoff()
                         continue
                             
                     # Salvar os detalhes da compra para possível retry
                     current_cycle_buy_details = buy_details
                         
-                    if not await self._place_sell_order(buy_details):
-                        self.error_logger.warning(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] Falha ao criar ordem de venda inicial. Tentando novamente em 5 segundos...\n")
+                    # Venda e recompra iniciais enviadas em paralelo
+                    sell_result, rebuy_result = await asyncio.gather(self._place_sell_order(buy_details), self._place_rebuy_order(buy_details), return_exceptions=True)
+                    self._checkpoint()
+                    if not self._leg_succeeded(sell_result, "venda"):
+                        self.error_logger.warning("Falha ao criar ordem de venda inicial. Tentando novamente...\n")
                         retry_sell_order = True  # Marcar para tentar novamente a ordem de venda
-                        await asyncio.sleep(5)
+                        await self.rest_client.backoff()
                         continue
-                    if not await self._place_rebuy_order(buy_details):
-                        self.error_logger.warning(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] Falha ao criar ordem de recompra inicial. Tentando novamente em 5 segundos...\n")
-                        await asyncio.sleep(5)
+                    if not self._leg_succeeded(rebuy_result, "recompra"):
+                        self.error_logger.warning("Falha ao criar ordem de recompra inicial. Tentando novamente...\n")
+                        await self.rest_client.backoff()
                         continue
-                    await self.ws_monitor.monitor_cycle()
+                    await self.ws_monitor.monitor_cycle(self)
                 else:
-                    await self.ws_monitor.monitor_cycle()
-            stop_task.cancel()
+                    await self.ws_monitor.monitor_cycle(self)
+            if stop_task:
+                stop_task.cancel()
         except Exception as e:
-            self.error_logger.error(f"Erro crítico na estratégia: {str(e)}\n")
-            self.logger.info(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] 💵 Lucro total acumulado: {self.total_profit:.2f} USDT\n")
+            self.error_logger.error("Erro crítico na estratégia: %s\n", str(e))
+            self.logger.info("💵 Lucro total acumulado: %.2f USDT\n", to_quote(self.total_profit))
         finally:
-            if self.current_sell_id and await self.rest_client.cancel_order(self.current_sell_id):
-                self.current_sell_id = None
-            if self.current_rebuy_id and await self.rest_client.cancel_order(self.current_rebuy_id):
-                self.current_rebuy_id = None
-            if self.ws_monitor.ws_connected:
-                await self.ws_monitor.ws.close()
-            self.logger.info(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] 🔌 Conexão WebSocket encerrada")
-            self.logger.info(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] 💵 Lucro total acumulado: {self.total_profit:.2f} USDT\n")
+            if self.journal:
+                # Ordens ficam abertas na exchange; o próximo início retoma o ciclo a partir do journal
+                self._checkpoint()
+                await self.journal.close()
+            else:
+                await self._cancel_open_orders()
+            if self.ledger:
+                await self.ledger.close()
+            if self._owns_modules:
+                await self.ws_monitor.close()
+                self.logger.info("🔌 Conexão WebSocket encerrada")
+                await self.balances.stop()
+                if self.market_data:
+                    await self.market_data.close()
+                await self.rest_client.close()
+                await metrics.stop()
+            self.logger.info("💵 Lucro total acumulado: %.2f USDT\n", to_quote(self.total_profit))
 
 if __name__ == "__main__":
+    # Só na execução direta: o backtest e o supervisor importam este módulo sem sequestrar o stdout
+    setup_logging(main_file_name)
+    sys.stdout = TradeLoggerWriter()
     config = get_strategy_config(trade_logger)
     trader = BybitTrader(**config)
     asyncio.run(trader.execute_strategy())
 
-# Criar diretórios de logs se não existirem
-os.makedirs('log_error', exist_ok=True)
-os.makedirs('user/logs_traders', exist_ok=True)
-
-# Configuração do logging com timestamps para nomes de arquivos
-timestamp = datetime.now().strftime('%Y-%m-%d_%H-%M-%S')
-
-# Configuração do logging
-logging.basicConfig(level=logging.INFO, format='%(message)s', encoding='utf-8')
-trade_logger = logging.getLogger('trade_log')
-trade_logger.setLevel(logging.INFO)
-
-# Log de operações no diretório específico
-trade_handler = logging.FileHandler(f'user/logs_traders/{config.get("exchange", "Exchange")}_{config.get("symbol", "Pair")}_{timestamp}_trade.log', encoding='utf-8')
-trade_formatter = logging.Formatter('%(message)s')
-trade_handler.setFormatter(trade_formatter)
-trade_logger.addHandler(trade_handler)
-
-# Log de erros no diretório específico
-error_logger = logging.getLogger('error_log')
-error_handler = logging.FileHandler(f'log_error/{timestamp}_error.log', encoding='utf-8')
-error_handler.setLevel(logging.DEBUG)
-error_formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s\n%(exc_info)s')
-error_handler.setFormatter(error_formatter)
-error_logger.addHandler(error_handler)
\ No newline at end of file
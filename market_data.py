@@ -0,0 +1,324 @@
+# market_data.py
+import asyncio
+import json
+import logging
+import random
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+from websockets import connect
+import websockets.exceptions
+from keep_alive_ws import KeepAliveWS, HEARTBEAT_INTERVAL, HEARTBEAT_MAX_MISSED
+from metrics import metrics
+from websocket_monitor import RECONNECT_BASE_DELAY, RECONNECT_MAX_DELAY, RECONNECT_STABLE_AFTER
+
+# Stream público spot (sem autenticação); a conta demo da Bybit usa os dados de mercado reais
+PUBLIC_WS_CONFIG = {
+    'Bybit Demo': {'ws_url': 'wss://stream.bybit.com/v5/public/spot'},
+    'Bybit Main': {'ws_url': 'wss://stream.bybit.com/v5/public/spot'},
+    'Bybit Sim': {'ws_url': 'ws://127.0.0.1:8321/v5/public/spot'}   # simulator.py
+}
+ORDERBOOK_DEPTH = 50          # níveis do tópico orderbook.{depth}.{símbolo} (spot: 1, 50 ou 200)
+SUBSCRIBE_BATCH = 10          # tópicos por mensagem de subscribe (limite da Bybit no spot)
+MARKET_STALE_MS = 10_000      # livro/ticker sem atualização há mais que isso não é usado pela estratégia
+
+
+class OrderBook:
+    """Livro de ofertas local de um par: snapshot + deltas do stream, com melhor compra/venda em O(1).
+
+    Preços e quantidades ficam em float, chaveados pelo preço: o mesmo texto da exchange dá sempre a
+    mesma chave. Os melhores preços são mantidos a cada nível alterado; só quando o melhor nível some é
+    que o lado é percorrido de novo (no máximo `depth` níveis). Um delta fora de sequência (`u` que não
+    segue o anterior) invalida o livro até o próximo snapshot.
+    """
+
+    __slots__ = ('symbol', 'bids', 'asks', 'best_bid', 'best_ask', 'update_id', 'seq', 'ts', 'valid')
+
+    def __init__(self, symbol: str):
+        self.symbol = symbol
+        self.reset()
+
+    def reset(self):
+        self.bids: Dict[float, float] = {}
+        self.asks: Dict[float, float] = {}
+        self.best_bid: Optional[float] = None
+        self.best_ask: Optional[float] = None
+        self.update_id = 0
+        self.seq = 0
+        self.ts = 0
+        self.valid = False
+
+    @staticmethod
+    def _apply_levels(side: Dict[float, float], levels: List[List[str]]) -> Tuple[Optional[float], Optional[float]]:
+        """Aplica [preço, qty] ao lado (qty 0 remove o nível); devolve o maior e o menor preço inserido que ficou no livro."""
+        touched = []
+        for price, size in levels:
+            price, size = float(price), float(size)
+            if size == 0:
+                side.pop(price, None)
+            else:
+                side[price] = size
+                touched.append(price)
+        # O mesmo delta pode inserir e remover um nível: só contam os que ficaram
+        present = [price for price in touched if price in side]
+        return (max(present), min(present)) if present else (None, None)
+
+    def apply_snapshot(self, data: Dict, ts: int):
+        self.reset()
+        self._apply_levels(self.bids, data.get('b', ()))
+        self._apply_levels(self.asks, data.get('a', ()))
+        self.best_bid = max(self.bids) if self.bids else None
+        self.best_ask = min(self.asks) if self.asks else None
+        self.update_id = int(data.get('u', 0))
+        self.seq = int(data.get('seq', 0))
+        self.ts = ts
+        self.valid = True
+
+    def apply_delta(self, data: Dict, ts: int) -> bool:
+        """Aplica um delta; False se houve quebra de sequência (o livro fica inválido)."""
+        if not self.valid:
+            return False
+        update_id, seq = int(data.get('u', 0)), int(data.get('seq', 0))
+        if seq and seq < self.seq:
+            return True   # mensagem mais antiga que o estado atual
+        if update_id != self.update_id + 1:
+            self.valid = False
+            return False
+        high, _ = self._apply_levels(self.bids, data.get('b', ()))
+        if self.best_bid is None or self.best_bid not in self.bids:
+            self.best_bid = max(self.bids) if self.bids else None   # o melhor nível saiu do livro
+        elif high is not None and high > self.best_bid:
+            self.best_bid = high
+        _, low = self._apply_levels(self.asks, data.get('a', ()))
+        if self.best_ask is None or self.best_ask not in self.asks:
+            self.best_ask = min(self.asks) if self.asks else None
+        elif low is not None and low < self.best_ask:
+            self.best_ask = low
+        self.update_id = update_id
+        self.seq = seq or self.seq
+        self.ts = ts
+        return True
+
+    def top(self, levels: int = 5) -> Tuple[List[Tuple[float, float]], List[Tuple[float, float]]]:
+        """Melhores `levels` níveis de cada lado (ordenação sob demanda, fora do caminho quente)."""
+        bids = sorted(self.bids.items(), reverse=True)[:levels]
+        asks = sorted(self.asks.items())[:levels]
+        return bids, asks
+
+
+class Ticker:
+    __slots__ = ('symbol', 'last_price', 'high_24h', 'low_24h', 'volume_24h', 'ts')
+
+    def __init__(self, symbol: str):
+        self.symbol = symbol
+        self.last_price: Optional[float] = None
+        self.high_24h: Optional[float] = None
+        self.low_24h: Optional[float] = None
+        self.volume_24h: Optional[float] = None
+        self.ts = 0
+
+    def apply(self, data: Dict, ts: int):
+        # O stream spot manda sempre o ticker completo; campos ausentes mantêm o valor anterior
+        for field, key in (('last_price', 'lastPrice'), ('high_24h', 'highPrice24h'), ('low_24h', 'lowPrice24h'), ('volume_24h', 'volume24h')):
+            value = data.get(key)
+            if value not in (None, ''):
+                setattr(self, field, float(value))
+        self.ts = ts
+
+
+class MarketDataStream:
+    """Conexão pública (tickers e livro de ofertas) partilhada por todos os traders do processo.
+
+    Um único loop de recepção mantém o ticker e o livro de cada par em memória; a estratégia lê o melhor
+    preço de compra/venda e o último preço em O(1), sem REST. Reconecta com a mesma espera exponencial
+    com jitter do stream privado; após reconectar, a Bybit envia um snapshot novo de cada livro.
+    """
+
+    def __init__(self, exchange: str, symbols: Iterable[str], logger: logging.Logger, error_logger: logging.Logger,
+                 depth: int = ORDERBOOK_DEPTH, ping_interval: float = HEARTBEAT_INTERVAL, max_missed_pongs: int = HEARTBEAT_MAX_MISSED):
+        self.ws_url = PUBLIC_WS_CONFIG[exchange]['ws_url']
+        self.logger = logger
+        self.error_logger = error_logger
+        self.depth = depth
+        self.ping_interval = ping_interval
+        self.max_missed_pongs = max_missed_pongs
+        self.books: Dict[str, OrderBook] = {}
+        self.tickers: Dict[str, Ticker] = {}
+        self.ws = None
+        self.keep_alive: Optional[KeepAliveWS] = None
+        self.running = False
+        self._receive_task: Optional[asyncio.Task] = None
+        self._reconnect_attempt = 0
+        self._connected_at = 0.0
+        self.add_symbols(symbols)
+
+    def add_symbols(self, symbols: Iterable[str]) -> List[str]:
+        """Inclui pares no stream; são assinados na próxima conexão."""
+        added = [symbol for symbol in symbols if symbol not in self.books]
+        for symbol in added:
+            self.books[symbol] = OrderBook(symbol)
+            self.tickers[symbol] = Ticker(symbol)
+        return added
+
+    def _topics(self, symbols: Iterable[str]) -> List[str]:
+        return [topic for symbol in symbols for topic in (f"tickers.{symbol}", f"orderbook.{self.depth}.{symbol}")]
+
+    # ---------------------------------------------------------------- leitura (O(1), sem I/O)
+
+    def _fresh_book(self, symbol: str) -> Optional[OrderBook]:
+        book = self.books.get(symbol)
+        if book is None or not book.valid or time.time() * 1000 - book.ts > MARKET_STALE_MS:
+            return None
+        return book
+
+    def best_bid(self, symbol: str) -> Optional[float]:
+        book = self._fresh_book(symbol)
+        return book.best_bid if book else None
+
+    def best_ask(self, symbol: str) -> Optional[float]:
+        book = self._fresh_book(symbol)
+        return book.best_ask if book else None
+
+    def mid_price(self, symbol: str) -> Optional[float]:
+        book = self._fresh_book(symbol)
+        if book is None or book.best_bid is None or book.best_ask is None:
+            return None
+        return (book.best_bid + book.best_ask) / 2
+
+    def last_price(self, symbol: str) -> Optional[float]:
+        ticker = self.tickers.get(symbol)
+        if ticker is None or time.time() * 1000 - ticker.ts > MARKET_STALE_MS:
+            return None
+        return ticker.last_price
+
+    # ---------------------------------------------------------------- conexão
+
+    async def _subscribe(self, op: str, topics: List[str]):
+        for i in range(0, len(topics), SUBSCRIBE_BATCH):
+            await self.ws.send(json.dumps({"op": op, "args": topics[i:i + SUBSCRIBE_BATCH]}))
+
+    async def connect(self) -> bool:
+        self.logger.info(f"⚡ Conectando ao stream de mercado: {self.ws_url}")
+        try:
+            self.ws = await connect(self.ws_url)
+            for book in self.books.values():
+                book.reset()
+            await self._subscribe("subscribe", self._topics(self.books))
+            if self.keep_alive:
+                await self.keep_alive.stop()
+            self.keep_alive = KeepAliveWS(self.ws, logger=self.logger, interval=self.ping_interval, max_missed=self.max_missed_pongs,
+                                          on_dead=self._on_stale, topics=(), name='public')
+            await self.keep_alive.start()
+            self.running = True
+            self._connected_at = time.time()
+            if self._receive_task is None or self._receive_task.done():
+                self._receive_task = asyncio.create_task(self._receive_loop())
+            self.logger.info(f"📡 Stream de mercado: {', '.join(self.books)} (livro com {self.depth} níveis)")
+            return True
+        except Exception as e:
+            self.error_logger.error(f"❌ Falha ao conectar o stream de mercado: {e}")
+            self.ws = None
+            return False
+
+    async def start(self) -> bool:
+        """Conecta; se falhar, continua tentando em segundo plano (a estratégia funciona sem dados de mercado)."""
+        if await self.connect():
+            return True
+        self.running = True
+        if self._receive_task is None or self._receive_task.done():
+            self._receive_task = asyncio.create_task(self._receive_loop())
+        return False
+
+    async def close(self):
+        self.running = False
+        if self._receive_task:
+            self._receive_task.cancel()
+            try:
+                await self._receive_task
+            except asyncio.CancelledError:
+                pass
+            self._receive_task = None
+        if self.keep_alive:
+            await self.keep_alive.stop()
+        await self._drop_connection()
+
+    async def _drop_connection(self):
+        if self.ws:
+            try:
+                await self.ws.close()
+            except Exception:
+                pass   # conexão já perdida
+        self.ws = None
+
+    def _on_stale(self):
+        metrics.inc('ws_stale', 'public')
+        transport = getattr(self.ws, 'transport', None)
+        if transport is not None:
+            transport.abort()
+        elif self.ws:
+            asyncio.create_task(self._drop_connection())
+
+    async def _reconnect(self):
+        for book in self.books.values():
+            book.valid = False
+        if time.time() - self._connected_at >= RECONNECT_STABLE_AFTER:
+            self._reconnect_attempt = 0
+        await self._drop_connection()
+        while self.running:
+            delay = random.uniform(0, min(RECONNECT_MAX_DELAY, RECONNECT_BASE_DELAY * 2 ** self._reconnect_attempt))
+            self._reconnect_attempt += 1
+            self.logger.info(f"🔁 Reconectando o stream de mercado em {delay:.1f}s (tentativa {self._reconnect_attempt})...")
+            await asyncio.sleep(delay)
+            if await self.connect():
+                return
+            await self._drop_connection()
+
+    async def _resync_book(self, symbol: str):
+        """Quebra de sequência: reassina o livro para receber um snapshot novo."""
+        metrics.inc('orderbook_resync', symbol)
+        self.error_logger.warning(f"⚠️ Livro de {symbol} fora de sequência; pedindo snapshot novo")
+        topic = [f"orderbook.{self.depth}.{symbol}"]
+        await self._subscribe("unsubscribe", topic)
+        await self._subscribe("subscribe", topic)
+
+    async def _dispatch(self, data: Dict):
+        topic = data.get('topic')
+        if not topic:
+            if data.get('op') == 'subscribe' and not data.get('success', True):
+                self.error_logger.error(f"❌ Assinatura recusada no stream de mercado: {data.get('ret_msg')}")
+            return
+        kind, _, symbol = topic.rpartition('.')
+        ts = int(time.time() * 1000)   # horário local de recepção: a idade do livro não depende do relógio da exchange
+        if kind == 'tickers':
+            ticker = self.tickers.get(symbol)
+            if ticker is not None:
+                ticker.apply(data.get('data', {}), ts)
+        elif kind.startswith('orderbook.'):
+            book = self.books.get(symbol)
+            if book is None:
+                return
+            payload = data.get('data', {})
+            # u=1 num delta também é snapshot (reinício do serviço da exchange)
+            if data.get('type') == 'snapshot' or int(payload.get('u', 0)) == 1:
+                book.apply_snapshot(payload, ts)
+            elif not book.apply_delta(payload, ts) and book.update_id:
+                book.update_id = 0   # uma única ressincronização até o snapshot chegar
+                await self._resync_book(symbol)
+
+    async def _receive_loop(self):
+        while self.running:
+            try:
+                if not self.ws or self.ws.closed:
+                    await self._reconnect()
+                    continue
+                data = json.loads(await self.ws.recv())
+                if self.keep_alive and self.keep_alive.handle(data):
+                    continue
+                await self._dispatch(data)
+            except asyncio.CancelledError:
+                raise
+            except websockets.exceptions.ConnectionClosed:
+                self.error_logger.error("🔌 Stream de mercado fechado. Reconectando...")
+                await self._reconnect()
+            except Exception as e:
+                self.error_logger.error(f"🛑 Erro no stream de mercado: {e}")
+                await asyncio.sleep(1)
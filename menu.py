@@ -1,4 +1,5 @@
 import os
+import asyncio
 import json
 import logging
 from decimal import Decimal, InvalidOperation
@@ -8,6 +9,7 @@ import time
 import re
 from getpass import getpass
 from api_rest import BybitRestClient
+from capital_ladder import Ladder, format_ladder, required_balance as ladder_required_balance
 from typing import Dict
 
 def listar_estrategias_salvas() -> list:
@@ -25,25 +27,30 @@ def listar_estrategias_salvas() -> list:
             arquivos.append(os.path.join(strategy_dir, arquivo))
     return arquivos
 
+def converter_estrategia(config: dict) -> dict:
+    """Converte uma estratégia no formato do arquivo JSON (percentuais, floats) para o formato de execução (Decimal)."""
+    # Convert percentages and other values to Decimal
+    config['profit_target'] = Decimal(str(config['profit_target'])) / Decimal('100')
+    config['profit_target_min'] = Decimal(str(config['profit_target_min'])) / Decimal('100')
+    config['profit_target_max'] = Decimal(str(config['profit_target_max'])) / Decimal('100')
+    config['rebuy_percent'] = Decimal(str(config['rebuy_percent'])) / Decimal('100')
+    config['rebuy_drop_min'] = Decimal(str(config['rebuy_drop_min'])) / Decimal('100')
+    config['rebuy_drop_max'] = Decimal(str(config['rebuy_drop_max'])) / Decimal('100')
+    config['fee'] = Decimal(str(config['fee'])) / Decimal('100')
+    config['qty_initial'] = Decimal(str(config['qty_initial']))
+    config['qty_min'] = Decimal(str(config['qty_min']))
+    config['qty_max'] = Decimal(str(config['qty_max']))
+    config['qty_multiplier'] = Decimal(str(config['qty_multiplier']))
+    config['rebuy_multiplier'] = Decimal(str(config['rebuy_multiplier']))
+    return config
+
 def carregar_estrategia_de_arquivo(arquivo: str) -> dict:
     """Carrega uma estratégia de um arquivo JSON."""
     try:
         with open(arquivo, 'r', encoding='utf-8') as f:
-            config = json.load(f)
-            # Convert percentages and other values to Decimal
-            config['profit_target'] = Decimal(str(config['profit_target'])) / Decimal('100')
-            config['profit_target_min'] = Decimal(str(config['profit_target_min'])) / Decimal('100')
-            config['profit_target_max'] = Decimal(str(config['profit_target_max'])) / Decimal('100')
-            config['rebuy_percent'] = Decimal(str(config['rebuy_percent'])) / Decimal('100')
-            config['rebuy_drop_min'] = Decimal(str(config['rebuy_drop_min'])) / Decimal('100')
-            config['rebuy_drop_max'] = Decimal(str(config['rebuy_drop_max'])) / Decimal('100')
-            config['fee'] = Decimal(str(config['fee'])) / Decimal('100')
-            config['qty_initial'] = Decimal(str(config['qty_initial']))
-            config['qty_min'] = Decimal(str(config['qty_min']))
-            config['qty_max'] = Decimal(str(config['qty_max']))
-            config['qty_multiplier'] = Decimal(str(config['qty_multiplier']))
-            config['rebuy_multiplier'] = Decimal(str(config['rebuy_multiplier']))
-            return config
+            config = converter_estrategia(json.load(f))
+        config['strategy_file'] = arquivo   # identidade da estratégia no journal de estado
+        return config
     except Exception as e:
         print(f"⚠️ Erro ao carregar arquivo: {e}")
         return None
@@ -80,22 +87,19 @@ def load_api_keys() -> tuple[str, str]:
     except Exception:
         return None, None
 
+def validar_chaves_api(config: dict, logger: logging.Logger) -> tuple[bool, str]:
+    """Valida as chaves API num loop de eventos temporário (o menu roda antes do loop principal)."""
+    async def _validar():
+        client = BybitRestClient(config, logger, logger)
+        try:
+            return await client.validate_api_keys()
+        finally:
+            await client.close()
+    return asyncio.run(_validar())
+
 def calculate_required_balance(config: dict) -> Decimal:
-    """Calcula o saldo necessário para a estratégia."""
-    qty_initial = Decimal(str(config['qty_initial']))
-    qty_max = Decimal(str(config['qty_max']))
-    fee = Decimal(str(config['fee']))
-    rebuys_max = config['rebuys_max']
-    qty_multiplier = Decimal(str(config['qty_multiplier']))
-    
-    total_qty = qty_initial
-    current_qty = qty_initial
-    for _ in range(rebuys_max if rebuys_max > 0 else 45):  # Default to 45 if unlimited
-        current_qty *= qty_multiplier
-        current_qty = min(current_qty, qty_max)
-        total_qty += current_qty
-    total_qty_with_fees = total_qty * (1 + fee)
-    return total_qty_with_fees.quantize(Decimal('0.01'))
+    """Calcula o saldo necessário para a escada completa de recompras da estratégia."""
+    return Decimal(str(ladder_required_balance(config))).quantize(Decimal('0.01'))
 
 def get_strategy_config(logger: logging.Logger) -> dict:
     """Configura uma nova estratégia ou carrega uma existente."""
@@ -219,11 +223,11 @@ def get_strategy_config(logger: logging.Logger) -> dict:
                 logger.info(summary)
                 required_balance = calculate_required_balance(config)
                 logger.info(f"💰 Saldo necessário para esta estratégia: {required_balance:.2f} USDT")
+                logger.info(f"📐 Perfil de risco (escada de recompras):\n{format_ladder(Ladder(config))}")
                 
                 # Validate API keys for loaded strategy
                 temp_config = {'exchange': config.get('exchange', 'Bybit Demo'), 'api_key': config.get('api_key', ''), 'api_secret': config.get('api_secret', '')}
-                client = BybitRestClient(temp_config, logger, logger)
-                success, message = client.validate_api_keys()
+                success, message = validar_chaves_api(temp_config, logger)
                 if not success:
                     logger.error(f"\n{message}\n⚠️ Chaves API inválidas na estratégia carregada. Por favor, insira novas chaves.")
                     continue
@@ -262,14 +266,15 @@ def get_strategy_config(logger: logging.Logger) -> dict:
             break
 
     # Exchange selection
-    exchanges = ['Bybit Main', 'Bybit Demo', 'Binance Main', 'Binance Testnet', 'Binance Japan']
+    exchanges = ['Bybit Main', 'Bybit Demo', 'Binance Main', 'Binance Testnet', 'Binance Japan', 'Bybit Sim']
+    supported_exchanges = ['Bybit Main', 'Bybit Demo', 'Bybit Sim']
     while True:
         print("\n🔹 Exchanges disponíveis:")
         for i, exchange in enumerate(exchanges, 1):
             print(f"  {i}. {exchange}")
         exchange = get_input(
             "\n🔹 Exchange: ",
-            "Escolha a exchange desejada para realizar operações ou testes (Bybit Main, Bybit Demo, Binance Main, Binance Testnet, Binance Japan). Utilize Bybit Demo para simulações com saldo fictício.",
+            f"Escolha a exchange desejada para realizar operações ou testes ({', '.join(exchanges)}). Utilize Bybit Demo para simulações com saldo fictício.",
             "⚠️ Selecione uma exchange válida.",
             default=default_values['exchange'],
             options=exchanges,
@@ -281,8 +286,8 @@ def get_strategy_config(logger: logging.Logger) -> dict:
             continue
         if exchange == 'RESTART':
             return get_strategy_config(logger)
-        if exchange not in ['Bybit Main', 'Bybit Demo']:
-            print("\n⚠️ Aviso: Apenas Bybit Main e Bybit Demo são suportados atualmente. Outras exchanges não foram validadas.")
+        if exchange not in supported_exchanges:
+            print(f"\n⚠️ Aviso: Apenas {', '.join(supported_exchanges[:-1])} e {supported_exchanges[-1]} são suportados atualmente. Outras exchanges não foram validadas.")
             continue
         break
 
@@ -305,8 +310,7 @@ def get_strategy_config(logger: logging.Logger) -> dict:
             api_key, api_secret = load_api_keys()
             if api_key and api_secret:
                 temp_config = {'exchange': exchange, 'api_key': api_key, 'api_secret': api_secret}
-                client = BybitRestClient(temp_config, logger, logger)
-                success, message = client.validate_api_keys()
+                success, message = validar_chaves_api(temp_config, logger)
                 print(f"\n{message}")
                 if success:
                     break
@@ -334,8 +338,7 @@ def get_strategy_config(logger: logging.Logger) -> dict:
                 return get_strategy_config(logger)
             
             temp_config = {'exchange': exchange, 'api_key': api_key, 'api_secret': api_secret}
-            client = BybitRestClient(temp_config, logger, logger)
-            success, message = client.validate_api_keys()
+            success, message = validar_chaves_api(temp_config, logger)
             print(f"\n{message}")
             if success:
                 memorize_api = get_input(
@@ -361,6 +364,7 @@ def get_strategy_config(logger: logging.Logger) -> dict:
     trading_pairs = {
         'Bybit Main': ['BTC/USDT', 'ETH/USDT', 'SOL/USDT'],
         'Bybit Demo': ['BTC/USDT', 'ETH/USDT'],
+        'Bybit Sim': ['BTC/USDT'],
         'Binance Mainnet': ['BTC/USDT', 'ETH/BTC', 'BNB/BTC'],
         'Binance Testnet': ['BTC/USDT', 'ETH/USDT'],
         'Binance Japan': ['BTC/JPY', 'ETH/JPY']
@@ -664,6 +668,7 @@ def get_strategy_config(logger: logging.Logger) -> dict:
     # Calculate and display required balance
     required_balance = calculate_required_balance(config)
     logger.info(f"\n💰 Saldo necessário para esta estratégia: {required_balance:.2f} {par.split('/')[1]}")
+    logger.info(f"📐 Perfil de risco (escada de recompras):\n{format_ladder(Ladder(config), par.split('/')[1])}")
 
     # Display summary
     summary = (
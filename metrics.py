@@ -0,0 +1,184 @@
+# metrics.py
+import asyncio
+import logging
+import math
+import time
+from array import array
+from datetime import datetime
+from typing import Dict, Optional, Tuple
+
+METRICS_HOST = '127.0.0.1'
+METRICS_PREFIX = 'coryphaeus'
+METRICS_QUANTILES = (0.5, 0.9, 0.99, 0.999)
+# Histograma log-linear no estilo HDR: valores em microssegundos, 2^(bits-1) sub-faixas por oitava (erro < 1,6%)
+HISTOGRAM_SUB_BUCKET_BITS = 7
+HISTOGRAM_MAX_US = (1 << 36) - 1   # ~19 horas; valores maiores ficam na última faixa
+
+_HALF = 1 << (HISTOGRAM_SUB_BUCKET_BITS - 1)
+
+def _bucket_index(value: int) -> int:
+    if value < 2 * _HALF:
+        return value
+    shift = value.bit_length() - HISTOGRAM_SUB_BUCKET_BITS
+    return shift * _HALF + (value >> shift)
+
+def _bucket_upper(index: int) -> int:
+    """Maior valor que cai na faixa `index` (o valor reportado pelos percentis, como no HDR)."""
+    if index < 2 * _HALF:
+        return index
+    shift = index // _HALF - 1
+    return ((index - shift * _HALF + 1) << shift) - 1
+
+_BUCKETS = _bucket_index(HISTOGRAM_MAX_US) + 1
+
+
+class LatencyHistogram:
+    """Contagens por faixa log-linear; gravar é um índice e um incremento, sem alocação."""
+
+    __slots__ = ('counts', 'count', 'total', 'min', 'max')
+
+    def __init__(self):
+        self.counts = array('q', bytes(8 * _BUCKETS))
+        self.count = 0
+        self.total = 0
+        self.min = 0
+        self.max = 0
+
+    def record(self, value_us: int):
+        value_us = min(max(value_us, 0), HISTOGRAM_MAX_US)
+        self.counts[_bucket_index(value_us)] += 1
+        if not self.count or value_us < self.min:
+            self.min = value_us
+        if value_us > self.max:
+            self.max = value_us
+        self.count += 1
+        self.total += value_us
+
+    def percentile(self, q: float) -> int:
+        if not self.count:
+            return 0
+        target, seen = max(1, math.ceil(q * self.count)), 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= target:
+                return min(_bucket_upper(index), self.max)
+        return self.max
+
+    @property
+    def mean(self) -> float:
+        return self.total / self.count if self.count else 0.0
+
+
+class Metrics:
+    """Registro de latências e contadores por operação, desligado por padrão.
+
+    Desligado, `clock()` devolve 0 e `observe()`/`inc()` retornam na primeira linha: o custo num
+    caminho quente é uma chamada de método. Ligado, as latências vão para histogramas em µs e
+    podem ser lidas em formato texto do Prometheus (GET /metrics) ou despejadas no log de tempos em tempos.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.histograms: Dict[Tuple[str, str], LatencyHistogram] = {}
+        self.counters: Dict[Tuple[str, str], int] = {}
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._dump_task: Optional[asyncio.Task] = None
+
+    def clock(self) -> int:
+        """Marca de início em ns para `observe()`; 0 quando desligado."""
+        return time.perf_counter_ns() if self.enabled else 0
+
+    def observe(self, op: str, start: int, target: str = ''):
+        if not start:
+            return
+        self.record(op, (time.perf_counter_ns() - start) // 1000, target)
+
+    def record(self, op: str, value_us: int, target: str = ''):
+        """Grava uma latência já medida (ex.: atraso de uma mensagem calculado pelo horário do servidor)."""
+        if not self.enabled:
+            return
+        histogram = self.histograms.get((op, target))
+        if histogram is None:
+            histogram = self.histograms[(op, target)] = LatencyHistogram()
+        histogram.record(int(value_us))
+
+    def inc(self, event: str, target: str = '', amount: int = 1):
+        if not self.enabled:
+            return
+        key = (event, target)
+        self.counters[key] = self.counters.get(key, 0) + amount
+
+    # ---------------------------------------------------------------- exportação
+
+    @staticmethod
+    def _labels(name: str, value: str, target: str, extra: str = '') -> str:
+        labels = [f'{name}="{value}"'] + ([f'target="{target}"'] if target else []) + ([extra] if extra else [])
+        return '{' + ','.join(labels) + '}'
+
+    def prometheus_text(self) -> str:
+        lines = [f"# TYPE {METRICS_PREFIX}_latency_seconds summary"]
+        for (op, target), histogram in sorted(self.histograms.items()):
+            for q in METRICS_QUANTILES:
+                labels = self._labels('op', op, target, f'quantile="{q}"')
+                lines.append(f"{METRICS_PREFIX}_latency_seconds{labels} {histogram.percentile(q) / 1e6:.6f}")
+            lines.append(f"{METRICS_PREFIX}_latency_seconds_sum{self._labels('op', op, target)} {histogram.total / 1e6:.6f}")
+            lines.append(f"{METRICS_PREFIX}_latency_seconds_count{self._labels('op', op, target)} {histogram.count}")
+        lines.append(f"# TYPE {METRICS_PREFIX}_events_total counter")
+        for (event, target), value in sorted(self.counters.items()):
+            lines.append(f"{METRICS_PREFIX}_events_total{self._labels('event', event, target)} {value}")
+        return "\n".join(lines) + "\n"
+
+    def summary(self) -> str:
+        lines = [f"📈 Métricas ({datetime.now().strftime('%Y-%m-%d %H:%M:%S')}):"]
+        for (op, target), h in sorted(self.histograms.items()):
+            lines.append(f"   {op}{f' {target}' if target else ''}: n={h.count} média={h.mean / 1000:.2f}ms p50={h.percentile(0.5) / 1000:.2f}ms "
+                         f"p99={h.percentile(0.99) / 1000:.2f}ms máx={h.max / 1000:.2f}ms")
+        for (event, target), value in sorted(self.counters.items()):
+            lines.append(f"   {event}{f' {target}' if target else ''}: {value}")
+        return "\n".join(lines)
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            request = await reader.readline()
+            while (await reader.readline()).strip():
+                pass   # cabeçalhos da requisição não importam
+            path = request.split()[1].decode() if len(request.split()) > 1 else '/'
+            if path.split('?')[0] == '/metrics':
+                body, status = self.prometheus_text().encode(), '200 OK'
+            else:
+                body, status = b'not found\n', '404 Not Found'
+            writer.write(f"HTTP/1.1 {status}\r\nContent-Type: text/plain; version=0.0.4; charset=utf-8\r\n"
+                         f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode() + body)
+            await writer.drain()
+        finally:
+            writer.close()
+
+    async def start(self, logger: logging.Logger, port: int = 0, dump_interval: float = 0, host: str = METRICS_HOST):
+        """Liga o registro com o endpoint /metrics e/ou o despejo periódico no log; sem nenhum dos dois fica desligado."""
+        if not port and not dump_interval:
+            return
+        self.enabled = True
+        if port and self._server is None:
+            self._server = await asyncio.start_server(self._handle, host, port)
+            logger.info(f"📈 Métricas em http://{host}:{port}/metrics")
+        if dump_interval and self._dump_task is None:
+            self._dump_task = asyncio.create_task(self._dump_periodically(logger, dump_interval))
+
+    async def _dump_periodically(self, logger: logging.Logger, interval: float):
+        while True:
+            await asyncio.sleep(interval)
+            logger.info(self.summary())
+
+    async def stop(self):
+        if self._dump_task:
+            self._dump_task.cancel()
+            self._dump_task = None
+        if self._server:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+
+# Registro único do processo, partilhado por todos os módulos e pares
+metrics = Metrics()
+
@@ -0,0 +1,236 @@
+# optimizer.py
+import argparse
+import itertools
+import json
+import math
+import os
+import random
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from decimal import Decimal
+from typing import Dict, Iterator, List, Optional, Tuple
+from backtest import Backtester, BACKTEST_CAPITAL, cached_candles_binary, map_candles
+from capital_ladder import Ladder, required_balance
+from menu import converter_estrategia
+
+# Espaço de busca padrão, nas mesmas unidades dos arquivos user/strategy/*.json (percentuais em %)
+SEARCH_SPACE: Dict[str, Tuple[float, float, float]] = {
+    'profit_target': (0.1, 2.0, 0.05),
+    'rebuy_percent': (0.1, 3.0, 0.05),
+    'qty_multiplier': (1.0, 1.5, 0.01),
+    'rebuy_multiplier': (0.9, 1.2, 0.01),
+    'profit_target_multiplier': (0.9, 1.1, 0.01),
+}
+OPTIMIZER_TRIALS = 200        # configurações avaliadas nas buscas random e bayes
+OPTIMIZER_TOP = 5             # melhores configurações gravadas em user/strategy
+OPTIMIZER_GRID_LIMIT = 100_000
+TPE_STARTUP_TRIALS = 20       # amostras aleatórias antes de o modelo começar a guiar a busca
+TPE_GAMMA = 0.25              # fração das melhores avaliações que forma a densidade "boa"
+TPE_CANDIDATES = 32           # candidatos sorteados por parâmetro a cada sugestão
+TPE_RESAMPLE_TRIES = 100      # sorteios aleatórios para substituir uma sugestão repetida ou acima do capital
+OBJECTIVES = {
+    'profit': lambda r: r['total_profit'],
+    'calmar': lambda r: r['total_profit'] / max(r['max_drawdown'], 1.0),
+    'efficiency': lambda r: r['total_profit'] / max(r['max_invested'], 1.0),
+}
+
+# Estado de cada processo do pool (preenchido por _init_worker)
+_worker_candles = None
+_worker_base: Optional[Dict] = None
+_worker_capital: Optional[Decimal] = None
+
+def _init_worker(data_path: str, base: Dict, capital: Decimal):
+    global _worker_candles, _worker_base, _worker_capital
+    # Todos os processos mapeiam o mesmo arquivo: as páginas ficam uma única vez no cache do sistema
+    _worker_candles = map_candles(data_path)
+    _worker_base = base
+    _worker_capital = capital
+
+def _evaluate(params: Dict[str, float]) -> Dict:
+    config = converter_estrategia({**_worker_base, **params})
+    result = Backtester(config, _worker_capital).run(_worker_candles)
+    ladder = Ladder(config)
+    return {
+        "params": params,
+        "total_profit": float(result["total_profit"]),
+        "max_drawdown": result["max_drawdown"],
+        "max_invested": float(result["max_invested"]),
+        "cycles": result["cycles"],
+        "max_rebuys_in_cycle": result["max_rebuys_in_cycle"],
+        "return_pct": float(result["return_pct"]),
+        "required_capital": ladder.required_balance,
+        "ladder_drop": ladder.max_drop,
+    }
+
+
+def _steps(low: float, high: float, step: float) -> List[float]:
+    count = int(round((high - low) / step))
+    return [round(low + k * step, 10) for k in range(count + 1)]
+
+def _snap(value: float, low: float, high: float, step: float) -> float:
+    return round(min(high, max(low, low + round((value - low) / step) * step)), 10)
+
+def grid_search(space: Dict) -> Iterator[Dict[str, float]]:
+    names = list(space)
+    for values in itertools.product(*(_steps(*space[name]) for name in names)):
+        yield dict(zip(names, values))
+
+def random_sample(space: Dict, rng: random.Random) -> Dict[str, float]:
+    return {name: _snap(rng.uniform(low, high), low, high, step) for name, (low, high, step) in space.items()}
+
+def _parzen(x: float, points: List[float], bandwidth: float) -> float:
+    return sum(math.exp(-0.5 * ((x - p) / bandwidth) ** 2) for p in points) / len(points)
+
+def tpe_suggest(space: Dict, history: List[Tuple[float, Dict]], rng: random.Random) -> Dict[str, float]:
+    """Sugestão no estilo TPE: maximiza l(x)/g(x), densidades de Parzen das avaliações boas e ruins (por parâmetro)."""
+    if len(history) < TPE_STARTUP_TRIALS:
+        return random_sample(space, rng)
+    ranked = sorted(history, key=lambda item: item[0], reverse=True)
+    n_good = max(1, int(len(ranked) * TPE_GAMMA))
+    good, bad = ranked[:n_good], ranked[n_good:]
+    params = {}
+    for name, (low, high, step) in space.items():
+        good_x = [p[name] for _, p in good]
+        bad_x = [p[name] for _, p in bad]
+        bandwidth = max(step, (high - low) / (1 + len(history)) ** 0.2 / 4)
+        best_x, best_ratio = None, -1.0
+        for _ in range(TPE_CANDIDATES):
+            x = _snap(rng.gauss(rng.choice(good_x), bandwidth), low, high, step)
+            ratio = _parzen(x, good_x, bandwidth) / (_parzen(x, bad_x, bandwidth) + 1e-12)
+            if ratio > best_ratio:
+                best_x, best_ratio = x, ratio
+        params[name] = best_x
+    return params
+
+
+def pareto_front(results: List[Dict]) -> List[Dict]:
+    """Configurações não dominadas em lucro (maior), drawdown (menor) e capital investido (menor)."""
+    def dominates(a, b):
+        no_worse = a["total_profit"] >= b["total_profit"] and a["max_drawdown"] <= b["max_drawdown"] and a["max_invested"] <= b["max_invested"]
+        better = a["total_profit"] > b["total_profit"] or a["max_drawdown"] < b["max_drawdown"] or a["max_invested"] < b["max_invested"]
+        return no_worse and better
+    return [r for r in results if not any(dominates(other, r) for other in results)]
+
+
+class Optimizer:
+    """Varre configurações da estratégia com backtests paralelos sobre o mesmo arquivo de candles mapeado em memória."""
+
+    def __init__(self, base: Dict, data_path: str, space: Dict = SEARCH_SPACE, capital: Decimal = BACKTEST_CAPITAL,
+                 objective: str = 'profit', workers: Optional[int] = None, seed: Optional[int] = None,
+                 max_capital: Optional[float] = None):
+        self.base = base
+        self.data_path = data_path
+        self.space = space
+        self.capital = capital
+        self.score = OBJECTIVES[objective]
+        self.workers = workers or os.cpu_count() or 1
+        self.rng = random.Random(seed)
+        self.max_capital = max_capital
+        self.results: List[Dict] = []
+
+    def _pool(self) -> ProcessPoolExecutor:
+        return ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker,
+                                   initargs=(self.data_path, self.base, self.capital))
+
+    def _affordable(self, params: Dict[str, float]) -> bool:
+        """Descarta, antes do backtest, configurações cuja escada completa de recompras excede o capital."""
+        return self.max_capital is None or required_balance(converter_estrategia({**self.base, **params})) <= self.max_capital
+
+    def run(self, method: str, trials: int = OPTIMIZER_TRIALS) -> List[Dict]:
+        with self._pool() as pool:
+            if method == 'grid':
+                total = math.prod(len(_steps(*bounds)) for bounds in self.space.values())
+                if total > OPTIMIZER_GRID_LIMIT:
+                    raise ValueError(f"Grade com {total} combinações (limite {OPTIMIZER_GRID_LIMIT}); aumente os passos ou use random/bayes")
+                samples = filter(self._affordable, grid_search(self.space))
+                self.results = list(pool.map(_evaluate, samples, chunksize=max(1, total // (self.workers * 8))))
+            elif method == 'random':
+                samples = [params for params in (random_sample(self.space, self.rng) for _ in range(trials)) if self._affordable(params)]
+                self.results = list(pool.map(_evaluate, samples, chunksize=max(1, trials // (self.workers * 8))))
+            elif method == 'bayes':
+                # Lotes do tamanho do pool: cada lote usa todas as avaliações anteriores
+                history: List[Tuple[float, Dict]] = []
+                seen = set()
+                while len(self.results) < trials:
+                    batch = []
+                    for _ in range(min(self.workers, trials - len(self.results))):
+                        params = tpe_suggest(self.space, history, self.rng)
+                        # Ponto já avaliado (o modelo tende a repetir o ótimo) ou acima do capital: explora um ponto aleatório
+                        for _ in range(TPE_RESAMPLE_TRIES):
+                            if tuple(params.values()) not in seen and self._affordable(params):
+                                seen.add(tuple(params.values()))
+                                batch.append(params)
+                                break
+                            params = random_sample(self.space, self.rng)
+                    if not batch:
+                        break
+                    for result in pool.map(_evaluate, batch):
+                        self.results.append(result)
+                        history.append((self.score(result), result["params"]))
+            else:
+                raise ValueError(f"Método de busca desconhecido: {method}")
+        self.results.sort(key=self.score, reverse=True)
+        return self.results
+
+    def write_winners(self, top: int = OPTIMIZER_TOP, strategy_dir: str = 'user/strategy') -> List[str]:
+        """Grava as melhores configurações no formato lido por carregar_estrategia_de_arquivo."""
+        os.makedirs(strategy_dir, exist_ok=True)
+        exchange = self.base.get('exchange', 'Bybit Demo').replace(' ', '_')
+        par = self.base.get('par', 'BTC/USDT').replace('/', '_')
+        paths = []
+        for rank, result in enumerate(self.results[:top], 1):
+            path = f"{strategy_dir}/strategy_{datetime.now().strftime('%Y%m%d')}_opt{rank:02d}_{exchange}_{par}.json"
+            with open(path, 'w', encoding='utf-8') as f:
+                json.dump({**self.base, **result["params"]}, f, indent=4, ensure_ascii=False)
+            paths.append(path)
+        return paths
+
+
+def format_ranking(results: List[Dict], top: int) -> str:
+    front = {id(r) for r in pareto_front(results)}
+    lines = [f"\n🏆 {len(results)} configurações avaliadas (* = fronteira de Pareto lucro/drawdown/capital):"]
+    for rank, r in enumerate(results[:top], 1):
+        params = ", ".join(f"{name}={value:g}" for name, value in r["params"].items())
+        lines.append(
+            f"{'*' if id(r) in front else ' '}{rank:>3}. Lucro {r['total_profit']:.2f} | Drawdown {r['max_drawdown']:.2f} | "
+            f"Capital {r['max_invested']:.2f} (escada {r['required_capital']:.2f}, queda {r['ladder_drop'] * 100:.1f}%) | Ciclos {r['cycles']} | Recompras máx. {r['max_rebuys_in_cycle']} | {params}")
+    return "\n".join(lines)
+
+def parse_param(spec: str) -> Tuple[str, Tuple[float, float, float]]:
+    """'rebuy_percent=0.2:2:0.1' -> ('rebuy_percent', (0.2, 2.0, 0.1))."""
+    name, bounds = spec.split('=')
+    low, high, step = (float(v) for v in bounds.split(':'))
+    return name.strip(), (low, high, step)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Busca de parâmetros da estratégia de recompra com backtests paralelos.")
+    parser.add_argument("data", help="CSV de candles/trades (convertido uma vez para .ohlc mapeado em memória)")
+    parser.add_argument("strategy", help="estratégia base (user/strategy/*.json); parâmetros fora da busca vêm dela")
+    parser.add_argument("--method", choices=("grid", "random", "bayes"), default="bayes")
+    parser.add_argument("--trials", type=int, default=OPTIMIZER_TRIALS)
+    parser.add_argument("--objective", choices=tuple(OBJECTIVES), default="profit")
+    parser.add_argument("--param", action="append", default=[], help="substitui/adiciona faixa: nome=min:max:passo")
+    parser.add_argument("--only", action="store_true", help="busca apenas os parâmetros passados em --param")
+    parser.add_argument("--capital", default=str(BACKTEST_CAPITAL))
+    parser.add_argument("--max-capital", type=float, default=None, help="ignora configurações cuja escada completa de recompras exige mais capital")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--top", type=int, default=OPTIMIZER_TOP)
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    with open(args.strategy, 'r', encoding='utf-8') as f:
+        base = json.load(f)
+    overrides = dict(parse_param(spec) for spec in args.param)
+    space = overrides if args.only else {**SEARCH_SPACE, **overrides}
+    data_path = args.data if args.data.endswith('.ohlc') else cached_candles_binary(args.data)
+
+    optimizer = Optimizer(base, data_path, space, Decimal(args.capital), args.objective, args.workers, args.seed, args.max_capital)
+    try:
+        results = optimizer.run(args.method, args.trials)
+    except ValueError as e:
+        sys.exit(f"⚠️ {e}")
+    print(format_ranking(results, args.top))
+    for path in optimizer.write_winners(args.top):
+        print(f"💾 Estratégia salva em {path}")
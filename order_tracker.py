@@ -0,0 +1,172 @@
+# order_tracker.py
+import asyncio
+import logging
+from collections import OrderedDict
+from decimal import Decimal
+from typing import Dict, Iterable, List, Optional, Tuple
+
+TERMINAL_STATUSES = {'Filled', 'Cancelled', 'Rejected', 'PartiallyFilledCanceled', 'Deactivated'}
+ACCEPTED_STATUSES = {'New', 'PartiallyFilled'} | TERMINAL_STATUSES
+ORDER_ACK_TIMEOUT = 2.0      # espera máxima (s) pela confirmação de uma ordem limite no WebSocket
+ORDER_RESULT_TIMEOUT = 5.0   # espera máxima (s) pelo estado terminal de uma ordem a mercado
+ORDER_TRACKER_MAX_ORDERS = 2000  # ordens mantidas em memória (as mais antigas são descartadas)
+
+class OrderTracker:
+    """Agrega os preenchimentos por orderId a partir dos tópicos `execution` e `order` do WebSocket.
+
+    As execuções acumulam valor e quantidade (preço médio = valor / quantidade); quando chega um push
+    de `order` com avgPrice/cumExecQty, esses valores têm prioridade por virem consolidados da exchange.
+    """
+
+    def __init__(self, logger: logging.Logger, error_logger: logging.Logger, max_orders: int = ORDER_TRACKER_MAX_ORDERS):
+        self.logger = logger
+        self.error_logger = error_logger
+        self.max_orders = max_orders
+        self._orders: "OrderedDict[str, Dict]" = OrderedDict()
+        self._waiters: Dict[str, List[Tuple[frozenset, asyncio.Future]]] = {}
+
+    def _entry(self, order_id: str) -> Dict:
+        entry = self._orders.get(order_id)
+        if entry is None:
+            entry = {
+                "exec_notional": Decimal('0'),
+                "exec_qty": Decimal('0'),
+                "exec_fee": Decimal('0'),
+                "exec_ids": set(),
+                "avg_price": None,
+                "cum_qty": None,
+                "status": None,
+            }
+            self._orders[order_id] = entry
+            while len(self._orders) > self.max_orders:
+                old_id, _ = self._orders.popitem(last=False)
+                self._waiters.pop(old_id, None)
+        return entry
+
+    def _set_status(self, order_id: str, entry: Dict, status: Optional[str]):
+        entry["status"] = status
+        waiters = self._waiters.get(order_id)
+        if not waiters or status is None:
+            return
+        pending = []
+        for statuses, future in waiters:
+            if future.done():
+                continue
+            if status in statuses:
+                future.set_result(status)
+            else:
+                pending.append((statuses, future))
+        if pending:
+            self._waiters[order_id] = pending
+        else:
+            del self._waiters[order_id]
+
+    def apply_execution_message(self, data: Dict):
+        try:
+            for execution in data.get('data', []):
+                order_id = execution.get('orderId')
+                exec_id = execution.get('execId')
+                if not order_id or execution.get('execType', 'Trade') != 'Trade':
+                    continue
+                entry = self._entry(order_id)
+                if exec_id in entry["exec_ids"]:
+                    continue
+                entry["exec_ids"].add(exec_id)
+                price = Decimal(execution.get('execPrice') or '0')
+                qty = Decimal(execution.get('execQty') or '0')
+                entry["exec_notional"] += price * qty
+                entry["exec_qty"] += qty
+                entry["exec_fee"] += Decimal(execution.get('execFee') or '0')
+                if execution.get('leavesQty') == '0' and entry["status"] not in TERMINAL_STATUSES:
+                    self._set_status(order_id, entry, 'Filled')
+        except Exception as e:
+            self.error_logger.error(f"⚠️ Erro ao processar execução: {e}")
+
+    def apply_order_message(self, data: Dict):
+        try:
+            for order in data.get('data', []):
+                order_id = order.get('orderId')
+                if not order_id:
+                    continue
+                entry = self._entry(order_id)
+                status = order.get('orderStatus', entry["status"])
+                if entry["status"] in TERMINAL_STATUSES and status not in TERMINAL_STATUSES:
+                    continue   # push atrasado ('New' depois de 'Filled'): o estado terminal não volta atrás
+                avg_price = Decimal(order.get('avgPrice') or '0')
+                cum_qty = Decimal(order.get('cumExecQty') or '0')
+                if avg_price > 0 and cum_qty > 0:
+                    entry["avg_price"] = avg_price
+                    entry["cum_qty"] = cum_qty
+                self._set_status(order_id, entry, status)
+        except Exception as e:
+            self.error_logger.error(f"⚠️ Erro ao processar ordem: {e}")
+
+    def get_details(self, order_id: str) -> Optional[Dict]:
+        """Detalhes no mesmo formato de BybitRestClient.get_order_details, ou None se ainda não há preenchimento."""
+        entry = self._orders.get(order_id)
+        if entry is None:
+            return None
+        if entry["avg_price"] is not None:
+            return {"price": entry["avg_price"], "qty": entry["cum_qty"], "status": entry["status"] or 'Unknown'}
+        if entry["exec_qty"] > 0:
+            return {"price": entry["exec_notional"] / entry["exec_qty"], "qty": entry["exec_qty"], "status": entry["status"] or 'PartiallyFilled'}
+        return None
+
+    def status(self, order_id: str) -> Optional[str]:
+        entry = self._orders.get(order_id)
+        return entry["status"] if entry else None
+
+    async def wait_for_status(self, order_id: str, statuses: Iterable[str], timeout: float) -> Optional[str]:
+        """Aguarda até `timeout` segundos que a ordem atinja um dos `statuses`. Retorna o status ou None."""
+        statuses = frozenset(statuses)
+        current = self.status(order_id)
+        if current in statuses:
+            return current
+        future = asyncio.get_running_loop().create_future()
+        self._waiters.setdefault(order_id, []).append((statuses, future))
+        try:
+            return await asyncio.wait_for(future, timeout=timeout)
+        except asyncio.TimeoutError:
+            return None
+        finally:
+            waiters = self._waiters.get(order_id)
+            if waiters is not None:
+                waiters[:] = [w for w in waiters if w[1] is not future]
+                if not waiters:
+                    del self._waiters[order_id]
+
+    async def wait_for_fill(self, order_id: str, timeout: float) -> Optional[Dict]:
+        """Aguarda até `timeout` segundos pelo preenchimento total da ordem. Retorna None se não chegar."""
+        if await self.wait_for_status(order_id, {'Filled'}, timeout) is None:
+            return None
+        return self.get_details(order_id)
+
+
+class OrderAck:
+    """Ordem enviada à exchange, aguardável até o estado terminal reportado pelo WebSocket.
+
+    `await ack` devolve os detalhes do preenchimento no formato de get_order_details; se o WebSocket
+    não reportar o estado terminal dentro do timeout, consulta o REST.
+    """
+
+    __slots__ = ("order_id", "tracker", "rest_client")
+
+    def __init__(self, order_id: str, tracker: OrderTracker, rest_client):
+        self.order_id = order_id
+        self.tracker = tracker
+        self.rest_client = rest_client
+
+    async def accepted(self, timeout: float = ORDER_ACK_TIMEOUT) -> bool:
+        """False apenas se o WebSocket reportar a ordem como rejeitada; sem notícia assume-se aceita (o REST já confirmou)."""
+        status = await self.tracker.wait_for_status(self.order_id, ACCEPTED_STATUSES, timeout)
+        return status != 'Rejected'
+
+    async def result(self, timeout: float = ORDER_RESULT_TIMEOUT) -> Dict:
+        status = await self.tracker.wait_for_status(self.order_id, TERMINAL_STATUSES, timeout)
+        details = self.tracker.get_details(self.order_id) if status else None
+        if details is not None and details["qty"] > 0:
+            return details
+        return await self.rest_client.get_order_details(self.order_id)
+
+    def __await__(self):
+        return self.result().__await__()
@@ -0,0 +1,225 @@
+# rate_limiter.py
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+from typing import Dict, Mapping, Optional
+from metrics import metrics
+
+# Prioridades (menor sai primeiro quando falta token): proteger a posição vem antes de consultar
+PRIORITY_CANCEL = 0
+PRIORITY_SELL = 1
+PRIORITY_ORDER = 2
+PRIORITY_QUERY = 3
+PRIORITY_POLL = 4
+
+# Grupos de endpoints com o limite inicial (req/s por UID) até os cabeçalhos da exchange informarem o real
+RATE_LIMIT_GROUPS = {
+    'order': 10,
+    'cancel': 10,
+    'query': 25,
+    'account': 10,
+    'market': 20,
+}
+RATE_LIMIT_ENDPOINTS = {
+    "/v5/order/create": ('order', PRIORITY_ORDER),
+    "/v5/order/amend": ('order', PRIORITY_SELL),
+    "/v5/order/create-batch": ('order', PRIORITY_ORDER),
+    "/v5/order/amend-batch": ('order', PRIORITY_SELL),
+    "/v5/order/cancel": ('cancel', PRIORITY_CANCEL),
+    "/v5/order/cancel-batch": ('cancel', PRIORITY_CANCEL),
+    "/v5/order/realtime": ('query', PRIORITY_QUERY),
+    "/v5/order/history": ('query', PRIORITY_QUERY),
+    "/v5/execution/list": ('query', PRIORITY_QUERY),
+    "/v5/account/wallet-balance": ('account', PRIORITY_POLL),
+    "/v5/account/info": ('account', PRIORITY_QUERY),
+}
+RATE_LIMIT_DEFAULT = ('market', PRIORITY_QUERY)   # /v5/market/* e qualquer endpoint não listado
+# Limite por IP da Bybit (600 requisições a cada 5 s), partilhado por todas as contas do processo
+IP_RATE = 100          # req/s sustentado, com folga sobre os 120 do limite
+IP_BURST = 200
+IP_RESERVE = 20        # tokens do IP que só cancelamentos e vendas podem usar (consultas e polls de qualquer grupo param antes)
+IP_BAN_SECONDS = 600   # HTTP 403 "access too frequent": a Bybit bloqueia o IP por 10 minutos
+RATE_LIMIT_CODES = {10006, 10018}   # retCode de excesso de requisições (UID / IP)
+RATE_LIMIT_FALLBACK = 1.0           # segundos de espera quando o excesso vem sem horário de reset
+
+_IP_BUCKETS: Dict[str, 'TokenBucket'] = {}
+_sequence = itertools.count()
+
+
+class TokenBucket:
+    """Balde de tokens com fila de prioridade: quando falta token, quem espera sai por prioridade e depois por ordem de chegada.
+
+    Com `reserve` > 0 os últimos tokens ficam para cancelamentos e vendas: pedidos de prioridade menor
+    esperam enquanto o saldo não passa da reserva. No balde do IP, partilhado por todos os grupos, é
+    isso que faz um cancelamento passar à frente de um poll de saldo de outro grupo.
+
+    Nada dorme em laço: uma única chamada agendada no loop acorda a fila quando o próximo token
+    fica disponível (ou quando termina um bloqueio imposto pela exchange).
+    """
+
+    __slots__ = ('rate', 'capacity', 'reserve', 'tokens', 'updated', 'blocked_until', '_waiters', '_timer')
+
+    def __init__(self, rate: float, capacity: Optional[float] = None, reserve: float = 0.0):
+        self.rate = float(rate)
+        self.capacity = float(capacity or rate)
+        self.reserve = float(reserve)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+        self._waiters = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def _needed(self, priority: int) -> float:
+        """Saldo mínimo para liberar um pedido desta prioridade (1 token, mais a reserva se não é urgente)."""
+        return 1 + self.reserve if priority > PRIORITY_SELL else 1
+
+    def delay(self, now: Optional[float] = None, priority: int = PRIORITY_CANCEL) -> float:
+        """Segundos até haver um token livre para a prioridade."""
+        now = time.monotonic() if now is None else now
+        self._refill(now)
+        return max(self.blocked_until - now, (self._needed(priority) - self.tokens) / self.rate, 0.0)
+
+    async def acquire(self, priority: int = PRIORITY_QUERY) -> float:
+        """Consome um token, esperando a vez se preciso; devolve os segundos esperados."""
+        now = time.monotonic()
+        self._refill(now)
+        if not self._waiters and now >= self.blocked_until and self.tokens >= self._needed(priority):
+            self.tokens -= 1
+            return 0.0
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(_sequence), future))
+        if self._timer is not None and self._waiters[0][2] is future:
+            self._reschedule()   # passou à frente da fila: o próximo despertar pode ser mais cedo
+        else:
+            self._schedule(now)
+        await future
+        return time.monotonic() - now
+
+    def _schedule(self, now: float):
+        while self._waiters and self._waiters[0][2].done():
+            heapq.heappop(self._waiters)   # espera cancelada
+        if self._waiters and self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(self.delay(now, self._waiters[0][0]), self._wake)
+
+    def _reschedule(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+            self._schedule(time.monotonic())
+
+    def _wake(self):
+        self._timer = None
+        now = time.monotonic()
+        self._refill(now)
+        while self._waiters and now >= self.blocked_until and self.tokens >= self._needed(self._waiters[0][0]):
+            _, _, future = heapq.heappop(self._waiters)
+            if not future.done():
+                self.tokens -= 1
+                future.set_result(None)
+        self._schedule(now)
+
+    def observe(self, limit: int, remaining: int, reset_in: Optional[float]):
+        """Ajusta o balde ao que a exchange informou: capacidade por janela, tokens restantes e reset."""
+        now = time.monotonic()
+        self._refill(now)
+        if limit > 0:
+            self.rate = self.capacity = float(limit)
+        self.tokens = min(self.tokens, float(remaining))
+        if remaining <= 0 and reset_in is not None:
+            self.block(reset_in)
+
+    def block(self, seconds: float):
+        self.blocked_until = max(self.blocked_until, time.monotonic() + max(0.0, seconds))
+        self.tokens = min(self.tokens, 0.0)
+        self._reschedule()
+
+
+def shared_ip_bucket(host: str) -> TokenBucket:
+    """Balde do limite por IP, um por host da API, partilhado por todos os clientes do processo."""
+    bucket = _IP_BUCKETS.get(host)
+    if bucket is None:
+        bucket = _IP_BUCKETS[host] = TokenBucket(IP_RATE, IP_BURST, IP_RESERVE)
+    return bucket
+
+
+class RateGovernor:
+    """Controle de taxa do cliente REST de uma conta: um balde por grupo de endpoints e o balde do IP.
+
+    A prioridade ordena a fila dentro de cada grupo e, no balde do IP (comum a todos os grupos e contas),
+    a reserva de tokens mantém cancelamentos e vendas passando quando consultas e polls esgotam o limite.
+
+    Os limites iniciais são conservadores; cada resposta com `X-Bapi-Limit`, `X-Bapi-Limit-Status` e
+    `X-Bapi-Limit-Reset-Timestamp` corrige o balde do grupo. Excesso de requisições (retCode 10006/10018
+    ou HTTP 403) bloqueia o grupo ou o IP exatamente até o reset informado, sem espera fixa.
+    """
+
+    def __init__(self, host: str, logger: logging.Logger, error_logger: logging.Logger, groups: Mapping[str, float] = RATE_LIMIT_GROUPS):
+        self.logger = logger
+        self.error_logger = error_logger
+        self.buckets = {group: TokenBucket(rate) for group, rate in groups.items()}
+        self.ip = shared_ip_bucket(host)
+        self.throttled = False
+
+    @staticmethod
+    def route(endpoint: str):
+        return RATE_LIMIT_ENDPOINTS.get(endpoint, RATE_LIMIT_DEFAULT)
+
+    async def acquire(self, endpoint: str, priority: Optional[int] = None):
+        group, default_priority = self.route(endpoint)
+        priority = default_priority if priority is None else priority
+        waited = await self.buckets[group].acquire(priority) + await self.ip.acquire(priority)
+        if waited:
+            metrics.record('rate_limit_wait', waited * 1e6, group)
+        if waited > 1:
+            self.logger.info(f"⏳ {endpoint} aguardou {waited:.1f}s pelo limite de requisições")
+
+    @staticmethod
+    def _reset_in(headers: Mapping[str, str], server_offset_ms: float) -> Optional[float]:
+        reset = headers.get('X-Bapi-Limit-Reset-Timestamp')
+        if not reset:
+            return None
+        # Horário do servidor -> segundos a partir de agora no relógio local
+        return (int(reset) - server_offset_ms) / 1000 - time.time()
+
+    def observe(self, endpoint: str, headers: Mapping[str, str], server_offset_ms: float = 0.0):
+        remaining = headers.get('X-Bapi-Limit-Status')
+        if remaining is None:
+            return
+        group, _ = self.route(endpoint)
+        self.buckets[group].observe(int(headers.get('X-Bapi-Limit') or 0), int(remaining),
+                                    self._reset_in(headers, server_offset_ms))
+        if int(remaining) > 0:
+            self.throttled = False
+
+    def on_rate_limited(self, endpoint: str, headers: Mapping[str, str], server_offset_ms: float = 0.0):
+        """Resposta de excesso de requisições: o grupo só volta a enviar depois do reset."""
+        group, _ = self.route(endpoint)
+        reset_in = self._reset_in(headers, server_offset_ms)
+        seconds = RATE_LIMIT_FALLBACK if reset_in is None else max(0.0, reset_in)
+        self.buckets[group].block(seconds)
+        self.throttled = True
+        metrics.inc('rate_limited', group)
+        self.error_logger.warning(f"🚦 Limite de requisições atingido em {endpoint}; grupo '{group}' pausado por {seconds:.2f}s")
+
+    def on_ip_ban(self):
+        self.ip.block(IP_BAN_SECONDS)
+        self.throttled = True
+        self.error_logger.error(f"🚫 HTTP 403 da exchange (limite por IP); requisições suspensas por {IP_BAN_SECONDS // 60} minutos")
+
+    def retry_after(self) -> Optional[float]:
+        """Espera até o fim do bloqueio mais longo, se a última falha foi por limite de requisições; senão None."""
+        if not self.throttled:
+            return None
+        now = time.monotonic()
+        remaining = max(bucket.blocked_until - now for bucket in (*self.buckets.values(), self.ip))
+        if remaining <= 0:
+            # Bloqueios já passaram: quem chama volta à espera normal em vez de tentar de novo sem pausa
+            self.throttled = False
+            return None
+        return remaining
@@ -0,0 +1,102 @@
+# server_clock.py
+import asyncio
+import logging
+import statistics
+import time
+from collections import deque
+from typing import Awaitable, Callable, Optional, Tuple
+
+# Parâmetros da sincronização de relógio com o servidor
+CLOCK_SAMPLES = 5                # amostras usadas na mediana
+CLOCK_SAMPLE_INTERVAL = 120      # segundos entre amostras em segundo plano
+CLOCK_DRIFT_TOLERANCE_MS = 250   # desvio máximo aceito antes de ressincronizar
+TIMESTAMP_ERROR_CODES = {10002}  # retCode da Bybit para timestamp/recv_window inválido
+
+class ServerClock:
+    """Mantém o offset entre o relógio local e o da exchange sem consultar o servidor a cada requisição.
+
+    Cada amostra é corrigida pelo RTT (assume-se que o servidor respondeu no meio da ida e volta) e o
+    offset usado é a mediana das últimas amostras. Uma tarefa em segundo plano colhe uma amostra
+    periodicamente e só refaz a sincronização completa quando o desvio sai da tolerância.
+    """
+
+    def __init__(self, fetch_server_time_ms: Callable[[], Awaitable[int]], logger: logging.Logger, error_logger: logging.Logger,
+                 samples: int = CLOCK_SAMPLES, interval: float = CLOCK_SAMPLE_INTERVAL, drift_tolerance_ms: float = CLOCK_DRIFT_TOLERANCE_MS):
+        self._fetch_server_time_ms = fetch_server_time_ms
+        self.logger = logger
+        self.error_logger = error_logger
+        self.interval = interval
+        self.drift_tolerance_ms = drift_tolerance_ms
+        self._samples = deque(maxlen=samples)
+        self._lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self.offset_ms = 0.0
+        self.last_rtt_ms = 0.0
+        self.synced = False
+
+    def now_ms(self) -> int:
+        """Horário estimado do servidor em milissegundos (sem rede)."""
+        return int(time.time() * 1000 + self.offset_ms)
+
+    async def _sample(self) -> Tuple[float, float]:
+        sent = time.time() * 1000
+        server_ms = await self._fetch_server_time_ms()
+        received = time.time() * 1000
+        rtt = received - sent
+        return server_ms - (sent + rtt / 2), rtt
+
+    def _apply(self):
+        self.offset_ms = statistics.median(self._samples)
+        self.synced = True
+
+    async def resync(self, reason: str = "inicial") -> bool:
+        """Descarta as amostras antigas e refaz a mediana com uma rajada de amostras novas."""
+        async with self._lock:
+            fresh = []
+            for _ in range(self._samples.maxlen):
+                try:
+                    offset, rtt = await self._sample()
+                except Exception as e:
+                    self.error_logger.error(f"Falha ao sincronizar horário: {e}")
+                    continue
+                fresh.append(offset)
+                self.last_rtt_ms = rtt
+            if not fresh:
+                return False
+            self._samples.clear()
+            self._samples.extend(fresh)
+            self._apply()
+            self.logger.info(f"⏰ Offset de tempo ajustado ({reason}): {self.offset_ms / 1000:.3f} segundos\n")
+            return True
+
+    async def on_timestamp_error(self):
+        """Chamado quando a exchange rejeita uma requisição por timestamp fora da janela."""
+        await self.resync("erro de timestamp")
+
+    async def _background_loop(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                offset, rtt = await self._sample()
+            except Exception as e:
+                self.error_logger.error(f"Falha na amostra de horário: {e}")
+                continue
+            if abs(offset - self.offset_ms) > self.drift_tolerance_ms:
+                await self.resync(f"desvio de {offset - self.offset_ms:.0f} ms")
+            else:
+                self._samples.append(offset)
+                self.last_rtt_ms = rtt
+                self._apply()
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._background_loop())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
@@ -0,0 +1,644 @@
+# simulator.py
+import argparse
+import asyncio
+import hashlib
+import hmac
+import itertools
+import json
+import logging
+import math
+import random
+import time
+from collections import deque
+from decimal import Decimal, InvalidOperation
+from typing import Callable, Deque, Dict, Iterator, List, Optional, Set, Tuple
+from aiohttp import web, WSMsgType
+from backtest import load_candles, map_candles
+
+SIMULATOR_HOST = '127.0.0.1'
+SIMULATOR_PORT = 8321
+SIMULATOR_API_KEY = 'sim-key'
+SIMULATOR_API_SECRET = 'sim-secret'
+SIMULATOR_FEE = Decimal('0.001')
+SIMULATOR_BALANCES = {'USDT': Decimal('100000'), 'BTC': Decimal('0')}
+SIMULATOR_RECV_WINDOW_MS = 5000
+SIMULATOR_EXECUTION_HISTORY = 10000   # execuções guardadas para /v5/execution/list
+SIMULATOR_BOOK_SIZE = "1.5"           # quantidade em cada nível do livro sintético do stream público
+# Filtros devolvidos em /v5/market/instruments-info (os do BTCUSDT spot)
+SIMULATOR_INSTRUMENT_FILTERS = {
+    'priceFilter': {'tickSize': '0.01'},
+    'lotSizeFilter': {'basePrecision': '0.000001', 'quotePrecision': '0.00000001', 'minOrderQty': '0.000048',
+                      'maxOrderQty': '71.73956243', 'minOrderAmt': '1', 'maxOrderAmt': '2000000'},
+}
+
+# retCodes da V5 reproduzidos pelo simulador
+RET_OK = 0
+RET_PARAMS_ERROR = 10001
+RET_TIMESTAMP_ERROR = 10002
+RET_INVALID_KEY = 10003
+RET_SIGN_ERROR = 10004
+RET_ORDER_NOT_FOUND = 110001
+RET_INSUFFICIENT_BALANCE = 170131
+OPEN_STATUSES = {'New', 'PartiallyFilled'}
+
+def _fmt(value: Decimal) -> str:
+    return f"{value.normalize():f}" if value else "0"
+
+def _now_ms() -> int:
+    return int(time.time() * 1000)
+
+
+class MatchingEngine:
+    """Livro de ordens spot simplificado: ordens limite casam quando o preço as cruza, sempre no preço limite.
+
+    As taxas seguem a Bybit spot: na compra são descontadas da moeda base recebida, na venda da moeda
+    de cotação. Cada mudança chama `emit(topic, data)` com o payload dos tópicos privados da V5.
+    """
+
+    def __init__(self, balances: Dict[str, Decimal], fee: Decimal = SIMULATOR_FEE,
+                 emit: Callable[[str, List[Dict]], None] = lambda topic, data: None):
+        self.balances = {coin: Decimal(str(amount)) for coin, amount in balances.items()}
+        self.locked: Dict[str, Decimal] = {coin: Decimal('0') for coin in self.balances}
+        self.fee = fee
+        self.emit = emit
+        self.prices: Dict[str, Decimal] = {}
+        self.orders: Dict[str, Dict] = {}
+        self.open_orders: Dict[str, Dict[str, Dict]] = {}
+        self._order_seq = itertools.count(1)
+        self._exec_seq = itertools.count(1)
+        self.executions: Deque[Dict] = deque(maxlen=SIMULATOR_EXECUTION_HISTORY)
+
+    @staticmethod
+    def split_symbol(symbol: str) -> Tuple[str, str]:
+        for quote in ('USDT', 'USDC', 'BTC', 'ETH'):
+            if symbol.endswith(quote) and symbol != quote:
+                return symbol[:-len(quote)], quote
+        raise ValueError(f"símbolo não suportado: {symbol}")
+
+    def free(self, coin: str) -> Decimal:
+        return self.balances.get(coin, Decimal('0')) - self.locked.get(coin, Decimal('0'))
+
+    def _lock(self, coin: str, amount: Decimal):
+        self.locked[coin] = self.locked.get(coin, Decimal('0')) + amount
+
+    def _reserve_for(self, order: Dict) -> Tuple[str, Decimal]:
+        base, quote = self.split_symbol(order['symbol'])
+        leaves = Decimal(order['leavesQty'])
+        if order['side'] == 'Buy':
+            return quote, leaves * Decimal(order['price'])
+        return base, leaves
+
+    def wallet_payload(self) -> List[Dict]:
+        return [{
+            "accountType": "UNIFIED",
+            "coin": [{"coin": coin, "walletBalance": _fmt(amount), "locked": _fmt(self.locked.get(coin, Decimal('0')))}
+                     for coin, amount in self.balances.items()],
+        }]
+
+    def place(self, params: Dict) -> Tuple[Optional[Dict], int, str]:
+        try:
+            symbol = params['symbol']
+            side = params['side'].capitalize()
+            order_type = params['orderType']
+            qty = Decimal(str(params['qty']))
+            price = Decimal(str(params['price'])) if order_type == 'Limit' else None
+            base, quote = self.split_symbol(symbol)
+        except (KeyError, ValueError, InvalidOperation) as e:
+            return None, RET_PARAMS_ERROR, f"params error: {e}"
+        if qty <= 0 or (order_type == 'Limit' and (price is None or price <= 0)) or side not in ('Buy', 'Sell'):
+            return None, RET_PARAMS_ERROR, "params error: qty/price"
+        market = self.prices.get(symbol)
+        if order_type == 'Market' and market is None:
+            return None, RET_PARAMS_ERROR, "no price for symbol"
+
+        # Compra a mercado: qty em moeda de cotação (marketUnit padrão da Bybit spot)
+        if order_type == 'Market' and side == 'Buy':
+            needed, coin = qty, quote
+        elif side == 'Buy':
+            needed, coin = qty * price, quote
+        else:
+            needed, coin = qty, base
+        if self.free(coin) < needed:
+            return None, RET_INSUFFICIENT_BALANCE, "Insufficient balance."
+
+        now = _now_ms()
+        order = {
+            "orderId": f"sim{next(self._order_seq):012d}",
+            "orderLinkId": params.get('orderLinkId', ''),
+            "symbol": symbol,
+            "side": side,
+            "orderType": order_type,
+            "price": _fmt(price) if price is not None else "0",
+            "qty": _fmt(qty),
+            "leavesQty": _fmt(qty),
+            "cumExecQty": "0",
+            "cumExecValue": "0",
+            "cumExecFee": "0",
+            "avgPrice": "0",
+            "orderStatus": "New",
+            "timeInForce": params.get('timeInForce', 'GTC'),
+            "createdTime": str(now),
+            "updatedTime": str(now),
+        }
+        self.orders[order["orderId"]] = order
+        if order_type == 'Market':
+            fill_qty = qty / market if side == 'Buy' else qty
+            self._fill(order, market, fill_qty)
+        else:
+            self.open_orders.setdefault(symbol, {})[order["orderId"]] = order
+            self._lock(*self._reserve_for(order))
+            self.emit('order', [dict(order)])
+            # Ordem limite que já cruza o preço atual é executada como taker
+            if market is not None and ((side == 'Buy' and market <= price) or (side == 'Sell' and market >= price)):
+                self._fill(order, market if side == 'Buy' else max(market, price), qty)
+        return order, RET_OK, "OK"
+
+    def cancel(self, symbol: str, order_id: str) -> Tuple[Optional[Dict], int, str]:
+        order = self.open_orders.get(symbol, {}).pop(order_id, None)
+        if order is None:
+            return None, RET_ORDER_NOT_FOUND, "Order does not exist."
+        coin, amount = self._reserve_for(order)
+        self._lock(coin, -amount)
+        order["orderStatus"] = "Cancelled" if order["cumExecQty"] == "0" else "PartiallyFilledCanceled"
+        order["updatedTime"] = str(_now_ms())
+        self.emit('order', [dict(order)])
+        return order, RET_OK, "OK"
+
+    def amend(self, symbol: str, order_id: str, qty: Optional[str], price: Optional[str]) -> Tuple[Optional[Dict], int, str]:
+        order = self.open_orders.get(symbol, {}).get(order_id)
+        if order is None:
+            return None, RET_ORDER_NOT_FOUND, "Order does not exist."
+        coin, reserved = self._reserve_for(order)
+        new_qty = Decimal(str(qty)) if qty else Decimal(order['qty'])
+        new_price = Decimal(str(price)) if price else Decimal(order['price'])
+        leaves = new_qty - Decimal(order['cumExecQty'])
+        if leaves <= 0 or new_price <= 0:
+            return None, RET_PARAMS_ERROR, "params error: qty/price"
+        needed = leaves * new_price if order['side'] == 'Buy' else leaves
+        if self.free(coin) + reserved < needed:
+            return None, RET_INSUFFICIENT_BALANCE, "Insufficient balance."
+        self._lock(coin, -reserved)
+        order.update(qty=_fmt(new_qty), price=_fmt(new_price), leavesQty=_fmt(leaves), updatedTime=str(_now_ms()))
+        self._lock(*self._reserve_for(order))
+        self.emit('order', [dict(order)])
+        market = self.prices.get(symbol)
+        if market is not None and ((order['side'] == 'Buy' and market <= new_price) or (order['side'] == 'Sell' and market >= new_price)):
+            self._fill(order, market, leaves)
+        return order, RET_OK, "OK"
+
+    def _fill(self, order: Dict, price: Decimal, qty: Decimal):
+        base, quote = self.split_symbol(order['symbol'])
+        is_limit = order['orderType'] == 'Limit'
+        if is_limit:
+            coin, reserved = self._reserve_for(order)
+            self._lock(coin, -reserved)
+        value = qty * price
+        if order['side'] == 'Buy':
+            fee = qty * self.fee
+            self.balances[quote] = self.balances.get(quote, Decimal('0')) - value
+            self.balances[base] = self.balances.get(base, Decimal('0')) + qty - fee
+        else:
+            fee = value * self.fee
+            self.balances[base] = self.balances.get(base, Decimal('0')) - qty
+            self.balances[quote] = self.balances.get(quote, Decimal('0')) + value - fee
+        cum_qty = Decimal(order['cumExecQty']) + qty
+        cum_value = Decimal(order['cumExecValue']) + value
+        order.update(
+            cumExecQty=_fmt(cum_qty),
+            cumExecValue=_fmt(cum_value),
+            cumExecFee=_fmt(Decimal(order['cumExecFee']) + fee),
+            avgPrice=_fmt(cum_value / cum_qty),
+            leavesQty="0",
+            orderStatus="Filled",
+            updatedTime=str(_now_ms()),
+        )
+        if is_limit:
+            self.open_orders.get(order['symbol'], {}).pop(order['orderId'], None)
+        execution = {
+            "symbol": order['symbol'],
+            "orderId": order['orderId'],
+            "side": order['side'],
+            "orderType": order['orderType'],
+            "execId": f"simexec{next(self._exec_seq):012d}",
+            "execPrice": _fmt(price),
+            "execQty": _fmt(qty),
+            "execValue": _fmt(value),
+            "execFee": _fmt(fee),
+            "execType": "Trade",
+            "leavesQty": "0",
+            "execTime": order['updatedTime'],
+        }
+        self.executions.append(execution)
+        self.emit('execution', [execution])
+        self.emit('order', [dict(order)])
+        self.emit('wallet', self.wallet_payload())
+
+    def on_price(self, symbol: str, price: Decimal):
+        """Novo preço negociado: executa as ordens limite cruzadas, no preço limite."""
+        self.prices[symbol] = price
+        book = self.open_orders.get(symbol)
+        if not book:
+            return
+        crossed = [order for order in book.values()
+                   if (order['side'] == 'Buy' and price <= Decimal(order['price'])) or (order['side'] == 'Sell' and price >= Decimal(order['price']))]
+        for order in crossed:
+            self._fill(order, Decimal(order['price']), Decimal(order['leavesQty']))
+
+
+def candle_ticks(candles) -> Iterator[float]:
+    """Caminho de preços dentro de cada candle, com a mesma convenção do Backtester (baixa O→H→L→C, alta O→L→H→C)."""
+    o, h, l, c = candles.open, candles.high, candles.low, candles.close
+    for i in range(len(candles)):
+        yield o[i]
+        if c[i] < o[i]:
+            yield h[i]
+            yield l[i]
+        else:
+            yield l[i]
+            yield h[i]
+        yield c[i]
+
+def synthetic_ticks(start: float = 30000.0, volatility: float = 0.0005, seed: Optional[int] = None) -> Iterator[float]:
+    """Passeio aleatório geométrico reprodutível (mesma semente, mesmos preços)."""
+    rng = random.Random(seed)
+    price = start
+    while True:
+        yield price
+        price *= math.exp(rng.gauss(0, volatility))
+
+
+class ExchangeSimulator:
+    """Servidor local que fala o subconjunto da V5 usado pelo bot (REST + WebSocket privado).
+
+    Latência configurável em cada resposta REST e em cada push, para testes de carga e benchmarks
+    reprodutíveis sem rede. Aponte o bot para ele com a exchange 'Bybit Sim'.
+    """
+
+    def __init__(self, ticks: Iterator[float], symbol: str = 'BTCUSDT', host: str = SIMULATOR_HOST, port: int = SIMULATOR_PORT,
+                 api_key: str = SIMULATOR_API_KEY, api_secret: str = SIMULATOR_API_SECRET, balances: Dict = None,
+                 fee: Decimal = SIMULATOR_FEE, tick_interval: float = 0.05, latency_ms: float = 0.0, jitter_ms: float = 0.0,
+                 logger: Optional[logging.Logger] = None):
+        self.ticks = ticks
+        self.symbol = symbol
+        self.host = host
+        self.port = port
+        self.api_key = api_key
+        self.api_secret = api_secret
+        self.tick_interval = tick_interval
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.logger = logger or logging.getLogger('simulator')
+        self.engine = MatchingEngine(balances or SIMULATOR_BALANCES, fee, self._emit)
+        self._clients: Dict[web.WebSocketResponse, Set[str]] = {}
+        self._public_clients: Dict[web.WebSocketResponse, Set[str]] = {}
+        self._outboxes: Dict[web.WebSocketResponse, asyncio.Queue] = {}   # pushes privados pendentes, em ordem, por cliente
+        self._book: Tuple[Optional[Decimal], Optional[Decimal]] = (None, None)   # melhor compra/venda publicadas
+        self._book_update_id = 0
+        self._runner: Optional[web.AppRunner] = None
+        self._feed_task: Optional[asyncio.Task] = None
+        self.app = web.Application()
+        self.app.add_routes([
+            web.get('/v5/market/time', self._market_time),
+            web.get('/v5/market/instruments-info', self._instruments_info),
+            web.get('/v5/account/info', self._account_info),
+            web.get('/v5/account/wallet-balance', self._wallet_balance),
+            web.post('/v5/order/create', self._order_create),
+            web.post('/v5/order/cancel', self._order_cancel),
+            web.post('/v5/order/amend', self._order_amend),
+            web.post('/v5/order/create-batch', self._batch_create),
+            web.post('/v5/order/amend-batch', self._batch_amend),
+            web.post('/v5/order/cancel-batch', self._batch_cancel),
+            web.get('/v5/order/realtime', self._order_realtime),
+            web.get('/v5/order/history', self._order_history),
+            web.get('/v5/execution/list', self._execution_list),
+            web.get('/v5/private', self._private_ws),
+            web.get('/v5/public/spot', self._public_ws),
+        ])
+
+    # ---------------------------------------------------------------- infraestrutura
+
+    def _latency(self) -> float:
+        """Latência sorteada (s) de uma resposta ou push."""
+        if self.latency_ms or self.jitter_ms:
+            return max(0.0, self.latency_ms + random.uniform(-self.jitter_ms, self.jitter_ms)) / 1000
+        return 0.0
+
+    async def _delay(self):
+        latency = self._latency()
+        if latency:
+            await asyncio.sleep(latency)
+
+    @staticmethod
+    def _response(result: Dict, ret_code: int = RET_OK, ret_msg: str = "OK", ext: Dict = None) -> web.Response:
+        return web.json_response({"retCode": ret_code, "retMsg": ret_msg, "result": result, "retExtInfo": ext or {}, "time": _now_ms()})
+
+    async def _authenticate(self, request: web.Request, payload: str) -> Optional[web.Response]:
+        """Valida chave, janela de tempo e assinatura exatamente como a V5 (timestamp + chave + recv_window + payload)."""
+        await self._delay()
+        key = request.headers.get('X-BAPI-API-KEY')
+        timestamp = request.headers.get('X-BAPI-TIMESTAMP', '0')
+        recv_window = request.headers.get('X-BAPI-RECV-WINDOW', str(SIMULATOR_RECV_WINDOW_MS))
+        if key != self.api_key:
+            return self._response({}, RET_INVALID_KEY, "API key is invalid.")
+        if abs(_now_ms() - int(timestamp)) > int(recv_window):
+            return self._response({}, RET_TIMESTAMP_ERROR, "invalid request, please check your server timestamp or recv_window param")
+        expected = hmac.new(self.api_secret.encode('utf-8'), f"{timestamp}{key}{recv_window}{payload}".encode('utf-8'), hashlib.sha256).hexdigest()
+        if not hmac.compare_digest(expected, request.headers.get('X-BAPI-SIGN', '')):
+            return self._response({}, RET_SIGN_ERROR, "error sign!")
+        return None
+
+    async def _signed_body(self, request: web.Request) -> Tuple[Optional[Dict], Optional[web.Response]]:
+        body = await request.text()
+        error = await self._authenticate(request, body)
+        if error:
+            return None, error
+        try:
+            return json.loads(body), None
+        except json.JSONDecodeError:
+            return None, self._response({}, RET_PARAMS_ERROR, "invalid json")
+
+    def _emit(self, topic: str, data: List[Dict]):
+        if self._clients:
+            message = json.dumps({"id": f"sim-{topic}-{_now_ms()}", "topic": topic, "creationTime": _now_ms(), "data": data})
+            due = asyncio.get_running_loop().time() + self._latency()
+            for ws, topics in list(self._clients.items()):
+                if topic in topics and ws in self._outboxes:
+                    self._outboxes[ws].put_nowait((due, message))
+
+    async def _sender(self, ws: web.WebSocketResponse, outbox: asyncio.Queue):
+        """Único emissor de pushes do cliente: o jitter atrasa cada mensagem, mas nunca a põe à frente da anterior
+        (como na exchange, 'New' não chega depois de 'Filled' da mesma ordem)."""
+        loop = asyncio.get_running_loop()
+        while not ws.closed:
+            due, message = await outbox.get()
+            wait = due - loop.time()
+            if wait > 0:
+                await asyncio.sleep(wait)
+            if not ws.closed:
+                await ws.send_str(message)
+
+    # ---------------------------------------------------------------- REST
+
+    async def _market_time(self, request: web.Request) -> web.Response:
+        await self._delay()
+        now_ns = time.time_ns()
+        return self._response({"timeSecond": str(now_ns // 1_000_000_000), "timeNano": str(now_ns)})
+
+    async def _instruments_info(self, request: web.Request) -> web.Response:
+        await self._delay()
+        base_coin, quote_coin = MatchingEngine.split_symbol(self.symbol)
+        return self._response({"category": "spot", "list": [
+            {"symbol": self.symbol, "baseCoin": base_coin, "quoteCoin": quote_coin, "status": "Trading", **SIMULATOR_INSTRUMENT_FILTERS}]})
+
+    async def _account_info(self, request: web.Request) -> web.Response:
+        error = await self._authenticate(request, request.query_string)
+        return error or self._response({"unifiedMarginStatus": 4, "marginMode": "REGULAR_MARGIN"})
+
+    async def _wallet_balance(self, request: web.Request) -> web.Response:
+        error = await self._authenticate(request, request.query_string)
+        if error:
+            return error
+        wanted = set(request.query.get('coin', '').split(',')) - {''}
+        accounts = self.engine.wallet_payload()
+        if wanted:
+            accounts[0]["coin"] = [entry for entry in accounts[0]["coin"] if entry["coin"] in wanted]
+        return self._response({"list": accounts})
+
+    async def _order_create(self, request: web.Request) -> web.Response:
+        params, error = await self._signed_body(request)
+        if error:
+            return error
+        order, code, msg = self.engine.place(params)
+        return self._response({"orderId": order["orderId"], "orderLinkId": order["orderLinkId"]} if order else {}, code, msg)
+
+    async def _order_cancel(self, request: web.Request) -> web.Response:
+        params, error = await self._signed_body(request)
+        if error:
+            return error
+        order, code, msg = self.engine.cancel(params.get('symbol', ''), params.get('orderId', ''))
+        return self._response({"orderId": order["orderId"], "orderLinkId": order["orderLinkId"]} if order else {}, code, msg)
+
+    async def _order_amend(self, request: web.Request) -> web.Response:
+        params, error = await self._signed_body(request)
+        if error:
+            return error
+        order, code, msg = self.engine.amend(params.get('symbol', ''), params.get('orderId', ''), params.get('qty'), params.get('price'))
+        return self._response({"orderId": order["orderId"], "orderLinkId": order["orderLinkId"]} if order else {}, code, msg)
+
+    async def _batch(self, request: web.Request, handle: Callable[[Dict], Tuple[Optional[Dict], int, str]]) -> web.Response:
+        params, error = await self._signed_body(request)
+        if error:
+            return error
+        results, infos = [], []
+        for item in params.get('request', []):
+            order, code, msg = handle(item)
+            results.append({"symbol": item.get('symbol', ''), "orderId": order["orderId"] if order else "", "orderLinkId": order["orderLinkId"] if order else ""})
+            infos.append({"code": code, "msg": msg})
+        return self._response({"list": results}, ext={"list": infos})
+
+    async def _batch_create(self, request: web.Request) -> web.Response:
+        return await self._batch(request, self.engine.place)
+
+    async def _batch_amend(self, request: web.Request) -> web.Response:
+        return await self._batch(request, lambda item: self.engine.amend(item.get('symbol', ''), item.get('orderId', ''), item.get('qty'), item.get('price')))
+
+    async def _batch_cancel(self, request: web.Request) -> web.Response:
+        return await self._batch(request, lambda item: self.engine.cancel(item.get('symbol', ''), item.get('orderId', '')))
+
+    async def _order_query(self, request: web.Request, open_only: bool) -> web.Response:
+        error = await self._authenticate(request, request.query_string)
+        if error:
+            return error
+        order_id = request.query.get('orderId')
+        symbol = request.query.get('symbol')
+        if order_id:
+            candidates = [self.engine.orders[order_id]] if order_id in self.engine.orders else []
+        else:
+            candidates = list(self.engine.orders.values())
+        start_ms = int(request.query.get('startTime', 0))
+        orders = [dict(order) for order in candidates
+                  if (order['orderStatus'] in OPEN_STATUSES) == open_only and (not symbol or order['symbol'] == symbol)
+                  and int(order['updatedTime']) >= start_ms]
+        limit = int(request.query.get('limit', 50))
+        return self._response({"category": "spot", "list": orders[-limit:][::-1], "nextPageCursor": ""})
+
+    async def _order_realtime(self, request: web.Request) -> web.Response:
+        return await self._order_query(request, open_only=True)
+
+    async def _order_history(self, request: web.Request) -> web.Response:
+        return await self._order_query(request, open_only=False)
+
+    async def _execution_list(self, request: web.Request) -> web.Response:
+        error = await self._authenticate(request, request.query_string)
+        if error:
+            return error
+        symbol = request.query.get('symbol')
+        start_ms = int(request.query.get('startTime', 0))
+        executions = [dict(execution) for execution in self.engine.executions
+                      if (not symbol or execution['symbol'] == symbol) and int(execution['execTime']) >= start_ms]
+        limit = int(request.query.get('limit', 50))
+        return self._response({"category": "spot", "list": executions[-limit:][::-1], "nextPageCursor": ""})
+
+    # ---------------------------------------------------------------- WebSocket privado
+
+    async def _private_ws(self, request: web.Request) -> web.WebSocketResponse:
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+        authenticated = False
+        topics: Set[str] = set()
+        outbox = self._outboxes[ws] = asyncio.Queue()
+        sender = asyncio.create_task(self._sender(ws, outbox))
+        try:
+            async for msg in ws:
+                if msg.type != WSMsgType.TEXT:
+                    continue
+                data = json.loads(msg.data)
+                op = data.get('op')
+                req_id = data.get('req_id', '')
+                await self._delay()
+                if op == 'auth':
+                    key, expires, signature = (data.get('args') or [None, 0, ''])[:3]
+                    expected = hmac.new(self.api_secret.encode('utf-8'), f"GET/realtime{expires}".encode('utf-8'), hashlib.sha256).hexdigest()
+                    authenticated = key == self.api_key and int(expires) > _now_ms() and hmac.compare_digest(expected, signature or '')
+                    await ws.send_json({"success": authenticated, "ret_msg": "" if authenticated else "Params Error", "op": "auth", "req_id": req_id, "conn_id": str(id(ws))})
+                elif op in ('subscribe', 'unsubscribe'):
+                    if not authenticated:
+                        await ws.send_json({"success": False, "ret_msg": "Request not authorized", "op": op, "req_id": req_id})
+                        continue
+                    for topic in data.get('args', []):
+                        (topics.add if op == 'subscribe' else topics.discard)(topic)
+                    self._clients[ws] = topics
+                    await ws.send_json({"success": True, "ret_msg": "", "op": op, "req_id": req_id, "conn_id": str(id(ws))})
+                elif op == 'ping':
+                    await ws.send_json({"op": "pong", "args": [str(_now_ms())], "req_id": req_id, "conn_id": str(id(ws))})
+        finally:
+            self._clients.pop(ws, None)
+            self._outboxes.pop(ws, None)
+            sender.cancel()
+        return ws
+
+    # ---------------------------------------------------------------- WebSocket público
+
+    def _book_levels(self, price: Decimal) -> Tuple[Decimal, Decimal]:
+        """Livro sintético de um nível por lado: um tick abaixo e um acima do último preço."""
+        tick = Decimal(SIMULATOR_INSTRUMENT_FILTERS['priceFilter']['tickSize'])
+        price = price.quantize(tick)
+        return price - tick, price + tick
+
+    def _book_message(self, topic: str, kind: str, bids: List[List[str]], asks: List[List[str]]) -> str:
+        now = _now_ms()
+        return json.dumps({"topic": topic, "ts": now, "type": kind, "cts": now,
+                           "data": {"s": self.symbol, "b": bids, "a": asks, "u": self._book_update_id, "seq": self._book_update_id}})
+
+    def _publish_market(self, price: Decimal):
+        """Ticker e delta do livro a cada preço novo (sem atraso injetado: a ordem das mensagens é preservada)."""
+        if not self._public_clients:
+            self._book = self._book_levels(price)
+            return
+        old_bid, old_ask = self._book
+        bid, ask = self._book_levels(price)
+        self._book = (bid, ask)
+        self._book_update_id += 1
+        bids = [[_fmt(bid), SIMULATOR_BOOK_SIZE]] + ([[_fmt(old_bid), "0"]] if old_bid is not None and old_bid != bid else [])
+        asks = [[_fmt(ask), SIMULATOR_BOOK_SIZE]] + ([[_fmt(old_ask), "0"]] if old_ask is not None and old_ask != ask else [])
+        ticker = json.dumps({"topic": f"tickers.{self.symbol}", "ts": _now_ms(), "type": "snapshot",
+                             "data": {"symbol": self.symbol, "lastPrice": _fmt(price)}})
+        for ws, topics in list(self._public_clients.items()):
+            for topic in topics:
+                if topic == f"tickers.{self.symbol}":
+                    asyncio.create_task(ws.send_str(ticker))
+                elif topic.startswith('orderbook.') and topic.endswith(f".{self.symbol}"):
+                    asyncio.create_task(ws.send_str(self._book_message(topic, "delta", bids, asks)))
+
+    async def _public_ws(self, request: web.Request) -> web.WebSocketResponse:
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+        topics: Set[str] = set()
+        self._public_clients[ws] = topics
+        try:
+            async for msg in ws:
+                if msg.type != WSMsgType.TEXT:
+                    continue
+                data = json.loads(msg.data)
+                op = data.get('op')
+                req_id = data.get('req_id', '')
+                if op in ('subscribe', 'unsubscribe'):
+                    for topic in data.get('args', []):
+                        (topics.add if op == 'subscribe' else topics.discard)(topic)
+                    await ws.send_json({"success": True, "ret_msg": op, "op": op, "req_id": req_id, "conn_id": str(id(ws))})
+                    bid, ask = self._book
+                    for topic in data.get('args', []) if op == 'subscribe' else ():
+                        if topic.startswith('orderbook.') and topic.endswith(f".{self.symbol}") and bid is not None:
+                            await ws.send_str(self._book_message(topic, "snapshot", [[_fmt(bid), SIMULATOR_BOOK_SIZE]], [[_fmt(ask), SIMULATOR_BOOK_SIZE]]))
+                elif op == 'ping':
+                    await ws.send_json({"success": True, "ret_msg": "pong", "conn_id": str(id(ws)), "req_id": req_id, "op": "ping"})
+        finally:
+            self._public_clients.pop(ws, None)
+        return ws
+
+    # ---------------------------------------------------------------- ciclo de vida
+
+    async def _feed(self):
+        for price in self.ticks:
+            self.engine.on_price(self.symbol, Decimal(repr(price)))
+            self._publish_market(Decimal(repr(price)))
+            await asyncio.sleep(self.tick_interval)
+        self.logger.info("📉 Fim dos preços do simulador.")
+
+    async def start(self):
+        # O primeiro preço fica disponível antes de aceitar ordens a mercado
+        first_price = Decimal(repr(next(self.ticks)))
+        self.engine.on_price(self.symbol, first_price)
+        self._book = self._book_levels(first_price)
+        self._runner = web.AppRunner(self.app)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, self.host, self.port).start()
+        self._feed_task = asyncio.create_task(self._feed())
+        self.logger.info(f"🧪 Simulador V5 em http://{self.host}:{self.port} (WS ws://{self.host}:{self.port}/v5/private e /v5/public/spot)")
+
+    async def stop(self):
+        if self._feed_task:
+            self._feed_task.cancel()
+            try:
+                await self._feed_task
+            except asyncio.CancelledError:
+                pass
+            self._feed_task = None
+        for ws in list(self._clients) + list(self._public_clients):
+            await ws.close()
+        if self._runner:
+            await self._runner.cleanup()
+            self._runner = None
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Simulador local da API V5 da Bybit (REST + WebSockets privado e público).")
+    parser.add_argument("--data", help="CSV de candles/trades ou arquivo .ohlc; sem ele os preços são sintéticos")
+    parser.add_argument("--seed", type=int, default=None, help="semente dos preços sintéticos")
+    parser.add_argument("--symbol", default="BTCUSDT")
+    parser.add_argument("--port", type=int, default=SIMULATOR_PORT)
+    parser.add_argument("--tick-interval", type=float, default=0.05, help="segundos entre preços")
+    parser.add_argument("--latency", type=float, default=0.0, help="latência injetada (ms) em respostas e pushes")
+    parser.add_argument("--jitter", type=float, default=0.0, help="variação máxima da latência (ms)")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+    if args.data:
+        candles = map_candles(args.data) if args.data.endswith('.ohlc') else load_candles(args.data)
+        ticks = candle_ticks(candles)
+    else:
+        ticks = synthetic_ticks(seed=args.seed)
+
+    async def _serve():
+        simulator = ExchangeSimulator(iter(ticks), args.symbol, port=args.port, tick_interval=args.tick_interval,
+                                      latency_ms=args.latency, jitter_ms=args.jitter)
+        await simulator.start()
+        try:
+            await asyncio.Event().wait()
+        finally:
+            await simulator.stop()
+
+    try:
+        asyncio.run(_serve())
+    except KeyboardInterrupt:
+        pass
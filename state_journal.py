@@ -0,0 +1,159 @@
+# state_journal.py
+import asyncio
+import copy
+import hashlib
+import json
+import logging
+import os
+from decimal import Decimal
+from typing import Dict, List, Optional
+
+JOURNAL_DIR = 'user/state'
+JOURNAL_FLUSH_INTERVAL = 0.2    # segundos entre gravações (um único fsync por lote de registros)
+JOURNAL_SNAPSHOT_EVERY = 500    # registros no journal antes de compactar num snapshot
+# Campos da configuração que não mudam a estratégia (credenciais e opções de execução): fora do hash da chave
+JOURNAL_KEY_IGNORED = {'api_key', 'api_secret', 'load_api', 'memorize_api', 'save_strategy', 'strategy_file',
+                       'journal', 'ledger', 'market_data', 'metrics_port', 'metrics_dump_interval'}
+
+def journal_key(config: Dict, symbol: str) -> str:
+    """Identidade da estratégia no journal: exchange, símbolo e o nome do arquivo da estratégia.
+
+    Estratégias criadas pelo menu sem arquivo usam um hash curto da configuração, para que duas
+    estratégias no mesmo par não partilhem (e corrompam) o mesmo journal.
+    """
+    prefix = f"{config['exchange'].replace(' ', '_')}_{symbol}"
+    if config.get('strategy_file'):
+        return f"{prefix}_{os.path.splitext(os.path.basename(config['strategy_file']))[0]}"
+    params = {key: value for key, value in config.items() if key not in JOURNAL_KEY_IGNORED}
+    digest = hashlib.sha1(json.dumps(params, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+    return f"{prefix}_{digest[:10]}"
+
+def _encode(value):
+    if isinstance(value, Decimal):
+        return {"$d": str(value)}
+    raise TypeError(f"Tipo não serializável no journal: {type(value).__name__}")
+
+def _decode(obj: Dict):
+    if len(obj) == 1 and "$d" in obj:
+        return Decimal(obj["$d"])
+    return obj
+
+def _fsync_write(path: str, lines: List[str]):
+    with open(path, 'a', encoding='utf-8') as f:
+        f.writelines(lines)
+        f.flush()
+        os.fsync(f.fileno())
+
+def _atomic_write(path: str, content: str):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(content)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+class StateJournal:
+    """Journal append-only do estado de um trader, com snapshots compactados.
+
+    Cada `record()` grava apenas os campos que mudaram desde o último registro (uma linha JSON com
+    número de sequência). As linhas são acumuladas em memória e gravadas em lote com um único fsync
+    a cada `flush_interval`, fora do loop de eventos. A cada `snapshot_every` registros o estado
+    completo vai para `<nome>.snapshot.json` (gravação atômica) e o journal é truncado.
+    """
+
+    def __init__(self, name: str, logger: logging.Logger, error_logger: logging.Logger, directory: str = JOURNAL_DIR,
+                 flush_interval: float = JOURNAL_FLUSH_INTERVAL, snapshot_every: int = JOURNAL_SNAPSHOT_EVERY):
+        os.makedirs(directory, exist_ok=True)
+        self.journal_path = os.path.join(directory, f"{name}.journal")
+        self.snapshot_path = os.path.join(directory, f"{name}.snapshot.json")
+        self.logger = logger
+        self.error_logger = error_logger
+        self.flush_interval = flush_interval
+        self.snapshot_every = snapshot_every
+        self._state: Dict = {}
+        self._seq = 0
+        self._since_snapshot = 0
+        self._buffer: List[str] = []
+        self._lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+
+    def load(self) -> Optional[Dict]:
+        """Reconstrói o último estado (snapshot + registros posteriores). None se não há nada gravado."""
+        state, seq = {}, 0
+        if os.path.exists(self.snapshot_path):
+            with open(self.snapshot_path, 'r', encoding='utf-8') as f:
+                snapshot = json.load(f, object_hook=_decode)
+            state, seq = snapshot["state"], snapshot["seq"]
+        replayed = 0
+        if os.path.exists(self.journal_path):
+            with open(self.journal_path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line, object_hook=_decode)
+                    except json.JSONDecodeError:
+                        # Última linha truncada por uma queda no meio da gravação
+                        self.error_logger.warning(f"⚠️ Registro incompleto ignorado em {self.journal_path}")
+                        break
+                    if entry["seq"] <= seq:
+                        continue
+                    state.update(entry["delta"])
+                    seq = entry["seq"]
+                    replayed += 1
+        self._state, self._seq, self._since_snapshot = state, seq, replayed
+        if not state:
+            return None
+        self.logger.info(f"📼 Estado recuperado do journal (seq {seq}, {replayed} registros após o snapshot)")
+        return copy.deepcopy(state)
+
+    def record(self, state: Dict):
+        """Registra o estado atual; só os campos alterados entram no journal. Não faz I/O."""
+        delta = {key: value for key, value in state.items() if key not in self._state or self._state[key] != value}
+        if not delta:
+            return
+        self._seq += 1
+        # Cópia: o trader altera listas (ex.: cycle_buys) no lugar, o que esconderia a próxima diferença
+        self._state.update(copy.deepcopy(delta))
+        self._buffer.append(json.dumps({"seq": self._seq, "delta": delta}, default=_encode) + "\n")
+
+    async def flush(self):
+        """Grava o lote pendente com um único fsync e compacta se o journal cresceu demais."""
+        async with self._lock:
+            if self._buffer:
+                lines, self._buffer = self._buffer, []
+                await asyncio.to_thread(_fsync_write, self.journal_path, lines)
+                self._since_snapshot += len(lines)
+            if self._since_snapshot >= self.snapshot_every:
+                await self._compact()
+
+    async def _compact(self):
+        content = json.dumps({"seq": self._seq, "state": self._state}, default=_encode, indent=1)
+        await asyncio.to_thread(_atomic_write, self.snapshot_path, content)
+        # Depois do snapshot durável os registros antigos são redundantes (load ignora seq <= snapshot)
+        await asyncio.to_thread(_atomic_write, self.journal_path, "")
+        self._since_snapshot = 0
+
+    async def _flush_loop(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception as e:
+                self.error_logger.error(f"⚠️ Erro ao gravar journal de estado: {e}")
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._flush_loop())
+
+    async def close(self):
+        """Para a gravação periódica e deixa um snapshot completo em disco."""
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+        async with self._lock:
+            await self._compact()
@@ -0,0 +1,168 @@
+# supervisor.py
+import asyncio
+import sys
+from typing import Dict, List, Tuple
+from main import BybitTrader, TradeLoggerWriter, symbol_from_pair, trade_logger, error_logger
+from log_pipeline import setup_logging
+from api_rest import BybitRestClient
+from balance_service import BalanceService
+from order_tracker import OrderTracker
+from fixed_point import to_quote
+from metrics import metrics
+from market_data import MarketDataStream
+from websocket_monitor import BybitWebSocketMonitor
+from menu import carregar_estrategia_de_arquivo, load_api_keys
+from state_journal import journal_key
+
+class AccountSession:
+    """Recursos partilhados por todos os traders de uma mesma conta (exchange + chave API)."""
+
+    def __init__(self, config: Dict, coins: List[str], logger, error_logger):
+        self.rest_client = BybitRestClient(config, logger, error_logger)
+        self.order_tracker = OrderTracker(logger, error_logger)
+        self.balances = BalanceService(self.rest_client, coins, logger, error_logger)
+        self.ws_monitor = BybitWebSocketMonitor(config, logger, error_logger, self.balances, self.order_tracker, self.rest_client.clock, self.rest_client)
+
+    async def start(self) -> bool:
+        await self.rest_client.sync_server_time()
+        self.rest_client.clock.start()
+        await self.rest_client.load_instruments()
+        if not await self.ws_monitor.connect_websocket():
+            return False
+        self.balances.start()
+        return True
+
+    async def stop(self):
+        await self.ws_monitor.close()
+        await self.balances.stop()
+        await self.rest_client.close()
+
+
+class TradingSupervisor:
+    """Executa várias estratégias de recompra (pares ou configurações diferentes) num único loop de eventos.
+
+    Os traders da mesma conta partilham o pool HTTP, o relógio do servidor, o livro de saldos e uma única
+    conexão privada de WebSocket, que encaminha os eventos para cada trader por símbolo e orderId.
+    """
+
+    def __init__(self, configs: List[Dict], logger=trade_logger, error_logger=error_logger):
+        self.logger = logger
+        self.error_logger = error_logger
+        self.sessions: Dict[Tuple[str, str], AccountSession] = {}
+        self.market_streams: Dict[str, MarketDataStream] = {}   # um stream público por exchange, para todos os pares
+        self.traders: List[BybitTrader] = []
+
+        # Dois traders com a mesma chave de journal gravariam o mesmo arquivo de estado e retomariam o ciclo um do outro
+        journal_keys: Dict[str, Dict] = {}
+        for config in configs:
+            if config.get('journal', 's').lower() != 's':
+                continue
+            key = journal_key(config, symbol_from_pair(config.get('par', 'BTC/USDT'))[0])
+            if key in journal_keys:
+                raise SystemExit(f"Estratégias duplicadas: {config.get('strategy_file', key)} e "
+                                 f"{journal_keys[key].get('strategy_file', key)} usam o mesmo journal ({key}).")
+            journal_keys[key] = config
+
+        # Moedas de todos os pares de cada conta, para um único snapshot de saldos por conta
+        coins: Dict[Tuple[str, str], List[str]] = {}
+        for config in configs:
+            _, base_coin, quote_coin = symbol_from_pair(config.get('par', 'BTC/USDT'))
+            account_coins = coins.setdefault((config['exchange'], config['api_key']), [])
+            account_coins.extend(coin for coin in (base_coin, quote_coin) if coin not in account_coins)
+
+        for config in configs:
+            account = (config['exchange'], config['api_key'])
+            session = self.sessions.get(account)
+            if session is None:
+                session = self.sessions[account] = AccountSession(config, coins[account], logger, error_logger)
+            market_data = None
+            if config.get('market_data', 's').lower() == 's':
+                market_data = self.market_streams.get(config['exchange'])
+                if market_data is None:
+                    market_data = self.market_streams[config['exchange']] = MarketDataStream(config['exchange'], [], logger, error_logger)
+                market_data.add_symbols([symbol_from_pair(config.get('par', 'BTC/USDT'))[0]])
+            self.traders.append(BybitTrader(
+                rest_client=session.rest_client,
+                ws_monitor=session.ws_monitor,
+                balances=session.balances,
+                order_tracker=session.order_tracker,
+                market_data=market_data,
+                **config
+            ))
+
+    async def check_stop(self):
+        """Leitura única do teclado para todos os traders ('q' para imediatamente, 's' após a próxima venda)."""
+        self.logger.info("\nℹ️ Pressione 'q' para parar todos os pares imediatamente, 's' para parar após a próxima venda de cada par...\n")
+        while any(trader.running for trader in self.traders):
+            try:
+                char = await asyncio.get_event_loop().run_in_executor(None, input)
+                char = char.lower().strip()
+                if char == 'q':
+                    self.logger.warning("🛑 Parada imediata solicitada para todos os pares!")
+                    for trader in self.traders:
+                        trader.running = False
+                    await asyncio.sleep(2)
+                    await asyncio.gather(*(trader._cancel_open_orders() for trader in self.traders), return_exceptions=True)
+                    for trader in self.traders:
+                        trader.order_event.set()
+                    break
+                elif char == 's':
+                    for trader in self.traders:
+                        trader.stop_after_sell = True
+                    self.logger.warning("⏳ Solicitação de parada após a próxima venda recebida para todos os pares.")
+            except Exception as e:
+                self.error_logger.error(f"⚠️ Erro ao ler input: {e}")
+            await asyncio.sleep(0.1)
+
+    async def run(self):
+        self.logger.info(f"🧭 Supervisor iniciando {len(self.traders)} estratégia(s) em {len(self.sessions)} conta(s)...\n")
+        stop_task = None
+        try:
+            for trader in self.traders:
+                # Um único registro por processo: o primeiro par que pede o endpoint define a porta
+                await metrics.start(self.logger, trader.metrics_port, trader.metrics_dump_interval)
+            started = await asyncio.gather(*(session.start() for session in self.sessions.values()))
+            if not all(started):
+                self.error_logger.error(f"❌ Falha ao conectar uma das contas. Encerrando supervisor.")
+                return
+            await asyncio.gather(*(stream.start() for stream in self.market_streams.values()))
+            stop_task = asyncio.create_task(self.check_stop())
+            results = await asyncio.gather(*(trader.execute_strategy() for trader in self.traders), return_exceptions=True)
+            for trader, result in zip(self.traders, results):
+                if isinstance(result, Exception):
+                    self.error_logger.error(f"❌ Estratégia {trader.symbol} encerrada com erro: {result}")
+        finally:
+            if stop_task:
+                stop_task.cancel()
+            for session in self.sessions.values():
+                await session.stop()
+            for stream in self.market_streams.values():
+                await stream.close()
+            await metrics.stop()
+            total = sum(trader.total_profit for trader in self.traders)
+            self.logger.info(f"💵 Lucro total acumulado (todos os pares): {to_quote(total):.2f}\n")
+
+
+def carregar_configs(arquivos: List[str]) -> List[Dict]:
+    """Carrega as estratégias; arquivos sem chave API usam as chaves memorizadas pelo menu."""
+    api_key, api_secret = load_api_keys()
+    configs = []
+    for arquivo in arquivos:
+        config = carregar_estrategia_de_arquivo(arquivo)
+        if config is None:
+            raise SystemExit(f"Estratégia inválida: {arquivo}")
+        if not config.get('api_key'):
+            config['api_key'], config['api_secret'] = api_key, api_secret
+        if not config.get('api_key'):
+            raise SystemExit(f"Sem chave API para {arquivo}: salve as chaves pelo menu ou inclua-as no arquivo.")
+        configs.append(config)
+    return configs
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        raise SystemExit("Uso: python supervisor.py user/strategy/strategy_1.json [user/strategy/strategy_2.json ...]")
+    setup_logging('supervisor')
+    sys.stdout = TradeLoggerWriter()
+    supervisor = TradingSupervisor(carregar_configs(sys.argv[1:]))
+    asyncio.run(supervisor.run())
@@ -0,0 +1,72 @@
+# test_backtest.py
+import math
+import random
+from decimal import Decimal
+
+import pytest
+
+for module in ("aiohttp", "websockets", "cryptography"):
+    pytest.importorskip(module)
+from backtest import Backtester, Candles, load_candles, map_candles, save_candles_binary
+
+
+CONFIG = {
+    'par': 'BTC/USDT', 'saldo_limite': Decimal('0'), 'fee': Decimal('0.001'),
+    'qty_initial': Decimal('100'), 'qty_min': Decimal('10'), 'qty_max': Decimal('400'), 'qty_multiplier': Decimal('1.04'),
+    'profit_target': Decimal('0.003'), 'profit_target_min': Decimal('0.001'), 'profit_target_max': Decimal('0.02'),
+    'profit_target_multiplier': Decimal('1.0'), 'rebuy_percent': Decimal('0.01'), 'rebuy_drop_min': Decimal('0.005'),
+    'rebuy_drop_max': Decimal('0.05'), 'rebuy_multiplier': Decimal('1.0'), 'rebuys_max': 0,
+    'profit_reaplicar': 's', 'profit_distribution_orders': 5,
+}
+
+
+def random_walk(count: int, seed: int = 1) -> Candles:
+    rng = random.Random(seed)
+    candles = Candles()
+    price = 30000.0
+    for _ in range(count):
+        open_ = round(price, 2)
+        price *= math.exp(rng.gauss(0, 0.001))
+        close = round(price, 2)
+        candles.open.append(open_)
+        candles.high.append(round(max(open_, close) * 1.0003, 2))
+        candles.low.append(round(min(open_, close) * 0.9997, 2))
+        candles.close.append(close)
+    return candles
+
+
+@pytest.fixture
+def candles(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    return random_walk(50_000)
+
+
+def test_backtest_regression(candles):
+    result = Backtester(dict(CONFIG), Decimal('20000')).run(candles)
+    # Valores de referência da aritmética inteira (ticks, lotes e taxa em ppm); qualquer mudança é intencional
+    assert (result['cycles'], result['rebuys'], result['max_rebuys_in_cycle']) == (252, 173, 14)
+    assert result['total_profit'] == pytest.approx(216.57375556, abs=1e-8)
+    assert (result['open_buys'], result['base']) == (1, pytest.approx(0.007127))
+
+def test_csv_candles_give_the_same_result(candles, tmp_path):
+    path = tmp_path / 'candles.csv'
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write("timestamp,open,high,low,close\n")
+        for i in range(len(candles)):
+            f.write(f"{i},{candles.open[i]},{candles.high[i]},{candles.low[i]},{candles.close[i]}\n")
+    loaded = load_candles(str(path))
+    assert list(loaded.close) == list(candles.close)
+    expected = Backtester(dict(CONFIG), Decimal('20000')).run(candles)
+    result = Backtester(dict(CONFIG), Decimal('20000')).run(loaded)
+    for key in ('cycles', 'rebuys', 'total_profit', 'quote', 'base'):
+        assert result[key] == expected[key]
+
+def test_mapped_candles_give_the_same_result(candles, tmp_path):
+    path = str(tmp_path / 'candles.ohlc')
+    save_candles_binary(candles, path)
+    mapped = map_candles(path)
+    assert list(mapped.close[:10]) == list(candles.close[:10])
+    expected = Backtester(dict(CONFIG), Decimal('20000')).run(candles)
+    result = Backtester(dict(CONFIG), Decimal('20000')).run(mapped)
+    for key in ('cycles', 'rebuys', 'total_profit', 'quote', 'base'):
+        assert result[key] == expected[key]
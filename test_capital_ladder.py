@@ -0,0 +1,55 @@
+# test_capital_ladder.py
+import itertools
+from decimal import Decimal
+
+import pytest
+
+from capital_ladder import LADDER_UNLIMITED_DEPTH, Ladder, required_balance, required_balances
+
+
+BASE_CONFIG = {
+    'qty_initial': Decimal('100'), 'qty_min': Decimal('10'), 'qty_max': Decimal('400'), 'qty_multiplier': Decimal('1.04'),
+    'profit_target': Decimal('0.003'), 'profit_target_min': Decimal('0.001'), 'profit_target_max': Decimal('0.02'),
+    'profit_target_multiplier': Decimal('0.97'), 'rebuy_percent': Decimal('0.0025'), 'rebuy_drop_min': Decimal('0.001'),
+    'rebuy_drop_max': Decimal('0.01'), 'rebuy_multiplier': Decimal('0.98'), 'rebuys_max': 45, 'fee': Decimal('0.001'),
+    'profit_reaplicar': 's', 'profit_distribution_orders': 2,
+}
+
+def configs():
+    grid = itertools.product(
+        (Decimal('0.9'), Decimal('1'), Decimal('1.04'), Decimal('1.5')),   # qty_multiplier
+        (Decimal('5'), Decimal('100'), Decimal('500')),                    # qty_initial (abaixo, dentro e acima dos limites)
+        (0, 1, 10, 45),                                                    # rebuys_max
+        ('s', 'n'),                                                        # profit_reaplicar
+        (1, 3, 60),                                                        # profit_distribution_orders
+    )
+    for multiplier, initial, rebuys_max, reaplicar, orders in grid:
+        yield dict(BASE_CONFIG, qty_multiplier=multiplier, qty_initial=initial, rebuys_max=rebuys_max,
+                   profit_reaplicar=reaplicar, profit_distribution_orders=orders)
+
+
+@pytest.mark.parametrize("profit", [0.0, 37.5, 5000.0])
+def test_required_balance_matches_ladder(profit):
+    for config in configs():
+        assert required_balance(config, profit) == pytest.approx(Ladder(config, profit).required_balance, rel=1e-9), config
+
+def test_required_balances_vectorized():
+    batch = list(configs())[:20]
+    assert list(required_balances(batch, 10.0)) == pytest.approx([Ladder(config, 10.0).required_balance for config in batch])
+
+def test_ladder_depth_and_prices():
+    ladder = Ladder(dict(BASE_CONFIG, rebuys_max=3))
+    assert len(ladder) == 4
+    assert ladder.price[0] == 1.0
+    assert ladder.price[1] == pytest.approx(1 - 0.0025)
+    assert all(later < earlier for earlier, later in zip(ladder.price, ladder.price[1:]))
+    # Depois de cada recompra a venda fica sobre o preço médio com taxas
+    assert ladder.sell_price[3] == pytest.approx(ladder.avg_price[3] * (1 + ladder.profit_target[3]) / (1 - 0.001))
+    assert len(Ladder(dict(BASE_CONFIG, rebuys_max=0))) == LADDER_UNLIMITED_DEPTH + 1
+
+def test_required_balance_without_minimum():
+    # qty_min = 0 com multiplicador < 1: a série decrescente não tem limite inferior
+    for rebuys_max in (0, 1, 45):
+        config = dict(BASE_CONFIG, qty_min=Decimal('0'), qty_multiplier=Decimal('0.9'), rebuys_max=rebuys_max)
+        assert required_balance(config) == pytest.approx(Ladder(config).required_balance, rel=1e-9)
+    assert required_balance(dict(BASE_CONFIG, qty_min=Decimal('0'), qty_initial=Decimal('0'), qty_multiplier=Decimal('0.9'))) == 0.0
@@ -0,0 +1,56 @@
+# test_cycle_position.py
+import random
+from decimal import Decimal
+
+from cycle_position import CyclePosition
+from fixed_point import InstrumentUnits, quote_units
+
+
+def buy(price, qty):
+    return {"price": Decimal(price), "qty": Decimal(qty)}
+
+def test_cycle_position_totals():
+    units = InstrumentUnits('BTCUSDT', '0.01', '0.000001', '0.01')
+    position = CyclePosition(0.001, units, [buy('30000', '0.001'), buy('29000', '0.002')])
+    assert len(position) == 2
+    assert position.notional == quote_units('88')
+    assert position.lots == 3000
+    assert position.notional_with_fees == quote_units('88.088')
+    assert position.net_lots == 2997
+    assert position.last_notional == quote_units('58')
+    # Custo com taxas / moeda líquida, arredondado para cima ao tick
+    assert position.avg_ticks == units.ticks_for(quote_units('88.088'), 2997) == 2939206
+
+def test_cycle_position_rounds_against_the_position():
+    units = InstrumentUnits('XUSDT', '0.0001', '0.01', '0.01')
+    rng = random.Random(7)
+    for _ in range(500):
+        position = CyclePosition(rng.choice([0.001, 0.00075, 0.0018]), units)
+        for _ in range(rng.randint(1, 20)):
+            position.add(buy(f"{rng.uniform(0.5, 5):.4f}", f"{rng.randint(100, 100000) / 100:.2f}"))
+        exact_cost = Decimal(position.notional) * (1 + Decimal(repr(position.fee)))
+        exact_net = Decimal(position.lots) * (1 - Decimal(repr(position.fee)))
+        assert exact_cost <= position.notional_with_fees < exact_cost + 1
+        assert exact_net - 1 < position.net_lots <= exact_net
+        # Vender toda a moeda líquida ao preço médio cobre o custo com taxas
+        assert units.notional(position.avg_ticks, position.net_lots) >= position.notional_with_fees
+
+def test_cycle_position_rebuild_and_clear():
+    units = InstrumentUnits('BTCUSDT')
+    buys = [buy('30000', '0.001'), buy('29500', '0.0015')]
+    incremental = CyclePosition(0.001, units)
+    for entry in buys:
+        incremental.add(entry)
+    rebuilt = CyclePosition(0.001, units, buys)
+    assert (incremental.notional, incremental.lots, incremental.avg_ticks) == (rebuilt.notional, rebuilt.lots, rebuilt.avg_ticks)
+    rebuilt.clear()
+    assert (len(rebuilt), rebuilt.notional, rebuilt.lots, rebuilt.avg_ticks) == (0, 0, 0, 0)
+
+def test_cycle_position_scale_keeps_average():
+    units = InstrumentUnits('BTCUSDT', '0.01', '0.000001', '0.01')
+    position = CyclePosition(0.001, units, [buy('30000', '0.002'), buy('28000', '0.004')])
+    avg = position.avg_ticks
+    position.scale(Decimal('0.5'))
+    assert position.lots == 3000
+    assert [entry["qty"] for entry in position.buys] == [Decimal('0.001'), Decimal('0.002')]
+    assert abs(position.avg_ticks - avg) <= 1
@@ -0,0 +1,51 @@
+# test_fixed_point.py
+from decimal import Decimal
+
+from fixed_point import FEE_SCALE, InstrumentUnits, fee_on, fee_ppm, quote_units, to_quote
+
+
+def test_quote_units_truncate():
+    assert quote_units('1.234567899') == 123456789
+    assert quote_units(Decimal('-0.000000019')) == -1
+    assert to_quote(150_000_000) == 1.5
+
+def test_fee_ppm_and_fee_rounding_up():
+    assert fee_ppm(0.001) == 1000
+    assert fee_ppm(Decimal('0.00075')) == 750
+    assert fee_on(1_000_000, 1000) == 1000
+    assert fee_on(1_000_001, 1000) == 1001   # frações de unidade contam contra a posição
+    assert fee_on(0, 1000) == 0
+    assert fee_on(123, 0) == 0
+    assert FEE_SCALE == 1_000_000
+
+def test_instrument_units_input_rounding():
+    units = InstrumentUnits('BTCUSDT', '0.01', '0.000001', '0.01', min_qty='0.0000015', min_notional='5')
+    assert units.price_ticks('30090.129') == 3009012
+    assert units.qty_lots('0.0012349') == 1234
+    assert units.min_lots == 2                # mínimo arredondado para cima ao lote
+    assert units.min_notional == 500_000_000
+    # 30090.12 / 0.01 = 3009011.9999999995 em float: a folga não deixa cair um tick
+    assert units.price_to_ticks(30090.12) == 3009012
+    assert units.floor_lots(1234.9999) == 1234
+
+def test_instrument_units_integer_arithmetic():
+    units = InstrumentUnits('BTCUSDT', '0.01', '0.000001', '0.01')
+    ticks, lots = units.price_ticks('30000.01'), units.qty_lots('0.003333')
+    notional = units.notional(ticks, lots)
+    assert notional == quote_units(Decimal('30000.01') * Decimal('0.003333'))
+    assert units.lots_for(notional, ticks) == lots
+    assert units.lots_for(notional, 0) == 0
+    assert units.ticks_for(notional, lots) == ticks
+    assert units.ticks_for(notional + 1, lots) == ticks + 1   # para cima
+    assert units.ticks_for(notional, 0) == 0
+    assert units.floor_quote(1_234_567_890) == 1_234_000_000
+    assert units.quote_str(1_234_567_890) == '12.34'
+    assert units.price_str(ticks) == '30000.01'
+    assert units.qty_str(lots) == '0.003333'
+
+def test_instrument_units_minimums():
+    units = InstrumentUnits('BTCUSDT', '0.01', '0.000001', '0.01', min_qty='0.000048', min_notional='1')
+    price = units.price_ticks('30000')
+    assert units.below_minimum(price, 47)
+    assert not units.below_minimum(price, 48)
+    assert units.below_minimum(units.price_ticks('10000'), 99)   # 0.99 USDT < mínimo de valor
@@ -0,0 +1,65 @@
+# test_market_data.py
+import random
+
+import pytest
+
+pytest.importorskip("websockets")
+from market_data import OrderBook
+
+
+def snapshot(book, bids, asks, u=100, seq=1000):
+    book.apply_snapshot({"b": bids, "a": asks, "u": u, "seq": seq}, ts=1)
+
+
+def test_snapshot_sets_best_levels():
+    book = OrderBook('BTCUSDT')
+    assert not book.valid
+    assert not book.apply_delta({"u": 1}, ts=1)   # delta antes do snapshot é recusado
+    snapshot(book, [["100", "1"], ["99.5", "2"]], [["101", "1"], ["102", "3"]])
+    assert book.valid
+    assert (book.best_bid, book.best_ask) == (100.0, 101.0)
+    assert book.top(1) == ([(100.0, 1.0)], [(101.0, 1.0)])
+
+def test_delta_updates_and_removes_levels():
+    book = OrderBook('BTCUSDT')
+    snapshot(book, [["100", "1"], ["99.5", "2"]], [["101", "1"], ["102", "3"]])
+    assert book.apply_delta({"b": [["100.5", "1"]], "a": [["100.8", "2"]], "u": 101, "seq": 1001}, ts=2)
+    assert (book.best_bid, book.best_ask) == (100.5, 100.8)
+    # Melhor nível removido: o lado é percorrido de novo
+    assert book.apply_delta({"b": [["100.5", "0"]], "a": [["100.8", "0"], ["101", "0"]], "u": 102, "seq": 1002}, ts=3)
+    assert (book.best_bid, book.best_ask) == (100.0, 102.0)
+    assert book.update_id == 102
+
+def test_level_added_and_removed_in_same_delta_is_not_best():
+    book = OrderBook('BTCUSDT')
+    snapshot(book, [["100", "1"]], [["101", "1"]])
+    assert book.apply_delta({"b": [["100.7", "1"], ["100.7", "0"]], "a": [["100.2", "1"], ["100.2", "0"]], "u": 101}, ts=2)
+    assert (book.best_bid, book.best_ask) == (100.0, 101.0)
+
+def test_sequence_gap_invalidates_book():
+    book = OrderBook('BTCUSDT')
+    snapshot(book, [["100", "1"]], [["101", "1"]])
+    assert not book.apply_delta({"b": [["100.5", "1"]], "u": 103, "seq": 1003}, ts=2)
+    assert not book.valid
+    assert not book.apply_delta({"u": 104}, ts=3)
+    snapshot(book, [["100", "1"]], [["101", "1"]], u=200, seq=2000)
+    assert book.valid and book.apply_delta({"u": 201, "seq": 2001}, ts=4)
+
+def test_older_message_is_ignored():
+    book = OrderBook('BTCUSDT')
+    snapshot(book, [["100", "1"]], [["101", "1"]])
+    assert book.apply_delta({"b": [["100.9", "1"]], "u": 90, "seq": 999}, ts=2)
+    assert book.valid and book.best_bid == 100.0 and book.update_id == 100
+
+def test_random_deltas_match_full_scan():
+    rng = random.Random(5)
+    book = OrderBook('BTCUSDT')
+    snapshot(book, [[str(100 - i), "1"] for i in range(10)], [[str(101 + i), "1"] for i in range(10)])
+    for u in range(101, 3101):
+        delta = {"u": u, "b": [], "a": []}
+        for _ in range(rng.randint(1, 4)):
+            side, base = rng.choice((("b", 95), ("a", 101)))
+            delta[side].append([str(base + rng.randint(0, 10) * 0.5), rng.choice(("0", "1", "2"))])
+        assert book.apply_delta(delta, ts=u)
+        assert book.best_bid == (max(book.bids) if book.bids else None)
+        assert book.best_ask == (min(book.asks) if book.asks else None)
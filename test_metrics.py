@@ -0,0 +1,41 @@
+# test_metrics.py
+import random
+
+from metrics import HISTOGRAM_MAX_US, LatencyHistogram
+
+
+def test_empty_histogram():
+    histogram = LatencyHistogram()
+    assert histogram.percentile(0.99) == 0
+    assert histogram.mean == 0.0
+
+def test_small_values_are_exact():
+    histogram = LatencyHistogram()
+    for value in range(1, 101):
+        histogram.record(value)
+    assert histogram.percentile(0.5) == 50
+    assert histogram.percentile(0.9) == 90
+    assert histogram.percentile(1.0) == 100
+    assert (histogram.min, histogram.max, histogram.count) == (1, 100, 100)
+    assert histogram.mean == 50.5
+
+def test_percentiles_within_relative_error():
+    rng = random.Random(11)
+    values = sorted(int(rng.lognormvariate(8, 1.5)) for _ in range(20000))
+    histogram = LatencyHistogram()
+    for value in values:
+        histogram.record(value)
+    for q in (0.5, 0.9, 0.99, 0.999):
+        exact = values[max(0, -(-int(q * len(values) * 1000) // 1000) - 1)]
+        reported = histogram.percentile(q)
+        # Faixa reportada pelo limite superior: nunca abaixo do valor exato, erro < 1,6%
+        assert exact <= reported <= exact * 1.016 + 1
+    assert histogram.percentile(1.0) == values[-1]
+
+def test_out_of_range_values_are_clamped():
+    histogram = LatencyHistogram()
+    histogram.record(-5)
+    histogram.record(HISTOGRAM_MAX_US * 4)
+    assert histogram.min == 0
+    assert histogram.max == HISTOGRAM_MAX_US
+    assert histogram.percentile(1.0) == HISTOGRAM_MAX_US
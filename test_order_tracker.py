@@ -0,0 +1,110 @@
+# test_order_tracker.py
+import asyncio
+import logging
+from decimal import Decimal
+
+from order_tracker import OrderAck, OrderTracker
+
+logger = logging.getLogger('test')
+
+
+def execution(order_id, exec_id, price, qty, leaves='1', fee='0'):
+    return {"data": [{"orderId": order_id, "execId": exec_id, "execType": "Trade", "execPrice": price,
+                      "execQty": qty, "execFee": fee, "leavesQty": leaves}]}
+
+def order(order_id, status, avg_price='0', cum_qty='0'):
+    return {"data": [{"orderId": order_id, "orderStatus": status, "avgPrice": avg_price, "cumExecQty": cum_qty}]}
+
+
+def test_executions_are_merged_and_deduplicated():
+    tracker = OrderTracker(logger, logger)
+    tracker.apply_execution_message(execution('1', 'e1', '100', '1', fee='0.001'))
+    tracker.apply_execution_message(execution('1', 'e1', '100', '1', fee='0.001'))   # reenvio após reconexão
+    tracker.apply_execution_message(execution('1', 'e2', '103', '2', leaves='0', fee='0.002'))
+    details = tracker.get_details('1')
+    assert details == {"price": Decimal('102'), "qty": Decimal('3'), "status": 'Filled'}
+    assert tracker._orders['1']["exec_fee"] == Decimal('0.003')
+
+def test_order_push_takes_priority_over_executions():
+    tracker = OrderTracker(logger, logger)
+    tracker.apply_execution_message(execution('1', 'e1', '100', '1'))
+    assert tracker.get_details('1')["status"] == 'PartiallyFilled'
+    tracker.apply_order_message(order('1', 'Filled', '101.5', '2'))
+    assert tracker.get_details('1') == {"price": Decimal('101.5'), "qty": Decimal('2'), "status": 'Filled'}
+
+def test_no_details_without_fill():
+    tracker = OrderTracker(logger, logger)
+    tracker.apply_order_message(order('1', 'New'))
+    assert tracker.status('1') == 'New'
+    assert tracker.get_details('1') is None
+    assert tracker.get_details('unknown') is None
+
+def test_late_non_terminal_status_is_ignored():
+    tracker = OrderTracker(logger, logger)
+    tracker.apply_order_message(order('1', 'Filled', '100', '1'))
+    tracker.apply_order_message(order('1', 'New'))
+    tracker.apply_order_message(order('1', 'PartiallyFilled', '100', '0.5'))
+    assert tracker.get_details('1') == {"price": Decimal('100'), "qty": Decimal('1'), "status": 'Filled'}
+
+def test_oldest_orders_are_evicted():
+    tracker = OrderTracker(logger, logger, max_orders=2)
+    for order_id in ('1', '2', '3'):
+        tracker.apply_order_message(order(order_id, 'New'))
+    assert tracker.status('1') is None
+    assert tracker.status('3') == 'New'
+
+
+def test_waiter_resolves_on_matching_status():
+    async def scenario():
+        tracker = OrderTracker(logger, logger)
+        waiter = asyncio.create_task(tracker.wait_for_fill('1', timeout=1))
+        await asyncio.sleep(0)
+        tracker.apply_order_message(order('1', 'New'))
+        await asyncio.sleep(0)
+        assert not waiter.done()
+        tracker.apply_order_message(order('1', 'Filled', '100', '1'))
+        details = await waiter
+        assert details["qty"] == Decimal('1')
+        assert not tracker._waiters
+    asyncio.run(scenario())
+
+def test_waiter_returns_current_status_immediately():
+    async def scenario():
+        tracker = OrderTracker(logger, logger)
+        tracker.apply_order_message(order('1', 'Cancelled'))
+        assert await tracker.wait_for_status('1', {'Cancelled', 'Filled'}, timeout=0) == 'Cancelled'
+    asyncio.run(scenario())
+
+def test_waiter_timeout_is_cleaned_up():
+    async def scenario():
+        tracker = OrderTracker(logger, logger)
+        assert await tracker.wait_for_status('1', {'Filled'}, timeout=0.01) is None
+        assert not tracker._waiters
+    asyncio.run(scenario())
+
+
+class FakeRest:
+    def __init__(self):
+        self.calls = []
+
+    async def get_order_details(self, order_id):
+        self.calls.append(order_id)
+        return {"price": Decimal('99'), "qty": Decimal('1'), "status": 'Filled'}
+
+def test_order_ack_uses_websocket_fill_and_falls_back_to_rest():
+    async def scenario():
+        tracker, rest = OrderTracker(logger, logger), FakeRest()
+        tracker.apply_order_message(order('1', 'Filled', '100', '1'))
+        assert (await OrderAck('1', tracker, rest))["price"] == Decimal('100')
+        assert rest.calls == []
+        assert (await OrderAck('2', tracker, rest).result(timeout=0.01))["price"] == Decimal('99')
+        assert rest.calls == ['2']
+    asyncio.run(scenario())
+
+def test_order_ack_accepted_is_false_only_when_rejected():
+    async def scenario():
+        tracker = OrderTracker(logger, logger)
+        tracker.apply_order_message(order('1', 'Rejected'))
+        assert not await OrderAck('1', tracker, None).accepted(timeout=0.01)
+        assert await OrderAck('2', tracker, None).accepted(timeout=0.01)
+    asyncio.run(scenario())
@@ -0,0 +1,90 @@
+# test_rate_limiter.py
+import asyncio
+import logging
+import time
+
+from rate_limiter import (PRIORITY_CANCEL, PRIORITY_ORDER, PRIORITY_POLL, PRIORITY_QUERY, PRIORITY_SELL,
+                          RateGovernor, TokenBucket)
+
+logger = logging.getLogger('test')
+
+
+async def drain(bucket: TokenBucket, priorities):
+    """Enfileira um pedido por prioridade (na ordem dada) e devolve a ordem em que foram liberados."""
+    served = []
+
+    async def request(name, priority):
+        await bucket.acquire(priority)
+        served.append(name)
+
+    tasks = []
+    for name, priority in priorities:
+        tasks.append(asyncio.create_task(request(name, priority)))
+        await asyncio.sleep(0)
+    await asyncio.gather(*tasks)
+    return served
+
+
+def test_free_token_is_taken_without_waiting():
+    async def scenario():
+        bucket = TokenBucket(10, 2)
+        assert await bucket.acquire() == 0.0
+        assert await bucket.acquire() == 0.0
+        assert bucket.tokens < 1
+    asyncio.run(scenario())
+
+def test_waiters_leave_by_priority_then_arrival():
+    async def scenario():
+        bucket = TokenBucket(200, 1)
+        await bucket.acquire()
+        return await drain(bucket, [('poll', PRIORITY_POLL), ('query1', PRIORITY_QUERY), ('sell', PRIORITY_SELL),
+                                    ('query2', PRIORITY_QUERY), ('cancel', PRIORITY_CANCEL)])
+    assert asyncio.run(scenario()) == ['cancel', 'sell', 'query1', 'query2', 'poll']
+
+def test_block_holds_requests_until_reset():
+    async def scenario():
+        bucket = TokenBucket(100, 10)
+        bucket.block(0.05)
+        started = time.monotonic()
+        await bucket.acquire(PRIORITY_CANCEL)
+        return time.monotonic() - started
+    assert asyncio.run(scenario()) >= 0.045
+
+def test_observe_applies_exchange_limits():
+    async def scenario():
+        bucket = TokenBucket(10)
+        bucket.observe(limit=20, remaining=0, reset_in=0.03)
+        assert bucket.capacity == 20 and bucket.rate == 20
+        assert bucket.delay() > 0
+        started = time.monotonic()
+        await bucket.acquire()
+        return time.monotonic() - started
+    assert asyncio.run(scenario()) >= 0.025
+
+def test_reserve_is_kept_for_cancels_and_sells():
+    async def scenario():
+        bucket = TokenBucket(20, 4, reserve=2)
+        await bucket.acquire(PRIORITY_POLL)
+        await bucket.acquire(PRIORITY_POLL)
+        assert bucket.delay(priority=PRIORITY_POLL) > 0        # só restou a reserva
+        assert bucket.delay(priority=PRIORITY_CANCEL) == 0.0
+        return await drain(bucket, [('poll', PRIORITY_POLL), ('order', PRIORITY_ORDER), ('cancel', PRIORITY_CANCEL)])
+    # O cancelamento entra no fim da fila e ainda assim sai primeiro, sem esperar a reposição
+    assert asyncio.run(scenario()) == ['cancel', 'order', 'poll']
+
+
+def test_governor_routes_endpoints_to_groups():
+    assert RateGovernor.route("/v5/order/cancel") == ('cancel', PRIORITY_CANCEL)
+    assert RateGovernor.route("/v5/account/wallet-balance") == ('account', PRIORITY_POLL)
+    assert RateGovernor.route("/v5/market/tickers")[0] == 'market'
+
+def test_governor_retry_after_clears_when_blocks_expire():
+    async def scenario():
+        governor = RateGovernor('test-retry-after', logger, logger)
+        assert governor.retry_after() is None
+        governor.on_rate_limited("/v5/order/create", {})
+        assert 0 < governor.retry_after() <= 1.0
+        governor.buckets['order'].blocked_until = time.monotonic() - 1
+        assert governor.retry_after() is None
+        assert not governor.throttled
+    asyncio.run(scenario())
@@ -0,0 +1,83 @@
+# test_state_journal.py
+import asyncio
+import json
+import logging
+import os
+from decimal import Decimal
+
+from state_journal import StateJournal, journal_key
+
+logger = logging.getLogger('test')
+
+
+def open_journal(directory, **kwargs) -> StateJournal:
+    return StateJournal('Bybit_Demo_BTCUSDT_s1', logger, logger, directory=str(directory), **kwargs)
+
+
+def test_load_replays_deltas(tmp_path):
+    async def scenario():
+        journal = open_journal(tmp_path)
+        assert journal.load() is None
+        journal.record({"cycle_id": 1, "cycle_buys": [{"price": Decimal('100'), "qty": Decimal('1')}], "current_sell_id": None})
+        journal.record({"cycle_id": 1, "cycle_buys": [{"price": Decimal('100'), "qty": Decimal('1')}], "current_sell_id": 'A'})
+        journal.record({"cycle_id": 1, "cycle_buys": [{"price": Decimal('100'), "qty": Decimal('1')}], "current_sell_id": 'A'})
+        await journal.flush()
+        with open(journal.journal_path, encoding='utf-8') as f:
+            lines = [json.loads(line) for line in f]
+        # Só o que mudou entra no journal; registro idêntico não gera linha
+        assert [line["delta"] for line in lines[1:]] == [{"current_sell_id": 'A'}]
+        assert open_journal(tmp_path).load()["current_sell_id"] == 'A'
+        await journal.close()
+        assert os.path.getsize(journal.journal_path) == 0   # ao encerrar, tudo vai para o snapshot
+    asyncio.run(scenario())
+    state = open_journal(tmp_path).load()
+    assert state == {"cycle_id": 1, "cycle_buys": [{"price": Decimal('100'), "qty": Decimal('1')}], "current_sell_id": 'A'}
+
+def test_list_mutated_in_place_is_recorded(tmp_path):
+    async def scenario():
+        journal = open_journal(tmp_path)
+        buys = [{"price": Decimal('100')}]
+        journal.record({"cycle_buys": buys})
+        buys.append({"price": Decimal('99')})
+        journal.record({"cycle_buys": buys})
+        await journal.close()
+    asyncio.run(scenario())
+    assert len(open_journal(tmp_path).load()["cycle_buys"]) == 2
+
+def test_compaction_writes_snapshot_and_truncates(tmp_path):
+    async def scenario():
+        journal = open_journal(tmp_path, snapshot_every=3)
+        for cycle_id in range(1, 5):
+            journal.record({"cycle_id": cycle_id, "total_profit": cycle_id * 10})
+        await journal.flush()
+        assert os.path.getsize(journal.journal_path) == 0
+        journal.record({"cycle_id": 5})
+        await journal.flush()
+    asyncio.run(scenario())
+    with open(tmp_path / 'Bybit_Demo_BTCUSDT_s1.snapshot.json', encoding='utf-8') as f:
+        assert json.load(f) == {"seq": 4, "state": {"cycle_id": 4, "total_profit": 40}}
+    journal = open_journal(tmp_path)
+    assert journal.load() == {"cycle_id": 5, "total_profit": 40}
+    assert journal._seq == 5
+
+def test_entries_older_than_snapshot_are_skipped(tmp_path):
+    # Queda entre o snapshot e o truncamento: o journal antigo ainda está lá
+    (tmp_path / 'Bybit_Demo_BTCUSDT_s1.snapshot.json').write_text(json.dumps({"seq": 2, "state": {"cycle_id": 2}}))
+    (tmp_path / 'Bybit_Demo_BTCUSDT_s1.journal').write_text(
+        "".join(json.dumps({"seq": seq, "delta": {"cycle_id": seq}}) + "\n" for seq in (1, 2, 3)))
+    assert open_journal(tmp_path).load() == {"cycle_id": 3}
+
+def test_truncated_last_line_is_ignored(tmp_path):
+    (tmp_path / 'Bybit_Demo_BTCUSDT_s1.journal').write_text(
+        json.dumps({"seq": 1, "delta": {"cycle_id": 1}}) + "\n" + '{"seq": 2, "del')
+    assert open_journal(tmp_path).load() == {"cycle_id": 1}
+
+
+def test_journal_key_per_strategy():
+    config = {'exchange': 'Bybit Demo', 'par': 'BTC/USDT', 'fee': Decimal('0.001'), 'api_key': 'a'}
+    assert journal_key(dict(config, strategy_file='user/strategy/strategy_1.json'), 'BTCUSDT') == 'Bybit_Demo_BTCUSDT_strategy_1'
+    hashed = journal_key(config, 'BTCUSDT')
+    assert hashed.startswith('Bybit_Demo_BTCUSDT_')
+    # Credenciais não mudam a identidade; parâmetros da estratégia mudam
+    assert journal_key(dict(config, api_key='b'), 'BTCUSDT') == hashed
+    assert journal_key(dict(config, fee=Decimal('0.002')), 'BTCUSDT') != hashed
@@ -1,36 +1,90 @@
-
 # websocket_monitor.py (refatorado)
 import asyncio
 import json
+import random
 import time
 import hmac
 import hashlib
 import logging
-from datetime import datetime
 from websockets import connect
 import websockets.exceptions
-from typing import Dict
-from exchange.core.keep_alive_ws import KeepAliveWS
+from collections import OrderedDict
+from typing import Dict, List, Optional
+from keep_alive_ws import KeepAliveWS, HEARTBEAT_INTERVAL, HEARTBEAT_MAX_MISSED
+from metrics import metrics
 
 EXCHANGE_CONFIG = {
     'Bybit Demo': {'ws_url': 'wss://stream-demo.bybit.com/v5/private'},
-    'Bybit Main': {'ws_url': 'wss://stream.bybit.com/v5/private'}
+    'Bybit Main': {'ws_url': 'wss://stream.bybit.com/v5/private'},
+    'Bybit Sim': {'ws_url': 'ws://127.0.0.1:8321/v5/private'}   # simulator.py (paper trading local)
 }
 
+# Reconexão com espera exponencial e jitter completo (sorteio entre 0 e o teto), para que várias contas/processos
+# derrubados juntos não reconectem todos no mesmo instante
+RECONNECT_BASE_DELAY = 0.5   # teto da primeira espera, em segundos; dobra a cada falha
+RECONNECT_MAX_DELAY = 60     # teto máximo da espera
+RECONNECT_STABLE_AFTER = 30  # segundos conectado para a próxima queda voltar a começar da espera curta
+REPLAY_MARGIN_MS = 5000      # folga antes da última mensagem recebida na consulta REST da lacuna
+REPLAY_MAX_GAP_MS = 7 * 24 * 3600 * 1000   # janela máxima das consultas de histórico da V5
+WS_EVENT_QUEUE_SIZE = 1000   # eventos pendentes por trader antes de o loop de recepção esperar (backpressure)
+WS_ORPHAN_MAX_ORDERS = 256   # ordens sem dono guardadas até o REST devolver o orderId
+ROUTED_STATUSES = {'Filled', 'Cancelled', 'Rejected', 'PartiallyFilledCanceled', 'Deactivated'}  # estados que exigem ação do ciclo
+
 class BybitWebSocketMonitor:
-    def __init__(self, trader, config: Dict, logger: logging.Logger, error_logger: logging.Logger):
-        self.trader = trader
+    """Hub da conexão privada autenticada, partilhada por todos os traders (pares) da mesma conta.
+
+    Um único loop de recepção aplica wallet/execution/order ao livro de saldos e ao OrderTracker
+    partilhados e encaminha os eventos de ordem para a fila do trader dono através de um índice
+    orderId -> trader (consulta O(1) por mensagem). As filas são limitadas: se um trader não consome,
+    o loop de recepção espera por ele em vez de acumular memória sem limite.
+    """
+
+    def __init__(self, config: Dict, logger: logging.Logger, error_logger: logging.Logger, balances, order_tracker, clock=None, rest_client=None):
         self.ws_url = EXCHANGE_CONFIG[config['exchange']]['ws_url']
         self.api_key = config['api_key']
         self.api_secret = config['api_secret']
         self.logger = logger
         self.error_logger = error_logger
+        # Heartbeat: uma conexão meio aberta é derrubada após `ws_max_missed_pongs` pings sem resposta
+        self.ping_interval = float(config.get('ws_ping_interval', HEARTBEAT_INTERVAL))
+        self.max_missed_pongs = int(config.get('ws_max_missed_pongs', HEARTBEAT_MAX_MISSED))
         self.ws = None
         self.ws_connected = False
         self.keep_alive = None
+        self.balances = balances
+        self.order_tracker = order_tracker
+        self.clock = clock   # ServerClock do cliente REST: horário do servidor para medir o atraso dos pushes
+        self.rest_client = rest_client   # consultas da lacuna após uma reconexão
+        self.traders: List = []
+        self._order_index: Dict[str, object] = {}
+        self._orphans: "OrderedDict[str, List[Dict]]" = OrderedDict()
+        self.running = False
+        self._receive_task: Optional[asyncio.Task] = None
+        self._reconnect_attempt = 0
+        self._connected_at = 0.0
+        self._last_message_at = 0.0
+
+    def register(self, trader):
+        """Associa um trader ao stream; os eventos dele chegam em `trader.ws_events`."""
+        trader.ws_events = asyncio.Queue(maxsize=WS_EVENT_QUEUE_SIZE)
+        self.traders.append(trader)
+
+    def bind_order(self, order_id: str, trader):
+        """Indexa a ordem ao trader que a criou e entrega eventos que chegaram antes da resposta do REST."""
+        self._order_index[order_id] = trader
+        for order in self._orphans.pop(order_id, ()):
+            self._enqueue(trader, ('order', order))
+
+    def _enqueue(self, trader, event) -> Optional[asyncio.Future]:
+        try:
+            trader.ws_events.put_nowait(event)
+            return None
+        except asyncio.QueueFull:
+            self.error_logger.warning("⚠️ Fila de eventos de %s cheia; aguardando consumo...", trader.symbol)
+            return trader.ws_events.put(event)
 
     async def connect_websocket(self) -> bool:
-        self.logger.info(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] ⚡ Connecting to WebSocket: {self.ws_url}")
+        self.logger.info("⚡ Connecting to WebSocket: %s", self.ws_url)
         try:
             self.ws = await connect(self.ws_url)
             self.ws_connected = True
@@ -44,10 +98,10 @@ class BybitWebSocketMonitor:
             auth_response = await self.ws.recv()
             auth_data = json.loads(auth_response)
             if not auth_data.get('success', False):
-                self.error_logger.error(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] ❌ WebSocket authentication failed: {auth_response}")
+                self.error_logger.error("❌ WebSocket authentication failed: %s", auth_response)
                 return False
 
-            self.logger.info(f"🔑 WebSocket authentication successful.")
+            self.logger.info("🔑 WebSocket authentication successful.")
 
             subscribe_msg = {"op": "subscribe", "args": ["order", "execution"]}
             await self.ws.send(json.dumps(subscribe_msg))
@@ -60,92 +114,232 @@ class BybitWebSocketMonitor:
             self.keep_alive = KeepAliveWS(
                 self.ws,
                 logger=self.logger,
-                interval=60,
-                inactivity_mode=True,
-                inactivity_timeout=400,
+                interval=self.ping_interval,
+                max_missed=self.max_missed_pongs,
+                on_dead=self._on_stale,
                 verbose=False
             )
             asyncio.create_task(self.keep_alive.start())
+            self.balances.set_stream_live(True)
+
+            self.running = True
+            self._connected_at = self._last_message_at = time.time()
+            if self._receive_task is None or self._receive_task.done():
+                self._receive_task = asyncio.create_task(self._receive_loop())
 
             return True
 
         except Exception as e:
-            self.error_logger.error(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] ❌ WebSocket connection failed: {e}")
+            self.error_logger.error("❌ WebSocket connection failed: %s", e)
             self.ws_connected = False
+            self.balances.set_stream_live(False)
             self.ws = None
             return False
 
-    async def monitor_cycle(self):
-        self.logger.info(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] 🔍 Monitoring cycle #{self.trader.cycle_id} with {len(self.trader.cycle_buys)} buys...")
-        self.trader.order_event.clear()
+    async def close(self):
+        """Encerra o loop de recepção, o keep alive e a conexão."""
+        self.running = False
+        if self._receive_task:
+            self._receive_task.cancel()
+            try:
+                await self._receive_task
+            except asyncio.CancelledError:
+                pass
+            self._receive_task = None
+        if self.keep_alive:
+            await self.keep_alive.stop()
+        if self.ws_connected and self.ws:
+            await self.ws.close()
+        self.ws_connected = False
+
+    def _server_ms(self, local_time: float) -> int:
+        offset = self.clock.offset_ms if self.clock else 0.0
+        return int(local_time * 1000 + offset)
 
-        while not self.trader.order_event.is_set() and self.trader.running:
+    async def _drop_connection(self):
+        if self.ws:
             try:
-                
-                if not self.ws or self.ws.closed:
-                    self.error_logger.warning(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] ⚠️ WebSocket disconnected. Reconnecting...")
-                    self.ws_connected = False
-                    if not await self.connect_websocket():
-                        self.error_logger.error(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] ❌ Failed to reconnect. Ending cycle...")
-                        self.trader.order_event.set()
-                        return
+                await self.ws.close()
+            except Exception:
+                pass   # conexão já perdida
+        self.ws = None
 
-                msg = await asyncio.wait_for(self.ws.recv(), timeout=5)
+    def _on_stale(self):
+        """Heartbeat sem resposta: aborta o transporte na hora (sem esperar o handshake de fechamento de uma
+        conexão muda); o recv() pendente falha e o loop de recepção reconecta e recupera a lacuna."""
+        metrics.inc('ws_stale', 'private')
+        transport = getattr(self.ws, 'transport', None)
+        if transport is not None:
+            transport.abort()
+        elif self.ws:
+            asyncio.create_task(self._drop_connection())
 
-                if self.keep_alive:
-                    self.keep_alive.reset_timer()
+    async def _reconnect(self) -> bool:
+        """Reconecta até conseguir (ou até `close()`), com espera exponencial e jitter; reautentica, reassina
+        e recupera pelo REST os eventos perdidos antes de voltar a ler o stream."""
+        self.ws_connected = False
+        self.balances.set_stream_live(False)
+        # A lacuna começa na última mensagem recebida (uma conexão meio aberta pode ter ficado muda antes da queda)
+        gap_start_ms = self._server_ms(self._last_message_at) - REPLAY_MARGIN_MS
+        if time.time() - self._connected_at >= RECONNECT_STABLE_AFTER:
+            self._reconnect_attempt = 0
+        await self._drop_connection()
+        while self.running:
+            delay = random.uniform(0, min(RECONNECT_MAX_DELAY, RECONNECT_BASE_DELAY * 2 ** self._reconnect_attempt))
+            self._reconnect_attempt += 1
+            self.logger.info("🔁 Reconectando o WebSocket em %.1fs (tentativa %s)...", delay, self._reconnect_attempt)
+            await asyncio.sleep(delay)
+            if await self.connect_websocket():
+                await self._replay_gap(gap_start_ms)
+                return True
+            self.ws_connected = False
+            await self._drop_connection()
+        return False
 
-                data = json.loads(msg)
+    async def _replay_gap(self, since_ms: int):
+        """Aplica, em ordem cronológica, as execuções e mudanças de ordem que ocorreram sem stream.
+
+        Execuções repetidas são descartadas pelo OrderTracker (execId) e cada ordem é entregue ao trader
+        dono uma única vez (o índice é consumido), então sobrepor a lacuna com o stream novo é seguro.
+        """
+        if self.rest_client is None:
+            self.error_logger.warning("⚠️ Sem cliente REST: eventos ocorridos durante a desconexão não foram recuperados")
+            return
+        since_ms = max(since_ms, self._server_ms(time.time()) - REPLAY_MAX_GAP_MS)
+        symbols = {trader.symbol for trader in self.traders}
+        executions, history, *open_orders = await asyncio.gather(
+            self.rest_client.get_executions(since_ms), self.rest_client.get_order_history(since_ms),
+            *(self.rest_client.get_open_orders(symbol) for symbol in symbols))
+        if executions is None or history is None or None in open_orders:
+            self.error_logger.error("⚠️ Lacuna da desconexão recuperada só em parte; preenchimentos pendentes serão confirmados pelo REST")
+        events = [(int(e.get('execTime') or 0), 0, 'execution', e) for e in executions or () if e.get('symbol') in symbols]
+        orders = [o for o in history or () if o.get('symbol') in symbols]
+        orders += [o for page in open_orders if page for o in page.values()]
+        events += [(int(o.get('updatedTime') or 0), 1, 'order', o) for o in orders]
+        # Em empate de horário a execução vem antes do estado da ordem, como no stream
+        events.sort(key=lambda event: event[:2])
+        for _, _, topic, item in events:
+            if topic == 'execution':
+                self.order_tracker.apply_execution_message({"data": [item]})
+                continue
+            self.order_tracker.apply_order_message({"data": [item]})
+            pending = self._route_order(item)
+            if pending is not None:
+                await pending
+        self.logger.info("♻️ Lacuna recuperada pelo REST: %s execuções e %s ordens", len(events) - len(orders), len(orders))
+        # Pushes de wallet também se perderam: confere o livro e acorda quem espera saldo
+        if await self.balances.reconcile():
+            self._notify_wallet()
 
-                if data.get('topic') == 'wallet':
-                    # Verificar se há recompra pendente por saldo insuficiente
-                    if self.trader.paused_for_insufficient_balance:
-                        # Tentar executar recompra pendente se há saldo suficiente
-                        if await self.trader.try_execute_pending_rebuy():
-                            # Se a recompra foi executada com sucesso, continuar monitoramento normal
-                            pass
-                    
-                    if self.keep_alive and self.keep_alive.verbose:
-                        self.logger.info("💰 Wallet update received (used to keep connection alive)")
+    def _notify_wallet(self):
+        # Verificar se há recompra pendente por saldo insuficiente (um aviso pendente por trader basta)
+        for trader in self.traders:
+            if trader.paused_for_insufficient_balance and trader.ws_events.empty():
+                trader.ws_events.put_nowait(('wallet', None))
+
+    def _route_order(self, order: Dict) -> Optional[asyncio.Future]:
+        if order.get('orderStatus') not in ROUTED_STATUSES:
+            return None
+        order_id = order.get('orderId')
+        trader = self._order_index.pop(order_id, None)
+        if trader is None:
+            # O push pode chegar antes da resposta REST com o orderId: guarda até bind_order
+            self._orphans.setdefault(order_id, []).append(order)
+            while len(self._orphans) > WS_ORPHAN_MAX_ORDERS:
+                self._orphans.popitem(last=False)
+            return None
+        return self._enqueue(trader, ('order', order))
+
+    def _record_fill_delay(self, data: Dict):
+        """Atraso entre o preenchimento na exchange (updatedTime) e a chegada do push, no relógio do servidor."""
+        now_ms = self.clock.now_ms() if self.clock else time.time() * 1000
+        for order in data.get('data', []):
+            if order.get('orderStatus') == 'Filled' and order.get('updatedTime'):
+                metrics.record('ws_fill_notify', (now_ms - int(order['updatedTime'])) * 1000, order.get('symbol', ''))
+
+    async def _dispatch(self, data: Dict):
+        """Aplica a mensagem ao estado local sem fazer I/O; o que exige ação do ciclo vai para a fila do dono."""
+        topic = data.get('topic')
+        if topic == 'wallet':
+            # O livro de saldos é alimentado diretamente pelo push de wallet
+            self.balances.apply_wallet_message(data)
+            self._notify_wallet()
+            if self.keep_alive and self.keep_alive.verbose:
+                self.logger.info("💰 Wallet update received (used to keep connection alive)")
+        elif topic == 'execution':
+            self.order_tracker.apply_execution_message(data)
+        elif topic == 'order':
+            self.order_tracker.apply_order_message(data)
+            if metrics.enabled:
+                self._record_fill_delay(data)
+            for order in data.get('data', []):
+                pending = self._route_order(order)
+                if pending is not None:
+                    await pending
+
+    async def _receive_loop(self):
+        """Único leitor do socket: mantém saldos e preenchimentos atualizados mesmo fora de monitor_cycle."""
+        while self.running:
+            try:
+                if not self.ws or self.ws.closed:
+                    self.error_logger.warning("⚠️ WebSocket disconnected. Reconnecting...")
+                    await self._reconnect()
                     continue
 
-                if data.get('topic') == 'order':
-                    for order in data.get('data', []):
-                        order_id = order.get('orderId')
-                        status = order.get('orderStatus')
+                msg = await self.ws.recv()
+                self._last_message_at = time.time()
+                data = json.loads(msg)
+                if self.keep_alive and self.keep_alive.handle(data):
+                    continue
 
-                        if order_id not in [self.trader.current_sell_id, self.trader.current_rebuy_id]:
-                            continue
+                await self._dispatch(data)
 
-                        self.logger.debug(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] 📊 Order {order_id} updated: Status {status}")
+            except asyncio.CancelledError:
+                raise
+            except websockets.exceptions.ConnectionClosed:
+                self.error_logger.error("🔌 WebSocket connection closed. Attempting to reconnect...")
+                await self._reconnect()
+            except Exception as e:
+                self.error_logger.error("🛑 Receive loop error: %s", e)
+                await asyncio.sleep(1)
 
-                        if status == 'Filled':
-                            if order_id == self.trader.current_sell_id:
-                                await self.trader.on_sell_filled()
-                                self.trader.order_event.set()
-                                break
-                            elif order_id == self.trader.current_rebuy_id:
-                                await self.trader.order_status(order)
-                                break
+    async def monitor_cycle(self, trader):
+        self.logger.info("🔍 Monitoring cycle #%s with %s buys...", trader.cycle_id, len(trader.cycle_buys))
+        trader.order_event.clear()
 
-                        elif status in ['Cancelled', 'Rejected']:
-                            if order_id == self.trader.current_sell_id:
-                                self.trader.current_sell_id = None
-                            elif order_id == self.trader.current_rebuy_id:
-                                self.trader.current_rebuy_id = None
+        while not trader.order_event.is_set() and trader.running:
+            try:
+                topic, order = await asyncio.wait_for(trader.ws_events.get(), timeout=5)
 
-                            if order_id in self.trader.active_orders:
-                                del self.trader.active_orders[order_id]
+                if topic == 'wallet':
+                    # Tentar executar recompra pendente se há saldo suficiente
+                    if trader.paused_for_insufficient_balance:
+                        await trader.try_execute_pending_rebuy()
+                    continue
+
+                order_id = order.get('orderId')
+                status = order.get('orderStatus')
+                # O hub só entrega ordens indexadas a este trader; ordens de ciclos anteriores são ignoradas
+                trader.active_orders.pop(order_id, None)
+                is_sell = order_id == trader.current_sell_id
+                if not is_sell and order_id != trader.current_rebuy_id:
+                    continue
+
+                self.logger.debug("📊 Order %s updated: Status %s", order_id, status)
+
+                if status == 'Filled':
+                    if is_sell:
+                        await trader.on_sell_filled()
+                        trader.order_event.set()
+                    else:
+                        await trader.order_status(order)
+
+                elif status in ('Cancelled', 'Rejected', 'PartiallyFilledCanceled', 'Deactivated'):
+                    await trader.on_order_cancelled(order)
 
             except asyncio.TimeoutError:
+                trader.check_market_gap()
                 continue
-            except websockets.exceptions.ConnectionClosed:
-                self.error_logger.error(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] 🔌 WebSocket connection closed. Attempting to reconnect...")
-                self.ws_connected = False
-                if not await self.connect_websocket():
-                    self.error_logger.error(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] ❌ Failed to reconnect. Ending cycle...")
-                    self.trader.order_event.set()
-                    return
             except Exception as e:
-                self.error_logger.error(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] 🛑 Monitoring error: {e}")
+                self.error_logger.error("🛑 Monitoring error: %s", e)
                 await asyncio.sleep(1)